@@ -42,6 +42,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Response compression negotiated via Accept-Encoding: brotli for JSON when the package is
+    # installed (runs first), gzip for everything else
+    'django.middleware.gzip.GZipMiddleware',
+    'dashboard.middleware.BrotliJSONMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +79,56 @@ LOGIN_REDIRECT_URL = '/'  # URL to redirect to after login
 LOGOUT_REDIRECT_URL = '/signin/'  # URL to redirect to after logout
 
 
+# RFM / churn retraining
+# New orders only mark the model as dirty; `manage.py process_retrain_queue` retrains once
+# no new order has arrived for this many seconds.
+RETRAIN_DEBOUNCE_SECONDS = 300
+# ...but never delays a retrain by more than this many seconds after the first pending trigger,
+# so a steady stream of orders can't postpone it indefinitely.
+RETRAIN_MAX_WAIT_SECONDS = 3600
+# Jobs RUNNING for longer than this are assumed abandoned by a stopped worker and requeued.
+RETRAIN_STALE_SECONDS = 3 * 3600
+
+# Where ml_data_preparation reads customer features from: 'feature_store' (one row per
+# customer, maintained on order insert) or 'orders' (full rescan of the orders table).
+RFM_FEATURE_SOURCE = 'feature_store'
+
+# How the churn model is retrained: 'full' refits LogisticRegression on every customer;
+# 'incremental' updates an SGD logistic model with the CustomerFeatures rows changed since
+# the last run (see dashboard/churn_training.py), refitting it on all customers every
+# CHURN_FULL_REFIT_DAYS and comparing it with a full LogisticRegression fit on the
+# CHURN_HOLDOUT_PERCENT of customers held out of training.
+CHURN_TRAINING_MODE = 'full'
+CHURN_FULL_REFIT_DAYS = 7
+CHURN_HOLDOUT_PERCENT = 20
+
+# Scatter charts in chart_data are reduced to this many points by default (see dashboard/scatter.py);
+# the scatter_max_points query parameter can ask for more, up to SCATTER_HARD_LIMIT.
+SCATTER_MAX_POINTS = 5000
+SCATTER_HARD_LIMIT = 20000
+
+# How often (seconds) each process checks the RFM segment / churn model files for a newer
+# version; changed files are reloaded in a background thread (see dashboard/ml_utils.py).
+ML_ARTIFACT_CHECK_INTERVAL = 1.0
+
+# Storage format of the DataFrames the ML pipeline passes between steps (rfm_features,
+# rfm_features_with_segments): 'parquet' (needs pyarrow), 'columns' (memory-mapped, see
+# dashboard/frames.py) or 'auto' for Parquet when pyarrow is installed.
+ML_ARTIFACT_FORMAT = 'auto'
+
+# Worker processes for the batch aggregations: the customer-sharded feature extraction of the
+# full-history retrain and rebuild_customer_features (ml_data_preparation.extract_partials,
+# create_features, cohorts.build_cohorts; see dashboard/parallel.py) and the per-cohort
+# rebuild of the cohort matrix (cohort_stats.rebuild_cohort_stats, import_orders).
+# 1 runs serially, 0 uses one per CPU.
+ML_PARALLEL_WORKERS = 1
+
+# JSON file declaring the customer segments (ordered conditions on R/F/M or any RFM feature,
+# plus each segment's recommended action; see dashboard/segmentation.py). Edited rules apply
+# on the next retrain or `manage.py apply_segment_rules`.
+SEGMENT_RULES_PATH = BASE_DIR / 'dashboard' / 'segment_rules.json'
+
+
 WSGI_APPLICATION = 'caddy_dashboard.wsgi.application'
 
 
@@ -93,6 +147,29 @@ DATABASES = {
 }
 
 
+# Caches
+# The 'analytics' cache holds rendered *_data responses keyed on the data version
+# (dashboard/caching.py). LocMemCache evicts least-recently-used entries beyond MAX_ENTRIES;
+# with several worker processes use a shared backend instead, e.g.
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+# (configure maxmemory-policy allkeys-lru on the server) or
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/var/tmp/caddy_analytics_cache'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'caddy-analytics',
+        'TIMEOUT': 6 * 60 * 60,  # seconds
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
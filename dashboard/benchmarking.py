@@ -0,0 +1,137 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Order
+
+# Helpers shared by the benchmark_* management commands
+
+STATUSES = np.array(['completed', 'processing', 'refunded', 'cancelled'])
+PAYMENT_METHODS = np.array(['card', 'paypal', 'bank_transfer', 'cod'])
+
+
+def synthetic_orders_frame(n_rows, n_customers=None, start='2020-01-01', days=5 * 365, n_products=50, seed=42, offset=0):
+    """
+    Synthetic order table with the columns of the Order model. Rows are in random date order.
+    """
+    rng = np.random.default_rng(seed + offset)
+    n_customers = n_customers or max(1, n_rows // 10)
+    customer_ids = rng.integers(0, n_customers, n_rows)
+    start_ts = pd.Timestamp(start, tz='UTC')
+    order_dates = start_ts + pd.to_timedelta(rng.integers(0, days * 24 * 3600, n_rows), unit='s')
+    quantities = rng.integers(1, 6, n_rows)
+    unit_prices = np.round(rng.uniform(5, 200, n_rows), 2)
+    row_totals = np.round(unit_prices * quantities, 2)
+    tax = np.round(row_totals * 0.1, 2)
+    shipping = np.round(rng.choice([0.0, 4.99, 9.99], n_rows), 2)
+    discount = np.round(np.where(rng.random(n_rows) < 0.2, row_totals * 0.1, 0.0), 2)
+    statuses = STATUSES[rng.integers(0, len(STATUSES), n_rows)]
+    refunded = np.where(statuses == 'refunded', row_totals, 0.0)
+
+    names = pd.Series(customer_ids).map('Customer {}'.format)
+    return pd.DataFrame({
+        'order_number': [f'BENCH-{offset + i}' for i in range(n_rows)],
+        'order_date': order_dates,
+        'order_status': statuses,
+        'order_total': np.round(row_totals + tax + shipping - discount, 2),
+        'order_discount': discount,
+        'order_refunded': refunded,
+        'order_tax': tax,
+        'shipping_charge': shipping,
+        'customer_name': names,
+        'customer_email': pd.Series(customer_ids).map('customer{}@example.com'.format),
+        'payment_method': PAYMENT_METHODS[rng.integers(0, len(PAYMENT_METHODS), n_rows)],
+        'product_name': pd.Series(rng.integers(0, n_products, n_rows)).map('Product {}'.format),
+        'product_sku': pd.Series(rng.integers(0, n_products, n_rows)).map('SKU-{}'.format),
+        'product_unit_price': unit_prices,
+        'product_quantity': quantities,
+        'product_discount': discount,
+        'product_tax': tax,
+        'product_row_total': row_totals,
+    })
+
+
+def synthetic_cohort_orders(n_customers, orders_per_customer=5, years=5, start='2020-01-01', seed=42):
+    """
+    Lean in-memory order columns for cohort benchmarks: (customer_email, order_date, order_total).
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_customers * orders_per_customer
+    customer_ids = rng.integers(0, n_customers, n_rows)
+    start_ts = pd.Timestamp(start, tz='UTC')
+    order_dates = start_ts + pd.to_timedelta(rng.integers(0, years * 365 * 24 * 3600, n_rows), unit='s')
+    emails = pd.Series(customer_ids).map('customer{}@example.com'.format).to_numpy()
+    return emails, order_dates, np.round(rng.uniform(5, 500, n_rows), 2)
+
+
+def synthetic_feature_orders(n_rows, orders_per_customer=10, years=5, start='2020-01-01', seed=42):
+    """
+    The columns ml_data_preparation.extract_data returns, for n_rows orders in random order.
+    Names and emails are shared string objects, as rows fetched from the database would be.
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, n_rows // orders_per_customer)
+    customer_ids = rng.integers(0, n_customers, n_rows)
+    names = np.array([f'Customer {i}' for i in range(n_customers)], dtype=object)
+    emails = np.array([f'customer{i}@example.com' for i in range(n_customers)], dtype=object)
+    start_ts = pd.Timestamp(start, tz='UTC')
+    return pd.DataFrame({
+        'customer_name': names[customer_ids],
+        'customer_email': emails[customer_ids],
+        'order_date': start_ts + pd.to_timedelta(rng.integers(0, years * 365 * 24 * 3600, n_rows), unit='s'),
+        'order_id': np.arange(n_rows),
+        'order_total': np.round(rng.uniform(5, 500, n_rows), 2),
+    })
+
+
+def insert_synthetic_orders(n_rows, chunk_size=50000, **kwargs):
+    """
+    bulk_create n_rows synthetic orders chunk by chunk (no signals, bounded memory).
+    """
+    for offset in range(0, n_rows, chunk_size):
+        frame = synthetic_orders_frame(min(chunk_size, n_rows - offset), offset=offset, **kwargs)
+        Order.objects.bulk_create([Order(**row) for row in frame.to_dict('records')], batch_size=5000)
+
+
+@contextmanager
+def measure(results, label, track_memory=False, count_queries=False):
+    """
+    Record wall time (and optionally peak traced memory and query count) under results[label].
+    """
+    if track_memory:
+        tracemalloc.start()
+    queries = CaptureQueriesContext(connection) if count_queries else None
+    if queries is not None:
+        queries.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = {'seconds': time.perf_counter() - started}
+        if queries is not None:
+            queries.__exit__(None, None, None)
+            entry['queries'] = len(queries.captured_queries)
+        if track_memory:
+            entry['peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        results[label] = entry
+
+
+def format_results(results):
+    lines = []
+    for label, entry in results.items():
+        parts = [f"{entry['seconds']:.3f}s"]
+        if 'queries' in entry:
+            parts.append(f"{entry['queries']} queries")
+        if 'peak_mb' in entry:
+            parts.append(f"peak {entry['peak_mb']:.1f} MB")
+        for size in ('bytes', 'gzip', 'brotli'):
+            if size in entry:
+                parts.append(f"{size} {entry[size] / 1024:.1f} KiB")
+        lines.append(f"{label}: {', '.join(parts)}")
+    return lines
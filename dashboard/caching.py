@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .ml_utils import ARTIFACT_PATHS, registry  # Rewriting a model artifact changes the RFM/churn responses
+from .models import DataVersion, Order
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_ALIAS = 'analytics'
+DATA_VERSION_NAME = 'analytics'
+# Query parameters that never change a response (e.g. jQuery's cache buster)
+IGNORED_PARAMS = {'_'}
+_STATS_PREFIX = 'analytics-stats'
+
+
+def get_cache():
+    alias = ANALYTICS_CACHE_ALIAS if ANALYTICS_CACHE_ALIAS in settings.CACHES else 'default'
+    return caches[alias]
+
+
+def get_data_version():
+    version = DataVersion.objects.filter(name=DATA_VERSION_NAME).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_data_version():
+    """
+    Invalidate every cached analytics response. A single UPDATE on the write path.
+    """
+    now = timezone.now()
+    updated = DataVersion.objects.filter(name=DATA_VERSION_NAME).update(version=F('version') + 1, updated_at=now)
+    if not updated:
+        _, created = DataVersion.objects.get_or_create(name=DATA_VERSION_NAME, defaults={'version': 1, 'updated_at': now})
+        if not created:
+            DataVersion.objects.filter(name=DATA_VERSION_NAME).update(version=F('version') + 1, updated_at=now)
+
+
+def artifact_mtime():
+    mtimes = [os.path.getmtime(path) for path in ARTIFACT_PATHS if os.path.exists(path)]
+    return max(mtimes) if mtimes else 0
+
+
+def data_validators():
+    """
+    Cheap snapshot of everything the analytics responses depend on: the data version (and
+    when it last changed), the highest order id and the newest model artifact mtime.
+    """
+    version = DataVersion.objects.filter(name=DATA_VERSION_NAME).values('version', 'updated_at').first()
+    return {
+        'version': version['version'] if version else 0,
+        'updated_at': version['updated_at'] if version else None,
+        'max_order_id': Order.objects.aggregate(max_id=Max('order_id'))['max_id'] or 0,
+        'artifact_mtime': artifact_mtime(),
+    }
+
+
+def normalize_params(query_dict):
+    """
+    Canonical form of the query string: sorted keys and values, blank values and
+    cache busters dropped, so equivalent requests share a cache entry.
+    """
+    items = []
+    for key in sorted(query_dict):
+        if key in IGNORED_PARAMS:
+            continue
+        values = sorted(value for value in query_dict.getlist(key) if value != '')
+        if values:
+            items.append(f"{key}={','.join(values)}")
+    return '&'.join(items)
+
+
+def response_cache_key(view_name, request, version):
+    # Default date ranges are relative to today, so the date is part of the key too
+    params = normalize_params(request.GET)
+    digest = hashlib.sha1(f"{timezone.localdate()}|{params}".encode('utf-8')).hexdigest()
+    return f"analytics:{view_name}:v{version}:{digest}"
+
+
+def artifacts_settled(before, after):
+    """
+    Whether a response built between two registry.status() calls came from artifacts matching
+    the files on disk. While a retrain's files are being reloaded the registry still serves the
+    previous snapshot, which must not be cached under the already bumped data version.
+    """
+    return (not after['reloading'] and not after['stale']
+            and before['loaded_at'] in (None, after['loaded_at']))
+
+
+def _count(outcome, view_name):
+    cache = get_cache()
+    for key in (f"{_STATS_PREFIX}:{outcome}", f"{_STATS_PREFIX}:{outcome}:{view_name}"):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # incr raises when the key does not exist yet
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+
+def cached_json_response(view):
+    """
+    Cache successful GET responses of a JSON view per (view, normalized parameters, data
+    version). Bumping the data version makes every older entry unreachable; the backend's
+    TIMEOUT and MAX_ENTRIES (LRU culling) take care of evicting them. Responses built while
+    the ML artifacts are not settled (see artifacts_settled) are served but not cached.
+    """
+    view_name = view.__name__
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        try:
+            cache = get_cache()
+            key = response_cache_key(view_name, request, get_data_version())
+            cached = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Analytics cache unavailable for {view_name}: {str(e)}")
+            return view(request, *args, **kwargs)
+
+        if cached is not None:
+            _count('hits', view_name)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count('misses', view_name)
+        artifacts_before = registry.status()
+        response = view(request, *args, **kwargs)
+        if (response.status_code == 200 and not response.streaming
+                and artifacts_settled(artifacts_before, registry.status())):
+            cache.set(key, (response.content, response['Content-Type']))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def cache_stats(view_names=()):
+    """
+    Hit/miss counters (overall and per view) plus the current data version.
+    """
+    cache = get_cache()
+    stats = {
+        'backend': f"{cache.__class__.__module__}.{cache.__class__.__name__}",
+        'data_version': get_data_version(),
+        'hits': cache.get(f"{_STATS_PREFIX}:hits", 0),
+        'misses': cache.get(f"{_STATS_PREFIX}:misses", 0),
+        'views': {},
+    }
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+    for view_name in view_names:
+        stats['views'][view_name] = {
+            'hits': cache.get(f"{_STATS_PREFIX}:hits:{view_name}", 0),
+            'misses': cache.get(f"{_STATS_PREFIX}:misses:{view_name}", 0),
+        }
+    return stats
+
+
+def _validators(request):
+    # Computed once per request and shared by the ETag and Last-Modified functions
+    if not hasattr(request, '_analytics_validators'):
+        request._analytics_validators = data_validators()
+    return request._analytics_validators
+
+
+def response_etag(view_name, request):
+    validators = _validators(request)
+    fingerprint = (f"{view_name}|{validators['version']}|{validators['max_order_id']}|"
+                   f"{validators['artifact_mtime']}|{timezone.localdate()}|{normalize_params(request.GET)}")
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def response_last_modified(request):
+    validators = _validators(request)
+    candidates = [value for value in (
+        validators['updated_at'],
+        datetime.fromtimestamp(validators['artifact_mtime'], tz=dt_timezone.utc) if validators['artifact_mtime'] else None,
+    ) if value]
+    # Responses relative to "today" change at midnight even without new data
+    candidates.append(timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0))
+    return max(candidates)
+
+
+def analytics_endpoint(view):
+    """
+    Conditional GET plus the versioned response cache for a JSON view: clients that send a
+    matching If-None-Match / If-Modified-Since get a 304 before any cache lookup or
+    aggregation runs. Cache-Control makes browsers revalidate on every fetch. Only 200 (and
+    the 304s answering them) carry validators, so an error is never revalidated as current.
+    """
+    view_name = view.__name__
+    conditional_view = condition(
+        etag_func=lambda request, *args, **kwargs: response_etag(view_name, request),
+        last_modified_func=lambda request, *args, **kwargs: response_last_modified(request),
+    )(cached_json_response(view))
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            # condition() adds them whatever the status
+            for header in ('ETag', 'Last-Modified'):
+                if response.has_header(header):
+                    del response[header]
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
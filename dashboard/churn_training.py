@@ -0,0 +1,181 @@
+import logging
+import os
+from datetime import timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+from sklearn.preprocessing import StandardScaler
+
+from .ml_utils import (ARTIFACT_DIR, CHURN_FEATURES, CHURN_MODEL_PATH, SCALER_PATH, load_churn_model_and_scaler,
+                       predict_churn_batch, publish_artifact)
+from .models import CustomerFeatures
+from .scoring import churn_features, iter_feature_chunks
+
+logger = logging.getLogger(__name__)
+
+# Incremental churn training (CHURN_TRAINING_MODE = 'incremental'). The served scaler and model
+# are a StandardScaler and an SGD logistic regression, both updated with partial_fit from the
+# CustomerFeatures rows whose updated_at is past the last run's watermark, so an update costs
+# time proportional to the customers that ordered since. Every CHURN_FULL_REFIT_DAYS both are
+# refit on all customers, and the model being replaced and a from-scratch LogisticRegression
+# (what train_churn_model fits) are scored on the same held-out customers for comparison.
+# Held-out customers are picked by a hash of their name, so they are never trained on in
+# either mode.
+
+CHURN_TRAINING_STATE_PATH = os.path.join(ARTIFACT_DIR, 'churn_training_state.joblib')
+CHURN_CLASSES = np.array([0, 1])
+# A customer has churned if they haven't ordered in this many days (as in train_churn_model)
+CHURN_RECENCY_DAYS = 180
+
+
+def churn_labels(recency):
+    return (np.asarray(recency) > CHURN_RECENCY_DAYS).astype(int)  # 1 = Churned, 0 = Active
+
+
+def holdout_mask(customer_names, percent=None):
+    """
+    True for the customers in the held-out evaluation set (a stable CHURN_HOLDOUT_PERCENT of names).
+    """
+    percent = getattr(settings, 'CHURN_HOLDOUT_PERCENT', 20) if percent is None else percent
+    hashes = pd.util.hash_pandas_object(pd.Series(customer_names, dtype=object), index=False).to_numpy()
+    return hashes % 100 < percent
+
+
+def load_training_state():
+    if not os.path.exists(CHURN_TRAINING_STATE_PATH):
+        return None
+    return joblib.load(CHURN_TRAINING_STATE_PATH)
+
+
+def evaluate(model, scaler, X, y):
+    """
+    Accuracy, log loss and ROC AUC (None with a single class) of a model on labelled features.
+    """
+    if model is None or scaler is None or not len(y):
+        return None
+    probabilities = predict_churn_batch(X, model, scaler)
+    return {
+        'accuracy': float(accuracy_score(y, probabilities >= 0.5)),
+        'log_loss': float(log_loss(y, probabilities, labels=CHURN_CLASSES)),
+        'roc_auc': float(roc_auc_score(y, probabilities)) if len(np.unique(y)) > 1 else None,
+    }
+
+
+def _all_features(chunk_size):
+    # Every customer's features, labels and hold-out flag, and the newest updated_at read
+    frames, trained_through = [], None
+    for frame in iter_feature_chunks(chunk_size):
+        newest = frame['updated_at'].max()
+        trained_through = newest if trained_through is None else max(trained_through, newest)
+        frames.append(pd.DataFrame({'customer_name': frame['customer_name'].to_numpy()}).join(churn_features(frame)))
+    if not frames:
+        return None, None, None, None
+    df = pd.concat(frames, ignore_index=True)
+    X = df[CHURN_FEATURES]
+    return X, churn_labels(X['recency']), holdout_mask(df['customer_name']), trained_through
+
+
+def compare_models(chunk_size=50000):
+    """
+    Score the served model and a LogisticRegression fit from scratch on the training customers
+    against the held-out customers, without publishing anything.
+    """
+    X, y, holdout, _ = _all_features(chunk_size)
+    if X is None:
+        return None
+    model, scaler = load_churn_model_and_scaler()
+    baseline_scaler = StandardScaler().fit(X[~holdout])
+    baseline = LogisticRegression(random_state=42).fit(baseline_scaler.transform(X[~holdout]), y[~holdout])
+    return {
+        'held_out': int(holdout.sum()),
+        'served': evaluate(model, scaler, X[holdout], y[holdout]),
+        'full_refit_baseline': evaluate(baseline, baseline_scaler, X[holdout], y[holdout]),
+    }
+
+
+def full_refit(chunk_size=50000, now=None):
+    """
+    Refit the scaler and SGD model on every training customer and publish them, comparing the
+    model they replace and a LogisticRegression baseline on the held-out customers.
+    """
+    now = now or timezone.now()
+    X, y, holdout, trained_through = _all_features(chunk_size)
+    if X is None:
+        logger.warning("No customer features to train the churn model on.")
+        return None
+    X_train, y_train, X_test, y_test = X[~holdout], y[~holdout], X[holdout], y[holdout]
+
+    scaler = StandardScaler().fit(X_train)
+    model = SGDClassifier(loss='log_loss', random_state=42).fit(scaler.transform(X_train), y_train)
+    baseline_scaler = StandardScaler().fit(X_train)
+    baseline = LogisticRegression(random_state=42).fit(baseline_scaler.transform(X_train), y_train)
+    previous_model, previous_scaler = load_churn_model_and_scaler()
+
+    comparison = {
+        'held_out': len(y_test),
+        'replaced': evaluate(previous_model, previous_scaler, X_test, y_test),
+        'full_refit': evaluate(model, scaler, X_test, y_test),
+        'full_refit_baseline': evaluate(baseline, baseline_scaler, X_test, y_test),
+    }
+    # Renamed into place so the serving processes' artifact registry never loads a partial file
+    publish_artifact(scaler, SCALER_PATH)
+    publish_artifact(model, CHURN_MODEL_PATH)
+    state = {
+        'trained_through': trained_through.to_pydatetime(),
+        'last_full_refit': now,
+        'incremental_updates': 0,
+        'customers_since_refit': 0,
+        'comparison': comparison,
+    }
+    publish_artifact(state, CHURN_TRAINING_STATE_PATH)
+    logger.info(f"Refit churn model on {len(y_train)} customers; held-out comparison: {comparison}")
+    return {'mode': 'full_refit', 'customers': len(y_train), 'comparison': comparison}
+
+
+def update_churn_model(chunk_size=50000, force_full_refit=False, now=None):
+    """
+    Bring the churn model up to date with the customers whose features changed since the last
+    run (partial_fit), or refit it when it is due, forced, or no incremental model exists yet.
+    Changes committed with an updated_at older than the watermark are picked up by the next
+    full refit. Returns the run's statistics.
+    """
+    now = now or timezone.now()
+    state = load_training_state()
+    model, scaler = load_churn_model_and_scaler()
+    refit_interval = timedelta(days=getattr(settings, 'CHURN_FULL_REFIT_DAYS', 7))
+    if (force_full_refit or state is None or not isinstance(model, SGDClassifier)
+            or not hasattr(scaler, 'n_samples_seen_') or now - state['last_full_refit'] >= refit_interval):
+        return full_refit(chunk_size, now)
+
+    stats = {'mode': 'incremental', 'customers': 0, 'held_out': 0}
+    trained_through = state['trained_through']
+    changed = CustomerFeatures.objects.filter(updated_at__gt=trained_through)
+    for frame in iter_feature_chunks(chunk_size, changed):
+        trained_through = max(trained_through, frame['updated_at'].max().to_pydatetime())
+        holdout = holdout_mask(frame['customer_name'])
+        stats['held_out'] += int(holdout.sum())
+        if holdout.all():
+            continue
+        X = churn_features(frame[~holdout])
+        # Running mean/variance first, so the model sees this batch on the updated scale
+        scaler.partial_fit(X)
+        model.partial_fit(scaler.transform(X), churn_labels(X['recency']), classes=CHURN_CLASSES)
+        stats['customers'] += len(X)
+
+    if trained_through == state['trained_through']:
+        logger.info("No customer features changed since the last churn model update.")
+        return stats
+    if stats['customers']:
+        publish_artifact(scaler, SCALER_PATH)
+        publish_artifact(model, CHURN_MODEL_PATH)
+    state = dict(state, trained_through=trained_through,
+                 incremental_updates=state['incremental_updates'] + 1,
+                 customers_since_refit=state['customers_since_refit'] + stats['customers'])
+    publish_artifact(state, CHURN_TRAINING_STATE_PATH)
+    logger.info(f"Updated churn model with {stats['customers']} changed customers.")
+    return stats
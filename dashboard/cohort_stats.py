@@ -0,0 +1,288 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.db import connections, transaction
+from django.db.models import Min
+
+from .models import CohortMonthlyStats, CustomerCohort, Order
+from .parallel import get_workers
+
+logger = logging.getLogger(__name__)
+
+# Customer emails per IN (...) lookup when loading a cohort's orders
+EMAIL_CHUNK_SIZE = 1000
+
+
+def order_month(order_date):
+    # Cohorts use UTC calendar months, like cohort_data always has
+    order_date = order_date.astimezone(dt_timezone.utc) if order_date.tzinfo else order_date
+    return date(order_date.year, order_date.month, 1)
+
+
+def months_between(start_month, end_month):
+    return (end_month.year - start_month.year) * 12 + end_month.month - start_month.month
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def approx_months_since(cohort_month, months_since):
+    """
+    The 'approx' month offset (whole 30-day periods between the month starts, see
+    cohorts.month_offsets) of a calendar month offset.
+    """
+    return (add_months(cohort_month, months_since) - cohort_month).days // 30
+
+
+def customer_cells(months):
+    """
+    One customer's contribution to the cohort matrix from their activity per month
+    ({month: [orders, revenue]}): {(cohort_month, months_since): [customers, orders, revenue,
+    approx_customers]}. approx_customers is 1 only in the first of the calendar months sharing
+    an approx offset, so summing it over those months counts the customer once.
+    """
+    if not months:
+        return {}
+    cohort_month = min(months)
+    cells = {}
+    seen = set()
+    for month in sorted(months):
+        months_since = months_between(cohort_month, month)
+        approx = approx_months_since(cohort_month, months_since)
+        orders, revenue = months[month]
+        cells[(cohort_month, months_since)] = [1, orders, revenue, 0 if approx in seen else 1]
+        seen.add(approx)
+    return cells
+
+
+def load_months(customer):
+    return {date.fromisoformat(month): [orders, Decimal(revenue)] for month, (orders, revenue) in customer.months.items()}
+
+
+def dump_months(months):
+    return {month.isoformat(): [orders, str(revenue)] for month, (orders, revenue) in sorted(months.items())}
+
+
+def _apply_cell_deltas(before, after):
+    for key in sorted(set(before) | set(after)):
+        old = before.get(key, [0, 0, Decimal('0'), 0])
+        new = after.get(key, [0, 0, Decimal('0'), 0])
+        delta = [n - o for n, o in zip(new, old)]
+        if not any(delta):
+            continue
+        cell, _ = CohortMonthlyStats.objects.select_for_update().get_or_create(
+            cohort_month=key[0], months_since=key[1], defaults={'revenue': Decimal('0')})
+        cell.customers += delta[0]
+        cell.orders += delta[1]
+        cell.revenue += delta[2]
+        cell.approx_customers += delta[3]
+        if cell.orders <= 0:
+            cell.delete()
+        else:
+            cell.save()
+
+
+def _update_customer(order, sign):
+    month = order_month(order.order_date)
+    order_total = Decimal(str(order.order_total or 0))
+    with transaction.atomic():
+        customer, _ = CustomerCohort.objects.select_for_update().get_or_create(
+            customer_email=order.customer_email, defaults={'cohort_month': month})
+        months = load_months(customer)
+        before = customer_cells(months)
+        orders, revenue = months.get(month, [0, Decimal('0')])
+        if orders + sign > 0:
+            months[month] = [orders + sign, revenue + sign * order_total]
+        else:
+            months.pop(month, None)
+        _apply_cell_deltas(before, customer_cells(months))
+
+        if months:
+            customer.cohort_month = min(months)
+            customer.months = dump_months(months)
+            customer.save()
+        else:
+            customer.delete()
+
+
+def apply_order(order):
+    """
+    Fold a new order (or the new version of an edited one) into the cohort matrix. Only the
+    customer's CustomerCohort row is read: normally a single cell changes, and a backdated
+    first order moves the customer's cells to the earlier cohort.
+    """
+    _update_customer(order, 1)
+
+
+def remove_order(order):
+    """
+    Take an order (the stored version of an edited one, or a deleted one) back out of the
+    cohort matrix. Removing a customer's only order in their first month moves them to the
+    cohort of their next active month.
+    """
+    _update_customer(order, -1)
+
+
+def customer_cohorts():
+    """
+    CustomerCohort rows (unsaved) for every customer, streamed from the orders table in
+    customer_email order.
+    """
+    customer_email, months = None, {}
+    rows = Order.objects.order_by('customer_email').values_list('customer_email', 'order_date', 'order_total')
+    for email, order_date, order_total in rows.iterator(chunk_size=5000):
+        if email != customer_email and months:
+            yield CustomerCohort(customer_email=customer_email, cohort_month=min(months), months=dump_months(months))
+            months = {}
+        customer_email = email
+        activity = months.setdefault(order_month(order_date), [0, Decimal('0')])
+        activity[0] += 1
+        activity[1] += Decimal(str(order_total or 0))
+    if months:
+        yield CustomerCohort(customer_email=customer_email, cohort_month=min(months), months=dump_months(months))
+
+
+def cohort_customers():
+    """
+    {cohort_month: [customer_email, ...]} from each customer's first order.
+    """
+    cohorts = {}
+    first_orders = (Order.objects.values('customer_email')
+                    .annotate(first_order_date=Min('order_date'))
+                    .order_by())
+    for row in first_orders.iterator(chunk_size=5000):
+        cohorts.setdefault(order_month(row['first_order_date']), []).append(row['customer_email'])
+    return cohorts
+
+
+def iter_cohort_members(start_month=None, end_month=None, cohort_months=None, chunk_size=5000):
+    """
+    Yield (cohort_month, customer_email) for customers whose first order falls in
+    [start_month, end_month] and, if given, in one of cohort_months. Ordered by first order
+    date and fetched in chunks, so the member list is never held in memory.
+    """
+    members = (Order.objects.values('customer_email')
+               .annotate(first_order_date=Min('order_date'))
+               .order_by('first_order_date', 'customer_email'))
+    if cohort_months:
+        start_month = max(start_month, min(cohort_months)) if start_month else min(cohort_months)
+        end_month = min(end_month, max(cohort_months)) if end_month else max(cohort_months)
+    if start_month:
+        members = members.filter(first_order_date__gte=datetime(start_month.year, start_month.month, 1, tzinfo=dt_timezone.utc))
+    if end_month:
+        next_month = add_months(end_month, 1)
+        members = members.filter(first_order_date__lt=datetime(next_month.year, next_month.month, 1, tzinfo=dt_timezone.utc))
+
+    wanted = set(cohort_months) if cohort_months else None
+    for row in members.iterator(chunk_size=chunk_size):
+        month = order_month(row['first_order_date'])
+        if wanted is None or month in wanted:
+            yield month, row['customer_email']
+
+
+def cohort_cells(cohort_month, emails):
+    """
+    All cells of one cohort as (cohort_month, months_since, customers, orders, revenue,
+    approx_customers) tuples.
+    """
+    cohort_index = cohort_month.year * 12 + cohort_month.month - 1
+    customers, offsets, totals = [], [], []
+    for start in range(0, len(emails), EMAIL_CHUNK_SIZE):
+        rows = (Order.objects.filter(customer_email__in=emails[start:start + EMAIL_CHUNK_SIZE])
+                .values_list('customer_email', 'order_date', 'order_total'))
+        for customer_email, order_date, order_total in rows.iterator(chunk_size=5000):
+            month = order_month(order_date)
+            customers.append(customer_email)
+            offsets.append(month.year * 12 + month.month - 1 - cohort_index)
+            totals.append(order_total or Decimal('0'))
+    if not offsets:
+        return []
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    customer_codes = np.unique(np.asarray(customers, dtype=object), return_inverse=True)[1].ravel()
+    width = int(offsets.max()) + 1
+    orders = np.bincount(offsets, minlength=width)
+    # Distinct (customer, month offset) pairs, sorted by customer then offset
+    pairs = np.unique(customer_codes * width + offsets)
+    pair_offsets = pairs % width
+    active = np.bincount(pair_offsets, minlength=width)
+    # Each customer's first calendar offset per approx offset (approx offsets never decrease)
+    approx = np.array([approx_months_since(cohort_month, offset) for offset in range(width)], dtype=np.int64)
+    first_pairs = np.unique((pairs // width) * width + approx[pair_offsets], return_index=True)[1]
+    approx_active = np.bincount(pair_offsets[first_pairs], minlength=width)
+    revenue = [Decimal('0')] * width
+    for offset, order_total in zip(offsets.tolist(), totals):
+        revenue[offset] += order_total
+    return [(cohort_month, offset, int(active[offset]), int(orders[offset]), revenue[offset], int(approx_active[offset]))
+            for offset in range(width) if orders[offset]]
+
+
+def _init_worker():
+    # Needed when the pool spawns instead of forking; a no-op for already configured processes
+    import django
+    django.setup()
+
+
+def _cohort_cells_task(args):
+    return cohort_cells(*args)
+
+
+def rebuild_cohort_stats(workers=None, batch_size=5000):
+    """
+    Recompute the whole cohort matrix and the CustomerCohort rows behind its incremental
+    updates. Cohorts are independent, so with workers > 1 (None: ML_PARALLEL_WORKERS) they
+    are computed in a process pool (each worker opens its own database connection).
+    """
+    workers = get_workers(workers)
+    cohorts = sorted(cohort_customers().items())
+
+    if workers > 1:
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            results = list(pool.map(_cohort_cells_task, cohorts))
+    else:
+        results = [cohort_cells(cohort_month, emails) for cohort_month, emails in cohorts]
+
+    cells = [CohortMonthlyStats(cohort_month=cohort_month, months_since=months_since, customers=customers,
+                         orders=orders, revenue=revenue, approx_customers=approx_customers)
+             for cohort_rows in results
+             for cohort_month, months_since, customers, orders, revenue, approx_customers in cohort_rows]
+    customers = list(customer_cohorts())
+    with transaction.atomic():
+        CohortMonthlyStats.objects.all().delete()
+        CohortMonthlyStats.objects.bulk_create(cells, batch_size=batch_size)
+        CustomerCohort.objects.all().delete()
+        CustomerCohort.objects.bulk_create(customers, batch_size=batch_size)
+
+    logger.info(f"Rebuilt {len(cells)} cohort cells for {len(cohorts)} cohorts ({len(customers)} customers).")
+    return len(cells)
+
+
+def load_cohort_cells(start_month=None, end_month=None):
+    """
+    Cells for cohorts starting in [start_month, end_month], limited to activity up to
+    end_month. Returns (cohort month indexes, months_since, customers, orders, revenue,
+    approx_customers) arrays.
+    """
+    queryset = CohortMonthlyStats.objects.all()
+    if start_month:
+        queryset = queryset.filter(cohort_month__gte=start_month)
+    if end_month:
+        queryset = queryset.filter(cohort_month__lte=end_month)
+    rows = list(queryset.values_list('cohort_month', 'months_since', 'customers', 'orders', 'revenue', 'approx_customers'))
+    if end_month:
+        rows = [row for row in rows if add_months(row[0], row[1]) <= end_month]
+
+    cohort_months = np.array([row[0].year * 12 + row[0].month - 1 for row in rows], dtype=np.int64)
+    months_since = np.array([row[1] for row in rows], dtype=np.int64)
+    customers = np.array([row[2] for row in rows], dtype=np.int64)
+    orders = np.array([row[3] for row in rows], dtype=np.int64)
+    revenue = np.array([float(row[4]) for row in rows], dtype=np.float64)
+    approx_customers = np.array([row[5] for row in rows], dtype=np.int64)
+    return cohort_months, months_since, customers, orders, revenue, approx_customers
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+from .parallel import get_workers, run_sharded
+
+# How the "months since first order" offset is measured:
+#   approx   - whole 30-day periods between the two month starts (the original cohort_data rule)
+#   calendar - difference in calendar months
+MONTH_DIFF_MODES = ('approx', 'calendar')
+GROSS_MARGIN = 0.4  # Assumed gross margin used for cohort LTV
+
+
+def month_index(dates):
+    """
+    Months since year 0 for each timestamp (year * 12 + month - 1), evaluated in UTC.
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates, utc=True))
+    return dates.year.to_numpy(dtype=np.int64) * 12 + dates.month.to_numpy(dtype=np.int64) - 1
+
+
+def month_start(index):
+    """
+    Inverse of month_index: datetime64[M] values for an array of month indexes.
+    """
+    return (np.asarray(index, dtype=np.int64) - 1970 * 12).astype('datetime64[M]')
+
+
+def cohort_label(index):
+    return pd.DatetimeIndex(month_start(index)).strftime('%b %Y').tolist()
+
+
+def month_offsets(order_months, cohort_months, mode='approx'):
+    """
+    Months between each order's month and its customer's cohort month.
+    """
+    if mode == 'calendar':
+        return order_months - cohort_months
+    if mode == 'approx':
+        days = (month_start(order_months).astype('datetime64[D]')
+                - month_start(cohort_months).astype('datetime64[D]')).astype(np.int64)
+        return days // 30
+    raise ValueError(f"Unknown month difference mode: {mode}")
+
+
+def build_cohorts(customers, order_dates, amounts, max_months=12, month_diff='approx', workers=1):
+    """
+    Cohort analysis in a single vectorized pass over the orders.
+
+    customers, order_dates and amounts are aligned per order. Customers are assigned to the
+    cohort of their first order month. Returns a dict with, per cohort (sorted by month):
+      cohorts, labels        - month indexes and 'Mon YYYY' labels
+      sizes, orders, revenue - customers, orders and total revenue
+      revenue_matrix         - revenue in months 1..max_months after the first order
+      retention_matrix       - distinct active customers in months 1..max_months
+    plus overall_revenue / overall_retention rows, total_customers, and per customer:
+      customer_keys, customer_cohorts.
+
+    With workers > 1 (None: ML_PARALLEL_WORKERS) customers are hash-partitioned into
+    shards computed in a process pool; see build_cohorts_sharded.
+    """
+    workers = get_workers(workers)
+    if workers > 1:
+        return build_cohorts_sharded(customers, order_dates, amounts, max_months, month_diff, workers)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    customer_codes, customer_keys = pd.factorize(pd.Series(customers), sort=False)
+    order_months = month_index(order_dates)
+
+    # First order month per customer, then each order's cohort
+    first_months = np.full(len(customer_keys), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_months, customer_codes, order_months)
+    cohort_values, customer_cohort_pos = np.unique(first_months, return_inverse=True)
+    order_cohort_pos = customer_cohort_pos[customer_codes]
+    offsets = month_offsets(order_months, first_months[customer_codes], month_diff)
+
+    n_cohorts = len(cohort_values)
+    sizes = np.bincount(customer_cohort_pos, minlength=n_cohorts)
+    orders = np.bincount(order_cohort_pos, minlength=n_cohorts)
+    revenue = np.bincount(order_cohort_pos, weights=amounts, minlength=n_cohorts)
+
+    # Cells for months 1..max_months, flattened to cohort * width + offset
+    width = max_months + 1
+    in_window = (offsets >= 1) & (offsets <= max_months)
+    cells = order_cohort_pos[in_window] * width + offsets[in_window]
+    revenue_matrix = np.bincount(cells, weights=amounts[in_window], minlength=n_cohorts * width).reshape(n_cohorts, width)[:, 1:]
+    # A customer counts once per cell however many orders they placed in that month offset
+    active = np.unique(customer_codes[in_window].astype(np.int64) * width + offsets[in_window])
+    active_cells = customer_cohort_pos[active // width] * width + active % width
+    retention_matrix = np.bincount(active_cells, minlength=n_cohorts * width).reshape(n_cohorts, width)[:, 1:]
+    overall_retention = np.bincount(active % width, minlength=width)[1:]
+
+    return {
+        'cohorts': cohort_values,
+        'labels': cohort_label(cohort_values),
+        'sizes': sizes,
+        'orders': orders,
+        'revenue': revenue,
+        'revenue_matrix': revenue_matrix,
+        'retention_matrix': retention_matrix,
+        'overall_revenue': revenue_matrix.sum(axis=0),
+        'overall_retention': overall_retention,
+        'total_customers': len(customer_keys),
+        'customer_keys': np.asarray(customer_keys),
+        'customer_cohorts': customer_cohort_pos,
+    }
+
+
+def _cohorts_shard(arrays, rows, max_months, month_diff):
+    return build_cohorts(arrays['codes'], arrays['dates'], arrays['amounts'], max_months, month_diff)
+
+
+def build_cohorts_sharded(customers, order_dates, amounts, max_months, month_diff, workers):
+    """
+    build_cohorts over customer shards in parallel. A customer's orders all land in one
+    shard, so per-cohort counts, sums and matrices add up across shards; they are summed in
+    shard order (revenue may differ from the serial result in the last float bits).
+    """
+    customer_codes, customer_keys = pd.factorize(pd.Series(customers), sort=False)
+    arrays = {
+        'codes': customer_codes.astype(np.int64),
+        'dates': pd.DatetimeIndex(pd.to_datetime(order_dates, utc=True)).as_unit('ns').asi8,
+        'amounts': np.asarray(amounts, dtype=np.float64),
+    }
+    results = run_sharded(_cohorts_shard, customer_codes, arrays, workers, max_months, month_diff)
+
+    cohort_values = np.unique(np.concatenate([result['cohorts'] for result in results]))
+    n_cohorts = len(cohort_values)
+    sizes = np.zeros(n_cohorts, dtype=np.int64)
+    orders = np.zeros(n_cohorts, dtype=np.int64)
+    revenue = np.zeros(n_cohorts)
+    revenue_matrix = np.zeros((n_cohorts, max_months))
+    retention_matrix = np.zeros((n_cohorts, max_months), dtype=np.int64)
+    overall_retention = np.zeros(max_months, dtype=np.int64)
+    customer_cohorts = np.zeros(len(customer_keys), dtype=np.int64)
+    for result in results:
+        # Each shard's cohorts are unique, so the fancy-indexed += never repeats a row
+        positions = np.searchsorted(cohort_values, result['cohorts'])
+        sizes[positions] += result['sizes']
+        orders[positions] += result['orders']
+        revenue[positions] += result['revenue']
+        revenue_matrix[positions] += result['revenue_matrix']
+        retention_matrix[positions] += result['retention_matrix']
+        overall_retention += result['overall_retention']
+        # The shard's customer keys are the global customer codes
+        customer_cohorts[result['customer_keys']] = positions[result['customer_cohorts']]
+
+    return {
+        'cohorts': cohort_values,
+        'labels': cohort_label(cohort_values),
+        'sizes': sizes,
+        'orders': orders,
+        'revenue': revenue,
+        'revenue_matrix': revenue_matrix,
+        'retention_matrix': retention_matrix,
+        'overall_revenue': revenue_matrix.sum(axis=0),
+        'overall_retention': overall_retention,
+        'total_customers': len(customer_keys),
+        'customer_keys': np.asarray(customer_keys),
+        'customer_cohorts': customer_cohorts,
+    }
+
+
+def build_cohorts_from_cells(cohort_months, months_since, customers, orders, amounts, approx_customers,
+                             max_months=12, month_diff='approx'):
+    """
+    Same result as build_cohorts (without the per-customer arrays) from pre-aggregated
+    cohort cells (CohortMonthlyStats), so the cost depends on the number of cells.
+
+    Cells are stored per calendar month offset. In 'approx' mode two calendar offsets can map
+    to the same 30-day offset; revenue and orders add up, and retention sums approx_customers,
+    which counts each customer in only the first of those months.
+    """
+    cohort_values, cohort_pos = np.unique(cohort_months, return_inverse=True)
+    cohort_pos = cohort_pos.ravel()
+    offsets = month_offsets(cohort_months + months_since, cohort_months, month_diff)
+    n_cohorts = len(cohort_values)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    customers, approx_customers = np.asarray(customers), np.asarray(approx_customers)
+
+    width = max_months + 1
+    in_window = (offsets >= 1) & (offsets <= max_months)
+    cells = cohort_pos[in_window] * width + offsets[in_window]
+
+    def matrix(weights):
+        return np.bincount(cells, weights=weights[in_window], minlength=n_cohorts * width).reshape(n_cohorts, width)[:, 1:]
+
+    sizes = np.bincount(cohort_pos[months_since == 0], weights=customers[months_since == 0], minlength=n_cohorts).astype(np.int64)
+    revenue_matrix = matrix(amounts)
+    retention_matrix = matrix(approx_customers if month_diff == 'approx' else customers).astype(np.int64)
+    return {
+        'cohorts': cohort_values,
+        'labels': cohort_label(cohort_values),
+        'sizes': sizes,
+        'orders': np.bincount(cohort_pos, weights=orders, minlength=n_cohorts).astype(np.int64),
+        'revenue': np.bincount(cohort_pos, weights=amounts, minlength=n_cohorts),
+        'revenue_matrix': revenue_matrix,
+        'retention_matrix': retention_matrix,
+        'overall_revenue': revenue_matrix.sum(axis=0),
+        'overall_retention': retention_matrix.sum(axis=0),
+        'total_customers': int(sizes.sum()),
+    }
+
+
+def cohort_metrics(result, gross_margin=GROSS_MARGIN):
+    """
+    Per-cohort purchase frequency, AOV, revenue per customer and LTV, as the metrics table rows.
+    """
+    sizes, orders, revenue = result['sizes'], result['orders'], result['revenue']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency = np.where(sizes > 0, orders / sizes, 0.0)
+        aov = np.where(orders > 0, revenue / orders, 0.0)
+        revenue_per_customer = np.where(sizes > 0, revenue / sizes, 0.0)
+    ltv = aov * frequency * gross_margin
+    return [
+        {
+            'cohort': label,
+            'cohort_size': int(size),
+            'purchase_frequency': round(float(f), 2),
+            'aov': round(float(a), 2),
+            'revenue_per_customer': round(float(r), 2),
+            'ltv': round(float(l), 2),
+        }
+        for label, size, f, a, r, l in zip(result['labels'], sizes, frequency, aov, revenue_per_customer, ltv)
+    ]
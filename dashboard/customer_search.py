@@ -0,0 +1,263 @@
+import base64
+import binascii
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+import numpy as np
+
+from .caching import get_data_version
+from .models import CustomerFeatures
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MODES = ('prefix', 'substring')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SUBSTRING_MIN_LENGTH = 2  # Shorter substrings match nearly everyone
+REFRESH_INTERVAL = 1.0  # Seconds between data version checks
+MERGE_THRESHOLD = 1000  # New customers kept in the pending list before the snapshot is rebuilt
+# Characters one substring request scans (roughly 1 ms per million); the rest of the
+# haystack is continued through the cursor, so a page can hold fewer than `limit` results
+SUBSTRING_SCAN_CHARS = 8_000_000
+
+
+def normalize(value):
+    return (value or '').casefold()
+
+
+def encode_cursor(phase, key, name):
+    return base64.urlsafe_b64encode(json.dumps([phase, key, name]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    (phase, key, name) from an opaque cursor; ValueError if it is malformed. key and name
+    are None for a cursor pointing at the start of its phase.
+    """
+    try:
+        phase, key, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+    return phase, key, name
+
+
+class Snapshot:
+    """
+    Immutable sorted view of the customers:
+      name_keys/names/emails      - casefolded names, sorted by (key, name), with the originals
+      email_keys/email_positions  - casefolded emails sorted by (key, name), pointing into names
+      haystack/line_starts        - "name\\temail" lines in name order, for substring search
+    """
+    def __init__(self, customers):
+        customers = sorted((normalize(name), name, email or '') for name, email in customers)
+        self.name_keys = [key for key, _, _ in customers]
+        self.names = [name for _, name, _ in customers]
+        self.emails = [email for _, _, email in customers]
+
+        by_email = sorted((normalize(email), name, position) for position, (_, name, email) in enumerate(customers))
+        self.email_keys = [key for key, _, _ in by_email]
+        self.email_positions = np.array([position for _, _, position in by_email], dtype=np.int64)
+
+        # Tabs and newlines delimit the haystack, so they are blanked out of the searchable text
+        lines = [f"{name_key}\t{normalize(email)}".replace('\n', ' ') for name_key, email in zip(self.name_keys, self.emails)]
+        self.haystack = '\n'.join(lines)
+        lengths = np.fromiter((len(line) + 1 for line in lines), dtype=np.int64, count=len(lines))
+        self.line_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lines) else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _start(self, keys, sort_names, key, name):
+        # First position strictly after (key, name) in a list sorted by (key, name)
+        position = bisect_left(keys, key)
+        end = bisect_right(keys, key, lo=position)
+        while position < end and sort_names(position) <= name:
+            position += 1
+        return position
+
+    def prefix_names(self, query, after=None):
+        position = bisect_left(self.name_keys, query)
+        if after:
+            position = max(position, self._start(self.name_keys, self.names.__getitem__, *after))
+        while position < len(self.name_keys) and self.name_keys[position].startswith(query):
+            yield self.name_keys[position], self.names[position], self.emails[position]
+            position += 1
+
+    def prefix_emails(self, query, after=None):
+        def name_at(index):
+            return self.names[self.email_positions[index]]
+        position = bisect_left(self.email_keys, query)
+        if after:
+            position = max(position, self._start(self.email_keys, name_at, *after))
+        while position < len(self.email_keys) and self.email_keys[position].startswith(query):
+            customer = self.email_positions[position]
+            yield self.email_keys[position], self.names[customer], self.emails[customer]
+            position += 1
+
+    def substring(self, query, after=None, scan_chars=None):
+        """
+        Matching customers in name order. At most about scan_chars characters are scanned;
+        if the window ends first, a final (key, name, None) marks the last line scanned.
+        """
+        line = self._start(self.name_keys, self.names.__getitem__, *after) if after else 0
+        if line >= len(self.line_starts):
+            return
+        offset = int(self.line_starts[line])
+        end_line = len(self.line_starts)
+        if scan_chars:
+            end_line = max(line + 1, min(end_line, int(np.searchsorted(self.line_starts, offset + scan_chars))))
+        end = int(self.line_starts[end_line]) if end_line < len(self.line_starts) else len(self.haystack)
+        while True:
+            # str.find scans in C; map each hit back to its line and continue at the next one
+            found = self.haystack.find(query, offset, end)
+            if found < 0:
+                break
+            line = int(np.searchsorted(self.line_starts, found, side='right')) - 1
+            yield self.name_keys[line], self.names[line], self.emails[line]
+            if line + 1 >= end_line:
+                break
+            offset = int(self.line_starts[line + 1])
+        if end_line < len(self.line_starts):
+            yield self.name_keys[end_line - 1], self.names[end_line - 1], None
+
+
+class CustomerSearchIndex:
+    """
+    Process-wide in-memory index over CustomerFeatures names and emails for the profile
+    typeahead. Built once; customers created afterwards are picked up by comparing the
+    analytics data version (at most every REFRESH_INTERVAL seconds) and fetching rows with a
+    higher id into a small pending list. Once that list grows past MERGE_THRESHOLD a new
+    snapshot is built in a background thread. A rebuilt feature store (the first indexed
+    row is gone) triggers a full rebuild.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._pending = []
+        self._generation = 0
+        self._merging = False
+        self._min_id = None
+        self._max_id = 0
+        self._version = None
+        self._checked_at = 0.0
+
+    def _build(self):
+        rows = list(CustomerFeatures.objects.values_list('id', 'customer_name', 'customer_email')
+                    .order_by('id').iterator(chunk_size=10000))
+        self._snapshot = Snapshot((name, email) for _, name, email in rows)
+        self._pending = []
+        self._generation += 1
+        self._min_id = rows[0][0] if rows else None
+        self._max_id = rows[-1][0] if rows else 0
+        logger.info(f"Built customer search index for {len(rows)} customers.")
+
+    def _merge(self, snapshot, merged, generation):
+        try:
+            rebuilt = Snapshot(list(zip(snapshot.names, snapshot.emails)) + merged)
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshot = rebuilt
+                    self._pending = self._pending[len(merged):]
+        except Exception as e:
+            logger.error(f"Customer search index merge failed: {str(e)}", exc_info=True)
+        finally:
+            self._merging = False
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = get_data_version()
+            if self._snapshot is not None and version == self._version:
+                return
+            if (self._snapshot is None or (self._min_id is not None and
+                                           not CustomerFeatures.objects.filter(pk=self._min_id).exists())):
+                self._build()
+            else:
+                added = list(CustomerFeatures.objects.filter(pk__gt=self._max_id)
+                             .values_list('id', 'customer_name', 'customer_email').order_by('id'))
+                if added:
+                    self._max_id = added[-1][0]
+                    self._min_id = self._min_id or added[0][0]
+                    self._pending = self._pending + [(name, email or '') for _, name, email in added]
+                if len(self._pending) > MERGE_THRESHOLD and not self._merging:
+                    self._merging = True
+                    threading.Thread(target=self._merge, args=(self._snapshot, list(self._pending), self._generation),
+                                     name='customer-search-merge', daemon=True).start()
+            self._version = version
+
+    @staticmethod
+    def _pending_matches(pending, query, field, after):
+        # Linear scan of the (small) pending list, as sorted (key, name, email) rows
+        rows = []
+        for name, email in pending:
+            name_key, email_key = normalize(name), normalize(email)
+            if field == 'email':
+                key, matched = email_key, email_key.startswith(query)
+            elif field == 'name':
+                key, matched = name_key, name_key.startswith(query)
+            else:
+                key, matched = name_key, query in f"{name_key}\t{email_key}"
+            if matched and (after is None or (key, name) > after):
+                rows.append((key, name, email))
+        return sorted(rows)
+
+    def search(self, query, mode='prefix', limit=DEFAULT_LIMIT, cursor=None):
+        """
+        Customers matching query (case-insensitive) as ([{'name', 'email'}], next_cursor).
+        Prefix mode returns name matches, then email matches not already returned; substring
+        mode searches both, ordered by name, scanning a bounded window per call.
+        """
+        self._refresh()
+        snapshot, pending = self._snapshot, self._pending
+        query = normalize(query).replace('\t', ' ').replace('\n', ' ').strip()
+        phase, after = ('name' if mode == 'prefix' else 'substring'), None
+        if cursor:
+            phase, key, name = decode_cursor(cursor)
+            after = (key, name) if key is not None else None
+            if phase not in (('name', 'email') if mode == 'prefix' else ('substring',)):
+                raise ValueError("Invalid cursor")
+
+        # (phase, snapshot matches, pending field, position); the cursor only applies to its own phase
+        if mode == 'substring':
+            streams = [('substring', snapshot.substring(query, after, SUBSTRING_SCAN_CHARS), 'both', after)]
+        elif phase == 'name':
+            streams = [('name', snapshot.prefix_names(query, after), 'name', after)]
+            if query:  # every customer already matched the empty prefix by name
+                streams.append(('email', snapshot.prefix_emails(query), 'email', None))
+        else:
+            streams = [('email', snapshot.prefix_emails(query, after), 'email', after)]
+
+        results, last = [], None
+        for stream_phase, indexed, field, position in streams:
+            extra = self._pending_matches(pending, query, field, position) if pending else []
+            for key, name, email in merge(indexed, extra):
+                if email is None:
+                    # End of this request's substring scan window
+                    return results, encode_cursor(stream_phase, key, name)
+                # Customers whose name matched were already listed in the name phase
+                if stream_phase == 'email' and normalize(name).startswith(query):
+                    continue
+                if len(results) == limit:
+                    # Continue after the last row returned, or at the start of this phase if
+                    # the page filled up in the previous one
+                    return results, encode_cursor(*(last if last[0] == stream_phase else (stream_phase, None, None)))
+                results.append({'name': name, 'email': email})
+                last = (stream_phase, key, name)
+        return results, None
+
+    def status(self):
+        return {
+            'customers': (len(self._snapshot) if self._snapshot else 0) + len(self._pending),
+            'pending': len(self._pending),
+            'data_version': self._version,
+        }
+
+
+index = CustomerSearchIndex()
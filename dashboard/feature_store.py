@@ -0,0 +1,166 @@
+import logging
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum
+
+from .models import CustomerFeatures, Order
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 3600
+
+
+def apply_order(order):
+    """
+    Fold a newly created order into its customer's CustomerFeatures row in O(1).
+
+    The running gap sum is the sum of the days between consecutive (date-sorted) orders.
+    An order that lands between two existing orders splits one gap into two with the same
+    total, so only orders before the first or after the last order change it.
+    """
+    order_total = Decimal(str(order.order_total or 0))
+    with transaction.atomic():
+        features, created = CustomerFeatures.objects.select_for_update().get_or_create(
+            customer_name=order.customer_name,
+            defaults={
+                'customer_email': order.customer_email,
+                'first_order_date': order.order_date,
+                'last_order_date': order.order_date,
+                'order_count': 1,
+                'monetary': order_total,
+                'gap_sum_days': 0.0,
+            },
+        )
+        if created:
+            return features
+
+        if order.order_date >= features.last_order_date:
+            features.gap_sum_days += (order.order_date - features.last_order_date).total_seconds() / SECONDS_PER_DAY
+            features.last_order_date = order.order_date
+            features.customer_email = order.customer_email
+        elif order.order_date < features.first_order_date:
+            features.gap_sum_days += (features.first_order_date - order.order_date).total_seconds() / SECONDS_PER_DAY
+            features.first_order_date = order.order_date
+
+        features.order_count += 1
+        features.monetary += order_total
+        features.save()
+    return features
+
+
+def refresh_customers(customer_names):
+    """
+    Recompute the CustomerFeatures rows of a few customers from their orders (deleting rows
+    left without orders), for edited or deleted orders that O(1) folding can't undo.
+    """
+    customer_names = set(customer_names)
+    rows = {row['customer_name']: row for row in _customer_aggregates(Order.objects.filter(customer_name__in=customer_names))}
+    with transaction.atomic():
+        for customer_name in sorted(customer_names):
+            row = rows.get(customer_name)
+            if row is None:
+                CustomerFeatures.objects.filter(customer_name=customer_name).delete()
+            else:
+                CustomerFeatures.objects.update_or_create(customer_name=customer_name, defaults=_feature_values(row))
+
+
+def _customer_aggregates(orders):
+    latest_email = (Order.objects.filter(customer_name=OuterRef('customer_name'))
+                    .order_by('-order_date', '-order_id')
+                    .values('customer_email')[:1])
+    return (orders.values('customer_name')
+            .annotate(first_order_date=Min('order_date'),
+                      last_order_date=Max('order_date'),
+                      order_count=Count('order_id'),
+                      monetary=Sum('order_total'),
+                      latest_email=Subquery(latest_email))
+            .order_by())
+
+
+def _feature_values(row):
+    return {
+        'customer_email': row['latest_email'],
+        'first_order_date': row['first_order_date'],
+        'last_order_date': row['last_order_date'],
+        'order_count': row['order_count'],
+        'monetary': row['monetary'] or 0,
+        'gap_sum_days': (row['last_order_date'] - row['first_order_date']).total_seconds() / SECONDS_PER_DAY,
+    }
+
+
+def rebuild_customer_features(batch_size=5000):
+    """
+    Recompute every CustomerFeatures row from the orders table. Aggregation happens in the
+    database and rows are streamed, so memory stays bounded by batch_size.
+    """
+    aggregates = _customer_aggregates(Order.objects.all())
+
+    total = 0
+    with transaction.atomic():
+        CustomerFeatures.objects.all().delete()
+        batch = []
+        for row in aggregates.iterator(chunk_size=batch_size):
+            batch.append(CustomerFeatures(customer_name=row['customer_name'], **_feature_values(row)))
+            if len(batch) >= batch_size:
+                CustomerFeatures.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            CustomerFeatures.objects.bulk_create(batch)
+            total += len(batch)
+
+    logger.info(f"Rebuilt customer features for {total} customers.")
+    return total
+
+
+def features_frame(queryset=None):
+    """
+    Load CustomerFeatures as a DataFrame with one row per customer.
+    """
+    if queryset is None:
+        queryset = CustomerFeatures.objects.all()
+    rows = queryset.values_list('customer_name', 'customer_email', 'first_order_date', 'last_order_date',
+                                'order_count', 'monetary', 'gap_sum_days')
+    df = pd.DataFrame(list(rows), columns=['customer_name', 'customer_email', 'first_order_date', 'last_order_date',
+                                           'frequency', 'monetary', 'gap_sum_days'])
+    df['first_order_date'] = pd.to_datetime(df['first_order_date'], utc=True)
+    df['last_order_date'] = pd.to_datetime(df['last_order_date'], utc=True)
+    df['monetary'] = df['monetary'].astype(float)
+    df['avg_days_between_orders'] = (df['gap_sum_days'] / (df['frequency'] - 1).where(df['frequency'] > 1)).fillna(0.0)
+    return df
+
+
+def compare_with_batch(batch_df, tolerance=1e-6):
+    """
+    Compare the incremental store against features produced by the full-batch pipeline
+    (ml_data_preparation.create_features). Returns a list of mismatch descriptions.
+    """
+    store_df = features_frame()
+    mismatches = []
+
+    missing = set(batch_df['customer_name']) ^ set(store_df['customer_name'])
+    for customer_name in sorted(missing):
+        mismatches.append(f"{customer_name}: present in only one of store/batch")
+
+    merged = batch_df.merge(store_df, on='customer_name', suffixes=('_batch', '_store'))
+    checks = {
+        'frequency': lambda a, b: a == b,
+        'monetary': lambda a, b: abs(a - b) <= 0.01,
+        'avg_days_between_orders': lambda a, b: abs(a - b) <= tolerance * max(1.0, abs(a)),
+        'customer_email': lambda a, b: a == b,
+    }
+    for column, matches in checks.items():
+        for customer_name, a, b in zip(merged['customer_name'], merged[f'{column}_batch'], merged[f'{column}_store']):
+            if column == 'monetary':
+                a, b = float(a), float(b)
+            if not matches(a, b):
+                mismatches.append(f"{customer_name}: {column} batch={a} store={b}")
+
+    last_batch = pd.to_datetime(merged['last_order_date_batch'], utc=True)
+    for customer_name, a, b in zip(merged['customer_name'], last_batch, merged['last_order_date_store']):
+        if a != b:
+            mismatches.append(f"{customer_name}: last_order_date batch={a} store={b}")
+
+    return mismatches
@@ -0,0 +1,206 @@
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Typed, column-projectable storage for the DataFrames the ML pipeline hands between steps
+# (rfm_features, rfm_features_with_segments). Paths are given without an extension; the
+# format adds its own. A missing file falls back to a legacy "<name>.csv".
+
+ALIGNMENT = 64
+MAGIC = b'DCOLS1\n\x00'
+STRING_SEPARATOR = '\x00'
+
+
+def _aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+class ColumnsFormat:
+    """
+    Single-file columnar format read through mmap: a JSON header, then one 64-byte aligned
+    buffer per column. Numeric, boolean and datetime columns and category codes are
+    returned as zero-copy views of the mapping; strings are stored NUL-separated and
+    decoded in one pass. Only the requested columns are touched.
+    """
+    extension = '.cols'
+
+    def _encode(self, series):
+        # (header entry, [buffers]) for one column
+        entry = {'name': series.name}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            entry.update(kind='category', dtype='int32', categories=categories.tolist(),
+                         category_dtype=str(categories.dtype), ordered=bool(series.cat.ordered))
+            return entry, [series.cat.codes.to_numpy(dtype=np.int32)]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            values = series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy()
+            entry.update(kind='datetime', dtype=str(values.dtype), tz=str(series.dt.tz))
+            return entry, [values]
+        if pd.api.types.is_datetime64_dtype(series.dtype):
+            values = series.to_numpy()
+            entry.update(kind='datetime', dtype=str(values.dtype), tz=None)
+            return entry, [values]
+        if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.to_numpy()
+            entry.update(kind='numeric', dtype=str(values.dtype))
+            return entry, [values]
+
+        if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+            # e.g. Decimal columns read from the database
+            values = pd.to_numeric(series).to_numpy(dtype=np.float64)
+            entry.update(kind='numeric', dtype='float64')
+            return entry, [values]
+        missing = series.isna().to_numpy()
+        text = STRING_SEPARATOR.join(series.fillna('').tolist())
+        if text.count(STRING_SEPARATOR) != max(len(series) - 1, 0):
+            raise ValueError(f"Column {series.name} contains NUL characters")
+        entry.update(kind='string', dtype='uint8', nullable=bool(missing.any()))
+        buffers = [np.frombuffer(text.encode('utf-8'), dtype=np.uint8)]
+        if entry['nullable']:  # the mask shares the uint8 dtype
+            buffers.append(missing.astype(np.uint8))
+        return entry, buffers
+
+    def write(self, df, path):
+        entries, buffers = [], []
+        for column in df.columns:
+            entry, column_buffers = self._encode(df[column])
+            entries.append(entry)
+            buffers.append(column_buffers)
+
+        # The header holds the buffer offsets, which depend on the header's own size:
+        # lay the buffers out after a guessed header size and grow it until the header fits
+        header = {'rows': len(df), 'columns': entries}
+        header_size = ALIGNMENT
+        while True:
+            position = header_size
+            for entry, column_buffers in zip(entries, buffers):
+                entry['buffers'] = []
+                for buffer in column_buffers:
+                    entry['buffers'].append([position, buffer.nbytes])
+                    position = _aligned(position + buffer.nbytes)
+            encoded = json.dumps(header).encode('utf-8')
+            if len(MAGIC) + 8 + len(encoded) <= header_size:
+                break
+            header_size = _aligned(len(MAGIC) + 8 + len(encoded) + 64)
+
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(encoded)) + encoded)
+            for entry, column_buffers in zip(entries, buffers):
+                for (offset, _), buffer in zip(entry['buffers'], column_buffers):
+                    f.write(b'\x00' * (offset - f.tell()))
+                    f.write(np.ascontiguousarray(buffer).tobytes())
+
+    def read(self, path, columns=None):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a columns file")
+            (header_length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_length))
+            # Mapped read-only; the arrays keep the mapping alive after the file is replaced
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+        rows = header['rows']
+        entries = {entry['name']: entry for entry in header['columns']}
+        names = list(entries) if columns is None else list(columns)
+        missing = [name for name in names if name not in entries]
+        if missing:
+            raise KeyError(f"Columns not in {path}: {missing}")
+
+        data = {}
+        for name in names:
+            entry = entries[name]
+            dtype = np.dtype(entry['dtype'])
+            views = [np.frombuffer(mapping, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+                     if length else np.zeros(0, dtype=dtype)
+                     for offset, length in entry['buffers']]
+            if entry['kind'] == 'numeric':
+                data[name] = views[0]
+            elif entry['kind'] == 'datetime':
+                values = pd.Series(views[0], copy=False)
+                data[name] = values.dt.tz_localize('UTC').dt.tz_convert(entry['tz']) if entry['tz'] else values
+            elif entry['kind'] == 'category':
+                categories = pd.Index(entry['categories'], dtype=entry['category_dtype'])
+                data[name] = pd.Categorical.from_codes(views[0], categories=categories, ordered=entry['ordered'])
+            else:
+                values = views[0].tobytes().decode('utf-8').split(STRING_SEPARATOR) if rows else []
+                series = pd.Series(values, dtype=object)
+                if entry['nullable']:
+                    series = series.mask(views[1].astype(bool))
+                data[name] = series.to_numpy()
+        return pd.DataFrame(data, columns=names, copy=False)
+
+
+class ParquetFormat:
+    """
+    Apache Parquet through pyarrow, memory-mapped on read.
+    """
+    extension = '.parquet'
+
+    def write(self, df, path):
+        df.to_parquet(path, index=False, engine='pyarrow')
+
+    def read(self, path, columns=None):
+        return pd.read_parquet(path, columns=columns, engine='pyarrow', memory_map=True)
+
+
+FORMATS = {'columns': ColumnsFormat, 'parquet': ParquetFormat}
+
+
+def get_format(name=None):
+    """
+    The configured frame format (ML_ARTIFACT_FORMAT): 'parquet', 'columns', or 'auto'
+    for Parquet when pyarrow is installed and the columns format otherwise.
+    """
+    name = name or getattr(settings, 'ML_ARTIFACT_FORMAT', 'auto')
+    if name == 'auto':
+        name = 'parquet' if pyarrow is not None else 'columns'
+    if name == 'parquet' and pyarrow is None:
+        raise ImportError("ML_ARTIFACT_FORMAT 'parquet' requires pyarrow")
+    if name not in FORMATS:
+        raise ValueError(f"Unknown ML_ARTIFACT_FORMAT: {name}")
+    return FORMATS[name]()
+
+
+def frame_path(base_path, format=None):
+    return base_path + get_format(format).extension
+
+
+def write_frame(df, base_path, format=None):
+    """
+    Write df next to its final path and rename it into place, so readers never see a
+    half-written file. Returns the path written.
+    """
+    frame_format = get_format(format)
+    path = base_path + frame_format.extension
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    frame_format.write(df, temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+def read_frame(base_path, columns=None, format=None):
+    """
+    Read the frame at base_path (only `columns` if given), or None if it does not exist.
+    """
+    frame_format = get_format(format)
+    path = base_path + frame_format.extension
+    if os.path.exists(path):
+        return frame_format.read(path, columns=columns)
+    legacy_path = base_path + '.csv'
+    if os.path.exists(legacy_path):
+        logger.info(f"{path} not found; reading legacy {legacy_path}")
+        return pd.read_csv(legacy_path, usecols=columns)
+    return None
@@ -0,0 +1,115 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Avg, Count, FloatField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast
+
+
+def histogram_labels(bin_edges):
+    return [f"{int(bin_edges[i])}-{int(bin_edges[i+1])}" for i in range(len(bin_edges) - 1)]
+
+
+def _bin_edges(low, high, bins):
+    # Same edges as np.histogram, including its +/-0.5 range for constant data
+    low, high = float(low), float(high)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def db_histogram(queryset, field, bins=30):
+    """
+    Histogram of a numeric column computed by the database: one aggregate with a conditional
+    count per bin, so no rows are transferred. field may be an aggregate annotation of a
+    grouped queryset (e.g. per-customer order counts), which the database buckets over a
+    subquery. Matches np.histogram's binning (half-open bins, last bin closed).
+    Returns (labels, counts).
+    """
+    bounds = queryset.aggregate(low=Min(field), high=Max(field))
+    if bounds['low'] is None:
+        return [], []
+
+    edges = _bin_edges(bounds['low'], bounds['high'], bins)
+    # Decimal edges for decimal columns; floats otherwise, which integer lookups round up
+    # (so count >= 2.5 means count >= 3, as in np.histogram)
+    if isinstance(bounds['low'], Decimal):
+        edge_values = [Decimal(str(edge)) for edge in edges]
+    else:
+        edge_values = [float(edge) for edge in edges]
+    # The outer edges are the column's own min and max, so the first and last bins need no
+    # bound there (a rounded edge could otherwise drop the extreme values)
+    conditions = []
+    for i in range(bins):
+        condition = Q()
+        if i > 0:
+            condition &= Q(**{f'{field}__gte': edge_values[i]})
+        if i < bins - 1:
+            condition &= Q(**{f'{field}__lt': edge_values[i + 1]})
+        conditions.append(condition)
+    return histogram_labels(edges), _count_bins(queryset, field, conditions)
+
+
+def db_days_since_histogram(queryset, field, reference, bins=20):
+    """
+    Histogram of the whole days from a datetime column to reference ((reference - value).days,
+    e.g. recency from a per-customer last order date), computed by the database like
+    db_histogram. Each bin on days becomes a range on the datetime itself.
+    """
+    bounds = queryset.aggregate(low=Min(field), high=Max(field))
+    if bounds['low'] is None:
+        return [], []
+
+    # The latest value is the fewest days away
+    edges = _bin_edges((reference - bounds['high']).days, (reference - bounds['low']).days, bins)
+    # days >= e  <=>  value <= reference - ceil(e) days
+    # days <  e  <=>  value >  reference - ceil(e) days
+    # As in db_histogram, the first and last bins are open at the column's min and max
+    conditions = []
+    for i in range(bins):
+        condition = Q()
+        if i > 0:
+            condition &= Q(**{f'{field}__lte': reference - timedelta(days=math.ceil(edges[i]))})
+        if i < bins - 1:
+            condition &= Q(**{f'{field}__gt': reference - timedelta(days=math.ceil(edges[i + 1]))})
+        conditions.append(condition)
+    return histogram_labels(edges), _count_bins(queryset, field, conditions)
+
+
+def _count_bins(queryset, field, conditions):
+    # One conditional count per bin, in a single aggregate query. Counting the field itself
+    # (rather than pk) keeps a grouped queryset's grouping intact.
+    result = queryset.aggregate(**{f'bin_{i}': Count(field, filter=condition or None)
+                                   for i, condition in enumerate(conditions)})
+    return [result[f'bin_{i}'] for i in range(len(conditions))]
+
+
+def array_histogram(values, bins=20):
+    """
+    Histogram of an in-memory array. Returns (labels, counts).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return [], []
+    counts, edges = np.histogram(values, bins=bins)
+    return histogram_labels(edges), counts.tolist()
+
+
+def db_correlation(queryset, x, y):
+    """
+    Pearson correlation of two columns computed by the database, over the rows where both
+    are set. The means come first, so the second query sums centred values (raw sums of
+    squares lose precision to cancellation on large or offset data).
+    """
+    queryset = queryset.filter(**{f'{x}__isnull': False, f'{y}__isnull': False})
+    x_value, y_value = Cast(x, FloatField()), Cast(y, FloatField())
+    means = queryset.aggregate(n=Count('pk'), mx=Avg(x_value), my=Avg(y_value))
+    if not means['n']:
+        return None
+    dx, dy = x_value - Value(means['mx']), y_value - Value(means['my'])
+    sums = queryset.aggregate(sxy=Sum(dx * dy), sxx=Sum(dx * dx), syy=Sum(dy * dy))
+    if not sums['sxx'] or not sums['syy'] or sums['sxx'] <= 0 or sums['syy'] <= 0:
+        return None
+    return sums['sxy'] / np.sqrt(sums['sxx'] * sums['syy'])
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import segments
+from dashboard.caching import bump_data_version
+from dashboard.frames import read_frame, write_frame
+from dashboard.ml_utils import RFM_SEGMENTS_BASE, RFM_SEGMENTS_PATH, predict_churn_batch, registry
+from dashboard.segmentation import get_rules, load_rules
+
+class Command(BaseCommand):
+    help = 'Re-segments the current rfm_features_with_segments artifact with the segment rules and publishes it, without retraining'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', help='Rules JSON file to apply instead of SEGMENT_RULES_PATH')
+        parser.add_argument('--dry-run', action='store_true', help='Print the new segment sizes without writing or publishing')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        try:
+            rules = load_rules(options['rules']) if options['rules'] else get_rules()
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Invalid segment rules: {e}")
+
+        df = read_frame(RFM_SEGMENTS_BASE)
+        if df is None:
+            raise CommandError(f"Segments file not found at {RFM_SEGMENTS_PATH}")
+        try:
+            df['Segment'] = rules.assign(df)
+        except KeyError as e:
+            raise CommandError(str(e))
+
+        for segment, total in df['Segment'].value_counts(sort=False).items():
+            self.stdout.write(f"{segment}: {total}")
+        if options['dry_run']:
+            return
+
+        write_frame(df, RFM_SEGMENTS_BASE)
+        snapshot = registry.reload()
+        if snapshot.model is not None and snapshot.scaler is not None:
+            df['churn_probability'] = predict_churn_batch(df, snapshot.model, snapshot.scaler)
+        generation = segments.publish_segments(df, batch_size=options['batch_size'])
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Re-segmented {len(df)} customers; published as generation {generation}."))
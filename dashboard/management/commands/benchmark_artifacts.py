@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from dashboard import benchmarking, frames
+
+SEGMENTS = np.array(['Loyal Customer', 'Active Customer', 'Average Customer', 'At Risk', 'New Customer'])
+# Column sets read by the pipeline and the views
+PROJECTIONS = {
+    'all columns': None,
+    'segment lookup (customer_name, Segment)': ['customer_name', 'Segment'],
+    'churn features (4 numeric)': ['recency', 'frequency', 'monetary', 'avg_days_between_orders'],
+}
+
+
+def synthetic_segments_frame(rows, seed=42):
+    """
+    A frame shaped like rfm_features_with_segments, with typed columns.
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows)
+    scores = rng.integers(1, 6, (rows, 3))
+    return pd.DataFrame({
+        'customer_name': pd.Series(ids).map('Customer {}'.format),
+        'last_order_date': pd.Timestamp('2020-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 5 * 365 * 24 * 3600, rows), unit='s'),
+        'frequency': rng.integers(1, 50, rows),
+        'monetary': np.round(rng.uniform(5, 5000, rows), 2),
+        'recency': rng.uniform(0, 2000, rows),
+        'avg_days_between_orders': rng.uniform(0, 365, rows),
+        'customer_email': pd.Series(ids).map('customer{}@example.com'.format),
+        'R': scores[:, 0],
+        'F': scores[:, 1],
+        'M': scores[:, 2],
+        'RFM_Score': (scores[:, 0] * 100 + scores[:, 1] * 10 + scores[:, 2]).astype(np.int16),
+        'Segment': pd.Categorical(SEGMENTS[rng.integers(0, len(SEGMENTS), rows)]),
+        'Churn': rng.integers(0, 2, rows),
+    })
+
+
+def touch(frame):
+    # Read every numeric value, so lazily mapped pages are paid for inside the measurement
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if values.dtype.kind in 'biuf':
+            values.sum()
+
+
+class Command(BaseCommand):
+    help = 'Compares load times of the segments artifact as CSV and in each available frame format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Synthetic customers')
+        parser.add_argument('--memory', action='store_true', help='Also record peak traced memory (slower)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Generating {options['rows']} synthetic customers...")
+        df = synthetic_segments_frame(options['rows'])
+        formats = ['csv'] + [name for name in frames.FORMATS if name != 'parquet' or frames.pyarrow is not None]
+        if frames.pyarrow is None:
+            self.stdout.write('pyarrow not installed; skipping parquet.')
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            base_path = os.path.join(directory, 'segments')
+            for name in formats:
+                with benchmarking.measure(results, f'{name}: write'):
+                    if name == 'csv':
+                        path = base_path + '.csv'
+                        df.to_csv(path, index=False)
+                    else:
+                        path = frames.write_frame(df, base_path, format=name)
+                results[f'{name}: write']['bytes'] = os.path.getsize(path)
+
+                for label, columns in PROJECTIONS.items():
+                    with benchmarking.measure(results, f'{name}: read {label}', track_memory=options['memory']):
+                        if name == 'csv':
+                            # What the pipeline did before: parse the file, then the timestamps
+                            frame = pd.read_csv(path, usecols=columns)
+                            if 'last_order_date' in frame:
+                                frame['last_order_date'] = pd.to_datetime(frame['last_order_date'], utc=True)
+                        else:
+                            frame = frames.read_frame(base_path, columns=columns, format=name)
+                        touch(frame)
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
@@ -0,0 +1,69 @@
+import pandas as pd
+from django.core.management.base import BaseCommand
+from dashboard import benchmarking
+from dashboard.cohorts import build_cohorts
+
+
+def legacy_cohort_matrix(df, max_months=12):
+    """
+    The per-cohort mask-scan loop cohort_data used before the vectorized engine (revenue
+    matrix only), kept as the baseline for the benchmark.
+    """
+    first_orders = df.groupby('customer_email')['order_date'].min().reset_index()
+    first_orders['cohort'] = first_orders['order_date'].dt.strftime('%b %Y')
+    df = df.merge(first_orders[['customer_email', 'cohort']], on='customer_email', how='left')
+    df['order_month'] = df['order_date'].dt.tz_localize(None).dt.to_period('M')
+    df['cohort_month'] = pd.to_datetime(df['cohort'], format='%b %Y').dt.to_period('M')
+    df['month_diff'] = (df['order_month'].dt.start_time - df['cohort_month'].dt.start_time).dt.days // 30
+
+    matrix = []
+    for cohort in sorted(df['cohort'].unique(), key=lambda x: pd.to_datetime(x, format='%b %Y')):
+        cohort_data = df[df['cohort'] == cohort]
+        revenue_rates = [len(cohort_data['customer_email'].unique())]
+        for month in range(1, max_months + 1):
+            revenue_rates.append(round(float(cohort_data[cohort_data['month_diff'] == month]['order_total'].sum() or 0), 2))
+        matrix.append(revenue_rates)
+    for month in range(1, max_months + 1):
+        df[df['month_diff'] == month]['order_total'].sum()
+    return matrix
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the vectorized cohort engine against the legacy per-cohort loop at increasing customer counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Customer counts to benchmark')
+        parser.add_argument('--orders-per-customer', type=int, default=5, help='Average orders per customer')
+        parser.add_argument('--years', type=int, default=5, help='Years of order history (one cohort per month)')
+        parser.add_argument('--legacy-max-rows', type=int, default=1000000,
+                            help='Skip the legacy loop above this many orders')
+
+    def handle(self, *args, **options):
+        results = {}
+        per_row = {}
+        for n_customers in options['customers']:
+            emails, order_dates, totals = benchmarking.synthetic_cohort_orders(
+                n_customers, options['orders_per_customer'], options['years'])
+            n_rows = len(emails)
+            self.stdout.write(f'{n_customers} customers, {n_rows} orders...')
+
+            for mode in ('approx', 'calendar'):
+                label = f'{n_customers} customers: engine ({mode})'
+                with benchmarking.measure(results, label, track_memory=True):
+                    build_cohorts(emails, order_dates, totals, month_diff=mode)
+                per_row[label] = results[label]['seconds'] / n_rows
+
+            if n_rows <= options['legacy_max_rows']:
+                frame = pd.DataFrame({'customer_email': emails, 'order_date': order_dates, 'order_total': totals})
+                label = f'{n_customers} customers: legacy loop'
+                with benchmarking.measure(results, label):
+                    legacy_cohort_matrix(frame)
+                per_row[label] = results[label]['seconds'] / n_rows
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
+        # Roughly constant time per order across sizes means linear scaling
+        self.stdout.write('Time per order:')
+        for label, seconds in per_row.items():
+            self.stdout.write(f'  {label}: {seconds * 1e6:.2f} us')
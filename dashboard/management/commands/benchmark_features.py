@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from dashboard import benchmarking
+from dashboard.ml_data_preparation import clean_and_standardize_data, create_features
+
+
+def legacy_create_features(df):
+    """
+    create_features before vectorization (per-customer apply for the order gaps, two sorts),
+    kept as the baseline for the benchmark.
+    """
+    current_date = pd.to_datetime('2025-04-01').tz_localize('UTC')
+    customer_emails = df.sort_values('order_date').groupby('customer_name')['customer_email'].last().reset_index()
+    rfm_df = df.groupby('customer_name').agg({
+        'order_date': ['max', 'count'],
+        'order_total': 'sum',
+    }).reset_index()
+    rfm_df.columns = ['customer_name', 'last_order_date', 'frequency', 'monetary']
+    rfm_df['last_order_date'] = rfm_df['last_order_date'].dt.tz_localize('UTC') if rfm_df['last_order_date'].dt.tz is None else rfm_df['last_order_date']
+    rfm_df['recency'] = (current_date - rfm_df['last_order_date']).dt.total_seconds() / (24 * 3600)
+    avg_time_between = df.groupby('customer_name').apply(
+        lambda x: (x['order_date'].sort_values().diff().dt.total_seconds() / (24 * 3600)).mean()
+    ).reset_index(name='avg_days_between_orders')
+    rfm_df = rfm_df.merge(avg_time_between, on='customer_name', how='left')
+    rfm_df = rfm_df.merge(customer_emails, on='customer_name', how='left')
+    rfm_df['avg_days_between_orders'] = rfm_df['avg_days_between_orders'].fillna(0)
+    return rfm_df
+
+
+def max_difference(legacy, vectorized):
+    """
+    Largest absolute difference between the two outputs' numeric columns; None if the
+    customers, last order dates or emails differ.
+    """
+    if (len(legacy) != len(vectorized)
+            or not (legacy['customer_name'].to_numpy() == vectorized['customer_name'].to_numpy()).all()
+            or not (legacy['last_order_date'] == vectorized['last_order_date']).all()
+            or not (legacy['customer_email'].to_numpy() == vectorized['customer_email'].to_numpy()).all()):
+        return None
+    return max(float(np.abs(legacy[column].astype(float).to_numpy() - vectorized[column].to_numpy()).max())
+               for column in ('frequency', 'monetary', 'recency', 'avg_days_between_orders'))
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks create_features against the legacy per-customer implementation on synthetic order tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000, 5000000, 20000000],
+                            help='Order counts to benchmark')
+        parser.add_argument('--orders-per-customer', type=int, default=10, help='Average orders per customer')
+        parser.add_argument('--legacy-max-rows', type=int, default=100000,
+                            help='Skip the legacy implementation above this many orders')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Skip peak memory tracking (tracemalloc slows the Python-level legacy loop)')
+
+    def handle(self, *args, **options):
+        results = {}
+        track_memory = not options['no_memory']
+        for n_rows in options['rows']:
+            self.stdout.write(f'{n_rows} orders...')
+            with benchmarking.measure(results, f'{n_rows} orders: generate'):
+                orders = benchmarking.synthetic_feature_orders(n_rows, options['orders_per_customer'])
+            with benchmarking.measure(results, f'{n_rows} orders: clean', track_memory=track_memory):
+                orders = clean_and_standardize_data(orders)
+            with benchmarking.measure(results, f'{n_rows} orders: create_features', track_memory=track_memory):
+                vectorized = create_features(orders)
+
+            if n_rows <= options['legacy_max_rows']:
+                with benchmarking.measure(results, f'{n_rows} orders: legacy create_features', track_memory=track_memory):
+                    legacy = legacy_create_features(orders)
+                difference = max_difference(legacy, vectorized)
+                self.stdout.write('  outputs differ' if difference is None
+                                  else f'  same customers, dates and emails; max numeric difference {difference:.2e}')
+            del orders
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
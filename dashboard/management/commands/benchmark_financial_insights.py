@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from dashboard import benchmarking, order_rollups
+from dashboard.models import Order, OrderDailyRollup
+from dashboard.timeseries import aggregate_series
+from dashboard.views import FINANCIAL_METRICS
+
+class Command(BaseCommand):
+    help = 'Benchmarks per-metric monthly scans against the single-pass financial aggregation (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000, help='Synthetic orders to insert')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Orders generated per insert chunk')
+
+    def handle(self, *args, **options):
+        results = {}
+        with transaction.atomic():
+            self.stdout.write(f"Inserting {options['rows']} synthetic orders...")
+            with benchmarking.measure(results, 'insert orders'):
+                benchmarking.insert_synthetic_orders(options['rows'], chunk_size=options['chunk_size'])
+            with benchmarking.measure(results, 'rebuild daily rollups'):
+                order_rollups.rebuild_rollups()
+
+            start = Order.objects.earliest('order_date').order_date
+            end = Order.objects.latest('order_date').order_date
+
+            # Before: one monthly GROUP BY over orders per metric, as financial_insights_data used to do
+            with benchmarking.measure(results, 'before: one orders scan per metric', count_queries=True):
+                for name, expression in FINANCIAL_METRICS.items():
+                    list(Order.objects.annotate(month=TruncMonth('order_date'))
+                         .values('month').annotate(**{name: expression}).order_by('month'))
+
+            with benchmarking.measure(results, 'after: single orders scan', count_queries=True):
+                aggregate_series(Order.objects.all(), FINANCIAL_METRICS, start, end, date_field='order_date')
+
+            with benchmarking.measure(results, 'after: single rollup scan', count_queries=True):
+                aggregate_series(OrderDailyRollup.objects.all(), FINANCIAL_METRICS, start, end)
+
+            transaction.set_rollback(True)
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from dashboard import benchmarking
+from dashboard.cohorts import build_cohorts
+from dashboard.ml_data_preparation import create_features
+
+
+class Command(BaseCommand):
+    help = 'Reports the speedup of customer-sharded create_features and build_cohorts over the serial run per worker count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000, help='Synthetic orders')
+        parser.add_argument('--orders-per-customer', type=int, default=10, help='Average orders per customer')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                            help='Worker counts to compare (1 is the serial path)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{os.cpu_count()} CPU(s); generating {options['rows']} synthetic orders...")
+        orders = benchmarking.synthetic_feature_orders(options['rows'], options['orders_per_customer'])
+        customers = orders['customer_email'].to_numpy()
+        order_dates = orders['order_date']
+        amounts = orders['order_total'].to_numpy()
+
+        results = {}
+        baseline = {}
+        for workers in sorted(set(options['workers'])):
+            label = f'{workers} worker(s): create_features'
+            with benchmarking.measure(results, label):
+                features = create_features(orders, workers=workers)
+            baseline.setdefault('features', (results[label]['seconds'], features))
+
+            label = f'{workers} worker(s): build_cohorts'
+            with benchmarking.measure(results, label):
+                cohorts = build_cohorts(customers, order_dates, amounts, workers=workers)
+            baseline.setdefault('cohorts', (results[label]['seconds'], cohorts))
+
+            # The merged shards must reproduce the first (serial) run
+            if not features.equals(baseline['features'][1]):
+                self.stdout.write(self.style.ERROR(f'{workers} worker(s): features differ from the serial run'))
+            if not (np.array_equal(cohorts['retention_matrix'], baseline['cohorts'][1]['retention_matrix'])
+                    and np.allclose(cohorts['revenue_matrix'], baseline['cohorts'][1]['revenue_matrix'])):
+                self.stdout.write(self.style.ERROR(f'{workers} worker(s): cohorts differ from the serial run'))
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
+        self.stdout.write('Speedup over the first run:')
+        for label, entry in results.items():
+            stage = 'features' if label.endswith('create_features') else 'cohorts'
+            self.stdout.write(f"  {label}: {baseline[stage][0] / entry['seconds']:.2f}x")
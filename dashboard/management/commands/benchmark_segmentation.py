@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from dashboard import benchmarking
+from dashboard.segmentation import get_rules, rfm_code
+
+
+def legacy_assign_segments(df):
+    """
+    The row-wise segment assignment and string RFM score perform_rfm_analysis used before the
+    rules engine, kept as the baseline for the benchmark.
+    """
+    rfm_score = df['R'].astype(str) + df['F'].astype(str) + df['M'].astype(str)
+
+    def assign_segment(row):
+        r, f, m = int(row['R']), int(row['F']), int(row['M'])
+        if r >= 4 and f >= 4 and m >= 4:
+            return "Loyal Customer"
+        elif r >= 3 and f >= 3 and m >= 3:
+            return "Active Customer"
+        elif r >= 2 and f >= 2 and m >= 2:
+            return "Average Customer"
+        elif r <= 2 and f <= 2 and m <= 2:
+            return "At Risk"
+        else:
+            return "New Customer"
+
+    return rfm_score, df.apply(assign_segment, axis=1)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the segment rules engine against the legacy row-wise assign_segment on synthetic R/F/M scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, nargs='+', default=[10000, 100000, 1000000, 10000000],
+                            help='Customer counts to benchmark')
+        parser.add_argument('--legacy-max-customers', type=int, default=100000,
+                            help='Skip the legacy implementation above this many customers')
+
+    def handle(self, *args, **options):
+        rules = get_rules()
+        results = {}
+        for n_customers in options['customers']:
+            self.stdout.write(f'{n_customers} customers...')
+            scores = np.random.default_rng(42).integers(1, 6, (n_customers, 3), dtype=np.int8)
+            df = pd.DataFrame({'R': scores[:, 0], 'F': scores[:, 1], 'M': scores[:, 2]})
+            with benchmarking.measure(results, f'{n_customers} customers: rules engine'):
+                df['RFM_Score'] = rfm_code(df['R'], df['F'], df['M'])
+                segmented = rules.assign(df)
+
+            if n_customers <= options['legacy_max_customers']:
+                with benchmarking.measure(results, f'{n_customers} customers: legacy assign_segment'):
+                    rfm_score, legacy = legacy_assign_segments(df)
+                same = ((legacy.to_numpy() == np.asarray(segmented)).all()
+                        and (rfm_score.astype(int).to_numpy() == df['RFM_Score'].to_numpy()).all())
+                self.stdout.write('  same segments and scores' if same else '  outputs differ')
+            del df
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
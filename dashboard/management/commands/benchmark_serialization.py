@@ -0,0 +1,81 @@
+import gzip
+import inspect
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from dashboard import benchmarking, feature_store, order_rollups, serialization, views
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Views and query strings compared by the benchmark
+ENDPOINTS = [
+    ('chart_data', 'date_range_option=all&scatter_strategy=none'),
+    ('cohort_data', 'page=1'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compares JSON encoders, the compact encoding and compression for chart_data and cohort_data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Synthetic orders to insert')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Orders generated per insert chunk')
+        parser.add_argument('--repeat', type=int, default=3, help='Encoding runs per measurement (best is reported)')
+
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    def handle(self, *args, **options):
+        results = {}
+        repeat = options['repeat']
+        with transaction.atomic():
+            self.stdout.write(f"Inserting {options['rows']} synthetic orders...")
+            with benchmarking.measure(results, 'insert orders'):
+                benchmarking.insert_synthetic_orders(options['rows'], chunk_size=options['chunk_size'])
+            with benchmarking.measure(results, 'rebuild derived tables'):
+                order_rollups.rebuild_rollups()
+                feature_store.rebuild_customer_features()
+
+            factory = RequestFactory()
+            user = User.objects.create(username='benchmark-serialization')
+            for view_name, query in ENDPOINTS:
+                request = factory.get(f'/?{query}')
+                request.user = user
+                # The undecorated view, so neither the response cache nor conditional GET interferes
+                view = inspect.unwrap(getattr(views, view_name))
+                with benchmarking.measure(results, f'{view_name}: compute'):
+                    response = view(request)
+                payload = json.loads(response.content)
+                self.stdout.write(f'{view_name}: status {response.status_code}')
+
+                encodings = {
+                    'stdlib json': lambda: json.dumps(payload).encode('utf-8'),
+                    'fast json' + ('' if serialization.orjson else ' (orjson missing, stdlib fallback)'):
+                        lambda: serialization.dumps(payload),
+                    'fast json, compact': lambda: serialization.dumps(
+                        {'encoding': 'compact', 'data': serialization.compact_encode(payload)}),
+                }
+                for label, encode in encodings.items():
+                    body, seconds = self._best_of(repeat, encode)
+                    entry = {'seconds': seconds, 'bytes': len(body), 'gzip': len(gzip.compress(body, 6))}
+                    if brotli is not None:
+                        entry['brotli'] = len(brotli.compress(body, quality=5))
+                    results[f'{view_name}: {label}'] = entry
+
+            transaction.set_rollback(True)
+
+        for line in benchmarking.format_results(results):
+            self.stdout.write(line)
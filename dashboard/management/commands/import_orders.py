@@ -0,0 +1,89 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import cohort_stats, feature_store, order_import, order_rollups, percentiles
+from dashboard.models import suppress_order_signals
+from dashboard.retrain_queue import enqueue_retrain
+from dashboard.caching import bump_data_version
+
+class Command(BaseCommand):
+    help = 'Streams orders from CSV/JSONL files into the orders table in batches, then refreshes derived tables once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV or JSONL files with one order per row')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='Input format (detected from the file extension by default)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders per bulk insert')
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Abort after this many invalid rows (0 for no limit)')
+        parser.add_argument('--no-refresh', action='store_true',
+                            help='Skip the refresh and retrain trigger at the end. Customer features, daily '
+                                 'rollups, cohort stats and the percentile index stay stale until rebuilt '
+                                 '(rebuild_customer_features, rebuild_order_rollups, rebuild_cohort_stats)')
+        parser.add_argument('--retrain-now', action='store_true',
+                            help='Run the RFM and churn update inline instead of queueing it')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_errors = options['max_errors']
+        imported = 0
+        invalid = 0
+        days = set()
+        started = time.monotonic()
+
+        with suppress_order_signals():
+            for path in options['paths']:
+                self.stdout.write(f'Importing {path}...')
+                rows = order_import.iter_raw_rows(path, options['format'])
+                for chunk_index, chunk in enumerate(order_import.iter_chunks(rows, batch_size)):
+                    orders = []
+                    for index, raw in enumerate(chunk):
+                        try:
+                            orders.append(order_import.parse_row(raw))
+                        except ValidationError as e:
+                            invalid += 1
+                            row_number = chunk_index * batch_size + index + 1
+                            self.stdout.write(self.style.WARNING(f'{path} row {row_number}: {e.message_dict}'))
+                            if max_errors and invalid >= max_errors:
+                                raise CommandError(f'Aborting after {invalid} invalid rows.')
+                    if orders:
+                        # Only the days touched by the import need their rollups rebuilt, including
+                        # the days that updated orders are moved away from
+                        order_dates = order_import.existing_order_dates(orders)
+                        imported += order_import.upsert_orders(orders)
+                        order_dates += [order.order_date for order in orders]
+                        days.update(order_rollups.rollup_day(order_date) for order_date in order_dates)
+
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'  {imported} orders imported ({imported / elapsed if elapsed else 0:.0f} rows/sec)')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} orders in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/sec), '
+            f'{invalid} invalid rows skipped.'))
+
+        if not imported:
+            return
+        if options['no_refresh']:
+            bump_data_version()
+            self.stdout.write(self.style.WARNING(
+                'Skipped the refresh: customer features, daily rollups, cohort stats and the percentile index '
+                'are stale until rebuilt.'))
+            return
+
+        # One refresh for the whole import instead of one per order
+        self.stdout.write('Rebuilding customer features...')
+        feature_store.rebuild_customer_features(batch_size=batch_size)
+        self.stdout.write(f'Rebuilding daily rollups for {len(days)} days from {min(days)} to {max(days)}...')
+        order_rollups.rebuild_days(days, batch_size=batch_size)
+        self.stdout.write('Rebuilding cohort stats...')
+        cohort_stats.rebuild_cohort_stats(batch_size=batch_size)
+        percentiles.build_percentile_index()
+        bump_data_version()
+        if options['retrain_now']:
+            call_command('update_rfm_and_churn')
+        else:
+            enqueue_retrain(reason=f'import_orders: {imported} orders')
+            self.stdout.write('Queued one RFM and churn model update.')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from dashboard import retrain_queue
+
+class Command(BaseCommand):
+    help = 'Worker that merges pending retrain triggers into a single RFM and churn model update'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queue once and exit')
+        parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds between queue polls')
+        parser.add_argument('--debounce', type=float, default=None,
+                            help='Seconds without new triggers before retraining (defaults to RETRAIN_DEBOUNCE_SECONDS)')
+
+    def handle(self, *args, **options):
+        debounce = options['debounce']
+        self.stdout.write(self.style.SUCCESS('Retrain queue worker started.'))
+
+        while True:
+            if retrain_queue.process_queue(debounce_seconds=debounce):
+                status = retrain_queue.queue_status()
+                last_run = status['last_run'] or {}
+                self.stdout.write(f"Retrain {last_run.get('status')} in {last_run.get('duration_seconds')}s "
+                                  f"({last_run.get('triggers_merged')} trigger(s) merged in latest job).")
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
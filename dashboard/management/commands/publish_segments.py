@@ -0,0 +1,35 @@
+import os
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import segments
+from dashboard.caching import bump_data_version
+from dashboard.frames import read_frame
+from dashboard.ml_utils import RFM_SEGMENTS_BASE, RFM_SEGMENTS_PATH, predict_churn_batch, registry
+
+class Command(BaseCommand):
+    help = 'Publishes the rfm_features_with_segments artifact (or a segments CSV) as the active customer segments generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Segments CSV to publish instead of the artifact written by ml_model_building')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['path']:
+            if not os.path.exists(options['path']):
+                raise CommandError(f"Segments file not found at {options['path']}")
+            df = pd.read_csv(options['path'])
+        else:
+            df = read_frame(RFM_SEGMENTS_BASE)
+            if df is None:
+                raise CommandError(f"Segments file not found at {RFM_SEGMENTS_PATH}")
+
+        snapshot = registry.reload()
+        if snapshot.model is not None and snapshot.scaler is not None:
+            df['churn_probability'] = predict_churn_batch(df, snapshot.model, snapshot.scaler)
+        else:
+            self.stdout.write(self.style.WARNING('Churn model not available; publishing without probabilities.'))
+
+        generation = segments.publish_segments(df, batch_size=options['batch_size'])
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Published {len(df)} customer segments as generation {generation}."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from dashboard import cohort_stats
+from dashboard.parallel import get_workers
+from dashboard.caching import bump_data_version
+
+class Command(BaseCommand):
+    help = 'Rebuilds the CohortMonthlyStats matrix from the orders table, one cohort per worker task'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: ML_PARALLEL_WORKERS; 1 computes every cohort in this process)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        workers = get_workers(options['workers'])
+        self.stdout.write(f"Rebuilding cohort stats with {workers} worker(s)...")
+        total = cohort_stats.rebuild_cohort_stats(workers=workers, batch_size=options['batch_size'])
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} cohort cells.'))
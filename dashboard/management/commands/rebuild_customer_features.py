@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import feature_store, percentiles
+from dashboard.caching import bump_data_version
+
+class Command(BaseCommand):
+    help = 'Rebuilds the CustomerFeatures store from the orders table and checks it against the full-batch features'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-only', action='store_true', help='Only compare the store with the full-batch computation')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert when rebuilding')
+        parser.add_argument('--max-report', type=int, default=20, help='Maximum number of mismatches to print')
+
+    def handle(self, *args, **options):
+        # Imported here because ml_data_preparation configures Django on import
+        from dashboard import ml_data_preparation
+
+        if not options['check_only']:
+            self.stdout.write('Rebuilding customer features...')
+            total = feature_store.rebuild_customer_features(batch_size=options['batch_size'])
+            percentiles.build_percentile_index()
+            bump_data_version()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt features for {total} customers.'))
+
+        self.stdout.write('Checking store against the full-batch computation...')
+        batch_df = ml_data_preparation.build_features_from_orders()
+        if batch_df is None:
+            self.stdout.write('No orders found, nothing to check.')
+            return
+
+        mismatches = feature_store.compare_with_batch(batch_df)
+        if mismatches:
+            for mismatch in mismatches[:options['max_report']]:
+                self.stdout.write(self.style.ERROR(mismatch))
+            raise CommandError(f'{len(mismatches)} mismatch(es) between the feature store and the batch computation.')
+
+        self.stdout.write(self.style.SUCCESS(f'Feature store matches the batch computation for {len(batch_df)} customers.'))
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import order_rollups
+from dashboard.caching import bump_data_version
+
+class Command(BaseCommand):
+    help = 'Rebuilds the OrderDailyRollup table from the orders table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-day', default=None, help='First day to rebuild (YYYY-MM-DD), defaults to the earliest order')
+        parser.add_argument('--end-day', default=None, help='Last day to rebuild (YYYY-MM-DD), defaults to the latest order')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        try:
+            start_day = datetime.strptime(options['start_day'], '%Y-%m-%d').date() if options['start_day'] else None
+            end_day = datetime.strptime(options['end_day'], '%Y-%m-%d').date() if options['end_day'] else None
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD.')
+
+        self.stdout.write('Rebuilding daily order rollups...')
+        total = order_rollups.rebuild_rollups(start_day, end_day, batch_size=options['batch_size'])
+        bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} daily rollup rows.'))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from dashboard import churn_training
+from dashboard.caching import bump_data_version
+
+class Command(BaseCommand):
+    help = 'Updates the churn model with the customers whose features changed since the last run (partial_fit), with periodic full refits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full-refit', action='store_true', help='Refit on all customers even if no refit is due')
+        parser.add_argument('--compare', action='store_true',
+                            help='Only score the served model and a full LogisticRegression fit on the held-out customers')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Customers read per chunk')
+
+    def _write_metrics(self, label, metrics):
+        if metrics is None:
+            self.stdout.write(f"  {label}: n/a")
+            return
+        roc_auc = 'n/a' if metrics['roc_auc'] is None else f"{metrics['roc_auc']:.4f}"
+        self.stdout.write(f"  {label}: accuracy {metrics['accuracy']:.4f}, log loss {metrics['log_loss']:.4f}, ROC AUC {roc_auc}")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['compare']:
+            comparison = churn_training.compare_models(chunk_size=options['chunk_size'])
+            if comparison is None:
+                raise CommandError('No customer features to evaluate on')
+            self.stdout.write(f"Held-out customers: {comparison['held_out']}")
+            self._write_metrics('served model', comparison['served'])
+            self._write_metrics('full refit baseline', comparison['full_refit_baseline'])
+            return
+
+        stats = churn_training.update_churn_model(chunk_size=options['chunk_size'],
+                                                  force_full_refit=options['full_refit'])
+        if stats is None:
+            raise CommandError('No customer features to train the churn model on')
+        elapsed = time.perf_counter() - started
+        if stats['mode'] == 'full_refit':
+            comparison = stats['comparison']
+            self.stdout.write(f"Held-out customers: {comparison['held_out']}")
+            self._write_metrics('replaced model', comparison['replaced'])
+            self._write_metrics('full refit (SGD)', comparison['full_refit'])
+            self._write_metrics('full refit baseline (LogisticRegression)', comparison['full_refit_baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Refit the churn model on {stats['customers']} customers in {elapsed:.2f}s."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated the churn model with {stats['customers']} changed customers "
+                f"({stats['held_out']} held out) in {elapsed:.2f}s."))
+        if stats['customers']:
+            # Cached analytics responses embed model outputs
+            bump_data_version()
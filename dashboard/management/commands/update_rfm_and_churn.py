@@ -1,5 +1,10 @@
+import logging
+
 from django.core.management.base import BaseCommand
-from dashboard import ml_data_preparation, ml_model_building
+from dashboard import ml_data_preparation, ml_model_building, percentiles, scoring
+from dashboard.caching import bump_data_version
+
+logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Updates RFM features and retrains the churn prediction model'
@@ -18,6 +23,23 @@ class Command(BaseCommand):
             ml_model_building.main()
             self.stdout.write(self.style.SUCCESS('Model building completed successfully.'))
 
+            # Precomputed churn scores for the new model. Views fall back to live prediction
+            # for missing or stale scores, so a scoring failure doesn't fail the retrain.
+            self.stdout.write('Scoring customers...')
+            try:
+                stats = scoring.score_customers()
+                self.stdout.write(f"Scored {stats['customers']} customers.")
+            except Exception as e:
+                logger.error(f"Scoring customers failed: {str(e)}", exc_info=True)
+                self.stdout.write(self.style.WARNING(f'Scoring customers failed: {str(e)}'))
+
+            # Profile LTV/lifetime percentiles, refreshed on the same schedule as the model
+            self.stdout.write('Rebuilding percentile index...')
+            percentiles.build_percentile_index()
+
+            # Cached analytics responses embed model outputs
+            bump_data_version()
+
             self.stdout.write(self.style.SUCCESS('RFM and churn model update completed successfully.'))
 
         except Exception as e:
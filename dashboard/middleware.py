@@ -0,0 +1,43 @@
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional: GZipMiddleware still compresses responses
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class BrotliJSONMiddleware(MiddlewareMixin):
+    """
+    Brotli-compress JSON responses for clients that accept it. Listed after GZipMiddleware
+    so it sees the response first; GZipMiddleware then skips anything already encoded.
+    Does nothing when the brotli package is not installed.
+    """
+    min_length = 200
+    quality = 5  # good ratio on JSON while staying cheap enough to run per request
+
+    def process_response(self, request, response):
+        if brotli is None or response.streaming or len(response.content) < self.min_length:
+            return response
+        if response.has_header('Content-Encoding') or not response.get('Content-Type', '').startswith('application/json'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return response
+
+        compressed_content = brotli.compress(response.content, quality=self.quality)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+
+        # Same weak-ETag handling as GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
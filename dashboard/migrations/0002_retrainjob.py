@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetrainJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('trigger_count', models.PositiveIntegerField(default=1)),
+                ('first_triggered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_triggered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'retrain_jobs',
+            },
+        ),
+    ]
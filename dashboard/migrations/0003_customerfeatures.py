@@ -0,0 +1,65 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum
+
+
+def backfill_customer_features(apps, schema_editor):
+    Order = apps.get_model('dashboard', 'Order')
+    CustomerFeatures = apps.get_model('dashboard', 'CustomerFeatures')
+
+    latest_email = (Order.objects.filter(customer_name=OuterRef('customer_name'))
+                    .order_by('-order_date', '-order_id')
+                    .values('customer_email')[:1])
+    aggregates = (Order.objects.values('customer_name')
+                  .annotate(first_order_date=Min('order_date'),
+                            last_order_date=Max('order_date'),
+                            order_count=Count('order_id'),
+                            monetary=Sum('order_total'),
+                            latest_email=Subquery(latest_email))
+                  .order_by())
+
+    batch = []
+    for row in aggregates.iterator(chunk_size=5000):
+        batch.append(CustomerFeatures(
+            customer_name=row['customer_name'],
+            customer_email=row['latest_email'],
+            first_order_date=row['first_order_date'],
+            last_order_date=row['last_order_date'],
+            order_count=row['order_count'],
+            monetary=row['monetary'] or 0,
+            gap_sum_days=(row['last_order_date'] - row['first_order_date']).total_seconds() / (24 * 3600),
+        ))
+        if len(batch) >= 5000:
+            CustomerFeatures.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CustomerFeatures.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_retrainjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerFeatures',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=100, unique=True)),
+                ('customer_email', models.EmailField(max_length=254)),
+                ('first_order_date', models.DateTimeField()),
+                ('last_order_date', models.DateTimeField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('monetary', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('gap_sum_days', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'customer_features',
+            },
+        ),
+        migrations.RunPython(backfill_customer_features, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:55
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+KEY_FIELDS = ['order_status', 'payment_method', 'product_name']
+SUM_FIELDS = ['order_total', 'order_tax', 'shipping_charge', 'order_discount', 'order_refunded', 'product_row_total']
+
+
+def backfill_order_rollups(apps, schema_editor):
+    # Self-contained (no app code), so later changes to order_rollups can't alter this migration.
+    # customer_sketch keeps its default; 0011 drops the column.
+    Order = apps.get_model('dashboard', 'Order')
+    OrderDailyRollup = apps.get_model('dashboard', 'OrderDailyRollup')
+
+    pending = []
+
+    def flush(day, groups):
+        for key, values in groups.items():
+            pending.append(OrderDailyRollup(day=day, **dict(zip(KEY_FIELDS, key)), **values))
+        if len(pending) >= 5000:
+            OrderDailyRollup.objects.bulk_create(pending)
+            pending.clear()
+
+    # Orders are streamed in date order, so only one day's groups are held in memory
+    rows = (Order.objects.order_by('order_date')
+            .values_list('order_date', *KEY_FIELDS, 'product_quantity', *SUM_FIELDS))
+    current_day, groups = None, {}
+    for row in rows.iterator(chunk_size=5000):
+        order_date, key, product_quantity, sums = row[0], row[1:4], row[4], row[5:]
+        # Same day boundaries as TruncDay in the current time zone
+        day = timezone.localtime(order_date).date()
+        if day != current_day:
+            flush(current_day, groups)
+            current_day, groups = day, {}
+        values = groups.setdefault(key, {'order_count': 0, 'product_quantity': 0,
+                                         **{field: Decimal('0') for field in SUM_FIELDS}})
+        values['order_count'] += 1
+        values['product_quantity'] += product_quantity or 0
+        for field, value in zip(SUM_FIELDS, sums):
+            values[field] += Decimal(str(value or 0))
+    flush(current_day, groups)
+    OrderDailyRollup.objects.bulk_create(pending)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_customerfeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_status', models.CharField(max_length=50)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('product_name', models.CharField(max_length=100)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('customer_sketch', models.BinaryField(default=bytes)),
+                ('order_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('order_tax', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('shipping_charge', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('order_discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('order_refunded', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('product_quantity', models.BigIntegerField(default=0)),
+                ('product_row_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'order_daily_rollups',
+                'constraints': [models.UniqueConstraint(fields=('day', 'order_status', 'payment_method', 'product_name'), name='unique_order_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_order_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:15
+
+from datetime import date, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_cohort_stats(apps, schema_editor):
+    # Self-contained (no app code), so later changes to cohort_stats can't alter this migration
+    Order = apps.get_model('dashboard', 'Order')
+    CohortMonthlyStats = apps.get_model('dashboard', 'CohortMonthlyStats')
+
+    def month_of(order_date):
+        # UTC calendar month as year * 12 + month - 1
+        order_date = order_date.astimezone(dt_timezone.utc) if order_date.tzinfo else order_date
+        return order_date.year * 12 + order_date.month - 1
+
+    def add_customer(cells, history):
+        # One customer's (month, order_total) orders into {(cohort_month, months_since): [customers, orders, revenue]}
+        cohort = min(month for month, _ in history)
+        active = set()
+        for month, order_total in history:
+            key = (date(cohort // 12, cohort % 12 + 1, 1), month - cohort)
+            cell = cells.setdefault(key, [0, 0, Decimal('0')])
+            if key not in active:
+                active.add(key)
+                cell[0] += 1
+            cell[1] += 1
+            cell[2] += order_total or Decimal('0')
+
+    cells = {}
+    customer_email, history = None, []
+    rows = Order.objects.order_by('customer_email').values_list('customer_email', 'order_date', 'order_total')
+    for email, order_date, order_total in rows.iterator(chunk_size=5000):
+        if email != customer_email and history:
+            add_customer(cells, history)
+            history = []
+        customer_email = email
+        history.append((month_of(order_date), order_total))
+    if history:
+        add_customer(cells, history)
+
+    CohortMonthlyStats.objects.bulk_create(
+        [CohortMonthlyStats(cohort_month=cohort_month, months_since=months_since,
+                            customers=customers, orders=orders, revenue=revenue)
+         for (cohort_month, months_since), (customers, orders, revenue) in sorted(cells.items())],
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField()),
+                ('months_since', models.PositiveSmallIntegerField()),
+                ('customers', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'cohort_monthly_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_email', 'order_date'], name='orders_email_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_name', 'order_date'], name='orders_name_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cohortmonthlystats',
+            constraint=models.UniqueConstraint(fields=('cohort_month', 'months_since'), name='unique_cohort_month_cell'),
+        ),
+        migrations.RunPython(backfill_cohort_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_cohortmonthlystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(max_length=100, unique=True)),
+                ('churn_probability', models.FloatField()),
+                ('model_version', models.CharField(max_length=40)),
+                ('features_updated_at', models.DateTimeField()),
+                ('scored_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'customer_scores',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_customerscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.PositiveIntegerField()),
+                ('customer_name', models.CharField(max_length=100)),
+                ('customer_email', models.EmailField(blank=True, max_length=254)),
+                ('last_order_date', models.DateTimeField()),
+                ('recency', models.FloatField()),
+                ('frequency', models.PositiveIntegerField()),
+                ('monetary', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('avg_days_between_orders', models.FloatField(default=0.0)),
+                ('r_score', models.PositiveSmallIntegerField()),
+                ('f_score', models.PositiveSmallIntegerField()),
+                ('m_score', models.PositiveSmallIntegerField()),
+                ('rfm_score', models.CharField(max_length=3)),
+                ('segment', models.CharField(max_length=50)),
+                ('churn', models.BooleanField()),
+                ('churn_probability', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'customer_segments',
+                'indexes': [models.Index(fields=['generation', 'segment'], name='segments_gen_segment_idx'), models.Index(fields=['generation', 'last_order_date'], name='segments_gen_last_order_idx')],
+                'constraints': [models.UniqueConstraint(fields=('generation', 'customer_name'), name='unique_segment_generation_customer')],
+            },
+        ),
+    ]
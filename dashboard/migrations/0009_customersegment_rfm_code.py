@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_customersegment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customersegment',
+            name='rfm_score',
+            field=models.PositiveSmallIntegerField(),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:12
+
+from datetime import date, timezone as dt_timezone
+
+from django.db import migrations, models
+
+
+def backfill_approx_customers(apps, schema_editor):
+    # Self-contained like 0006's backfill
+    Order = apps.get_model('dashboard', 'Order')
+    CohortMonthlyStats = apps.get_model('dashboard', 'CohortMonthlyStats')
+
+    def month_of(order_date):
+        order_date = order_date.astimezone(dt_timezone.utc) if order_date.tzinfo else order_date
+        return order_date.year * 12 + order_date.month - 1
+
+    def month_start(index):
+        return date(index // 12, index % 12 + 1, 1)
+
+    def count_customer(counts, months):
+        # The customer counts once per 30-day offset, in the first calendar month mapping to it
+        cohort = min(months)
+        seen = set()
+        for month in sorted(months):
+            approx = (month_start(month) - month_start(cohort)).days // 30
+            if approx not in seen:
+                seen.add(approx)
+                key = (month_start(cohort), month - cohort)
+                counts[key] = counts.get(key, 0) + 1
+
+    counts = {}
+    customer_email, months = None, set()
+    rows = Order.objects.order_by('customer_email').values_list('customer_email', 'order_date')
+    for email, order_date in rows.iterator(chunk_size=5000):
+        if email != customer_email and months:
+            count_customer(counts, months)
+            months = set()
+        customer_email = email
+        months.add(month_of(order_date))
+    if months:
+        count_customer(counts, months)
+
+    cells = list(CohortMonthlyStats.objects.all())
+    for cell in cells:
+        cell.approx_customers = counts.get((cell.cohort_month, cell.months_since), 0)
+    CohortMonthlyStats.objects.bulk_update(cells, ['approx_customers'], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_customersegment_rfm_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cohortmonthlystats',
+            name='approx_customers',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_approx_customers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_cohortmonthlystats_approx_customers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='orderdailyrollup',
+            name='customer_sketch',
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:30
+
+from datetime import date, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_customer_cohorts(apps, schema_editor):
+    # Self-contained like 0006's backfill
+    Order = apps.get_model('dashboard', 'Order')
+    CustomerCohort = apps.get_model('dashboard', 'CustomerCohort')
+
+    def month_of(order_date):
+        order_date = order_date.astimezone(dt_timezone.utc) if order_date.tzinfo else order_date
+        return date(order_date.year, order_date.month, 1)
+
+    def customer_cohort(customer_email, months):
+        return CustomerCohort(customer_email=customer_email, cohort_month=min(months),
+                              months={month.isoformat(): [orders, str(revenue)]
+                                      for month, (orders, revenue) in sorted(months.items())})
+
+    pending = []
+    customer_email, months = None, {}
+    rows = Order.objects.order_by('customer_email').values_list('customer_email', 'order_date', 'order_total')
+    for email, order_date, order_total in rows.iterator(chunk_size=5000):
+        if email != customer_email and months:
+            pending.append(customer_cohort(customer_email, months))
+            months = {}
+        customer_email = email
+        activity = months.setdefault(month_of(order_date), [0, Decimal('0')])
+        activity[0] += 1
+        activity[1] += Decimal(str(order_total or 0))
+    if months:
+        pending.append(customer_cohort(customer_email, months))
+    CustomerCohort.objects.bulk_create(pending, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_remove_orderdailyrollup_customer_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_email', models.EmailField(max_length=254, unique=True)),
+                ('cohort_month', models.DateField()),
+                ('months', models.JSONField(default=dict)),
+            ],
+            options={
+                'db_table': 'customer_cohorts',
+            },
+        ),
+        migrations.RunPython(backfill_customer_cohorts, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,11 @@
 import os
 import sys
 import django
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import pytz  # Import pytz for timezone handling
+from concurrent.futures import ProcessPoolExecutor
 
 # Set up Django environment
 project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,7 +13,12 @@ sys.path.append(project_dir)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'caddy_dashboard.settings')
 django.setup()
 
-from dashboard.models import Order
+from django.conf import settings
+from dashboard.models import Order, CustomerFeatures
+from dashboard import feature_store
+from dashboard.parallel import customer_partials_task, get_workers, run_sharded
+from dashboard.frames import write_frame
+from dashboard.ml_utils import RFM_FEATURES_BASE
 
 def extract_data():
     print("Extracting data from Order model...")
@@ -49,61 +56,222 @@ def clean_and_standardize_data(df):
     print("Data cleaned and standardized successfully.")
     return df
 
-def create_features(df):
-    print("Creating features for RFM and churn prediction...")
+# Per-customer partial aggregates. Partials of disjoint sets of orders merge into the
+# partials of their union, so the order table can be folded in chunk by chunk.
+PARTIAL_COLUMNS = ['customer_name', 'order_count', 'monetary', 'first_order_date', 'last_order_date', 'customer_email']
+
+def order_partials(df):
+    """
+    One partial per cleaned order row (its own count, total and dates).
+    """
+    order_dates = pd.to_datetime(df['order_date'], utc=True)
+    return pd.DataFrame({
+        'customer_name': df['customer_name'].to_numpy(),
+        'order_count': np.ones(len(df), dtype=np.int64),
+        'monetary': pd.to_numeric(df['order_total']).to_numpy(dtype=np.float64),
+        'first_order_date': order_dates.array,
+        'last_order_date': order_dates.array,
+        'customer_email': df['customer_email'].to_numpy(),
+    })
+
+def merge_partials(partials):
+    """
+    Combine partials (customers may repeat) into one row per customer, in name order.
+    On equal last order dates the email of the earlier row wins.
+    """
+    partials = partials.reset_index(drop=True)
+    # Integer customer keys in name order (the categorical codes of customer_name)
+    codes, customer_names = pd.factorize(partials['customer_name'], sort=True)
     
+    # Grouped aggregations on the integer keys (hash-based, no per-customer Python)
+    order_count = np.bincount(codes, weights=partials['order_count'], minlength=len(customer_names)).astype(np.int64)
+    monetary = np.bincount(codes, weights=partials['monetary'], minlength=len(customer_names))
+    first_order_date = partials['first_order_date'].groupby(codes, sort=True).min()
+    by_last_order = partials['last_order_date'].groupby(codes, sort=True)
+    last_order_date = by_last_order.max()
+    customer_emails = partials['customer_email'].to_numpy()[by_last_order.idxmax().to_numpy()]
+    
+    return pd.DataFrame({
+        'customer_name': np.asarray(customer_names, dtype=object),
+        'order_count': order_count,
+        'monetary': monetary,
+        'first_order_date': first_order_date.array,
+        'last_order_date': last_order_date.array,
+        'customer_email': customer_emails,
+    })
+
+def sharded_order_partials(df, workers, pool=None):
+    """
+    merge_partials(order_partials(df)) computed over customer shards in a process pool
+    (same result; each customer's sums run over the same rows in the same order).
+    """
+    codes, customer_names = pd.factorize(df['customer_name'], sort=True)
+    order_dates = pd.to_datetime(df['order_date'], utc=True)
+    arrays = {
+        'codes': codes.astype(np.int64),
+        'dates': pd.DatetimeIndex(order_dates).as_unit('ns').asi8,
+        'totals': pd.to_numeric(df['order_total']).to_numpy(dtype=np.float64),
+    }
+    results = run_sharded(customer_partials_task, codes, arrays, workers, pool=pool)
+
+    # Shards hold disjoint customers; scatter each one's rows into name order
+    n_customers = len(customer_names)
+    order_count = np.zeros(n_customers, dtype=np.int64)
+    monetary = np.zeros(n_customers)
+    first_order_date = np.zeros(n_customers, dtype=np.int64)
+    last_order_date = np.zeros(n_customers, dtype=np.int64)
+    last_row = np.zeros(n_customers, dtype=np.int64)
+    for customers, count, total, first, last, row in results:
+        order_count[customers] = count
+        monetary[customers] = total
+        first_order_date[customers] = first
+        last_order_date[customers] = last
+        last_row[customers] = row
+
+    unit = order_dates.dt.unit
+    return pd.DataFrame({
+        'customer_name': np.asarray(customer_names, dtype=object),
+        'order_count': order_count,
+        'monetary': monetary,
+        'first_order_date': pd.to_datetime(first_order_date, utc=True).as_unit(unit),
+        'last_order_date': pd.to_datetime(last_order_date, utc=True).as_unit(unit),
+        'customer_email': df['customer_email'].to_numpy()[last_row],
+    })
+
+def features_from_partials(partials):
+    """
+    RFM/churn features from merged partials (one row per customer).
+    """
     # Define the current date for recency calculation (April 1, 2025), make it timezone-aware in UTC
     current_date = pd.to_datetime('2025-04-01').tz_localize('UTC')
     
-    # Get the most recent customer_email for each customer_name
-    # Sort by order_date to ensure the latest email is selected
-    customer_emails = df.sort_values('order_date').groupby('customer_name')['customer_email'].last().reset_index()
-    
-    # Group by customer to calculate RFM features
-    rfm_df = df.groupby('customer_name').agg({
-        'order_date': ['max', 'count'],  # For Recency (max) and Frequency (count)
-        'order_total': 'sum',           # For Monetary
-    }).reset_index()
+    last_order_date = pd.to_datetime(partials['last_order_date'], utc=True)
+    frequency = partials['order_count'].to_numpy()
     
-    # Flatten column names
-    rfm_df.columns = ['customer_name', 'last_order_date', 'frequency', 'monetary']
-    
-    # Ensure last_order_date is timezone-aware (it should already be in UTC from the database)
-    rfm_df['last_order_date'] = rfm_df['last_order_date'].dt.tz_localize('UTC') if rfm_df['last_order_date'].dt.tz is None else rfm_df['last_order_date']
-    
-    # Calculate Recency (days since last order)
-    rfm_df['recency'] = (current_date - rfm_df['last_order_date']).dt.total_seconds() / (24 * 3600)
-    
-    # Calculate additional features for churn prediction
-    # Average time between orders
-    avg_time_between = df.groupby('customer_name').apply(
-        lambda x: (x['order_date'].sort_values().diff().dt.total_seconds() / (24 * 3600)).mean()
-    ).reset_index(name='avg_days_between_orders')
-    
-    # Merge with RFM data
-    rfm_df = rfm_df.merge(avg_time_between, on='customer_name', how='left')
-    
-    # Merge with customer_email
-    rfm_df = rfm_df.merge(customer_emails, on='customer_name', how='left')
-    
-    # Fill NaN values for avg_days_between_orders (for customers with only 1 order)
-    rfm_df['avg_days_between_orders'] = rfm_df['avg_days_between_orders'].fillna(0)
+    # Average time between orders: the date-sorted gaps of a customer sum to last - first
+    # order, so their mean needs neither a sort nor a diff (customers with only 1 order get 0)
+    span_days = (last_order_date - pd.to_datetime(partials['first_order_date'], utc=True)).dt.total_seconds().to_numpy() / (24 * 3600)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_days_between_orders = np.where(frequency > 1, span_days / (frequency - 1), 0.0)
     
+    return pd.DataFrame({
+        'customer_name': partials['customer_name'].to_numpy(),
+        'last_order_date': last_order_date.array,
+        'frequency': frequency,
+        'monetary': partials['monetary'].to_numpy(),
+        # Calculate Recency (days since last order)
+        'recency': (current_date - last_order_date).dt.total_seconds().to_numpy() / (24 * 3600),
+        'avg_days_between_orders': avg_days_between_orders,
+        'customer_email': partials['customer_email'].to_numpy(),
+    })
+
+def create_features(df, workers=None):
+    print("Creating features for RFM and churn prediction...")
+    # Customer-sharded process pool with ML_PARALLEL_WORKERS > 1
+    workers = get_workers(workers)
+    if workers > 1:
+        partials = sharded_order_partials(df, workers)
+    else:
+        partials = merge_partials(order_partials(df))
+    rfm_df = features_from_partials(partials)
+    print("Features created successfully:")
+    print(rfm_df.head())
+    return rfm_df
+
+def iter_order_chunks(chunk_size=100000):
+    """
+    The columns extract_data reads, as cleaned DataFrames of up to chunk_size orders,
+    fetched by primary-key range so no query or result set spans the whole table.
+    """
+    columns = ['order_id', 'customer_name', 'customer_email', 'order_date', 'order_total']
+    last_id = 0
+    while True:
+        rows = list(Order.objects.filter(order_id__gt=last_id).order_by('order_id')
+                    .values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        df = pd.DataFrame(rows, columns=columns)
+        del rows
+        df['customer_name'] = df['customer_name'].fillna('Unknown')
+        df['customer_email'] = df['customer_email'].fillna('unknown@example.com')
+        df['order_total'] = pd.to_numeric(df['order_total'].fillna(0.0)).astype(np.float64)
+        yield df
+
+def extract_partials(chunk_size=100000, workers=None):
+    """
+    Fold the orders table into per-customer partials one chunk at a time. Memory is bounded
+    by the number of customers, not orders. Chunk partials are buffered and merged into the
+    running result once they hold as many rows as it does, so each customer row is
+    re-merged O(log chunks) times. With workers > 1 (None: ML_PARALLEL_WORKERS) each chunk
+    is aggregated over customer shards in one process pool. Returns None if there are no orders.
+    """
+    workers = get_workers(workers)
+    if workers <= 1:
+        return _extract_partials(chunk_size, workers, None)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return _extract_partials(chunk_size, workers, pool)
+
+def _extract_partials(chunk_size, workers, pool):
+    merged, pending, pending_rows, orders = None, [], 0, 0
+    for chunk in iter_order_chunks(chunk_size):
+        orders += len(chunk)
+        if pool is not None:
+            pending.append(sharded_order_partials(chunk, workers, pool))
+        else:
+            pending.append(merge_partials(order_partials(chunk)))
+        pending_rows += len(pending[-1])
+        if merged is None or pending_rows >= len(merged):
+            merged = merge_partials(pd.concat(([] if merged is None else [merged]) + pending, ignore_index=True))
+            pending, pending_rows = [], 0
+    if pending:
+        merged = merge_partials(pd.concat([merged] + pending, ignore_index=True))
+    if merged is not None:
+        print(f"Aggregated {orders} orders into {len(merged)} customers.")
+    return merged
+
+def extract_features_from_store():
+    print("Loading features from the CustomerFeatures store...")
+    if not CustomerFeatures.objects.exists():
+        print("No data found in the CustomerFeatures store.")
+        return None
+
+    # Same reference date as create_features
+    current_date = pd.to_datetime('2025-04-01').tz_localize('UTC')
+
+    df = feature_store.features_frame()
+    df['recency'] = (current_date - df['last_order_date']).dt.total_seconds() / (24 * 3600)
+    rfm_df = df[['customer_name', 'last_order_date', 'frequency', 'monetary', 'recency',
+                 'avg_days_between_orders', 'customer_email']]
+
+    print(f"Loaded features for {len(rfm_df)} customers.")
+    return rfm_df
+
+def build_features_from_orders(chunk_size=100000, workers=None):
+    # Full-history path: stream every order by primary-key range and merge per-customer partials
+    print("Extracting data from Order model in chunks...")
+    partials = extract_partials(chunk_size, workers)
+    if partials is None:
+        print("No data found in the Order model.")
+        return None
+    rfm_df = features_from_partials(partials)
     print("Features created successfully:")
     print(rfm_df.head())
     return rfm_df
 
-def main():
-    # Extract the data
-    df = extract_data()
-    if df is not None:
-        # Clean and standardize
-        df = clean_and_standardize_data(df)
-        # Create features
-        rfm_df = create_features(df)
-        # Save the processed data to a CSV file in the dashboard directory
-        output_path = os.path.join(project_dir, 'dashboard', 'rfm_features.csv')
-        rfm_df.to_csv(output_path, index=False)
+def main(source=None):
+    # 'feature_store' reads one row per customer; 'orders' rescans the full order history
+    source = source or getattr(settings, 'RFM_FEATURE_SOURCE', 'feature_store')
+    rfm_df = None
+    if source == 'feature_store':
+        rfm_df = extract_features_from_store()
+        if rfm_df is None:
+            print("Falling back to full extraction from the Order model.")
+    if rfm_df is None:
+        rfm_df = build_features_from_orders()
+    if rfm_df is not None:
+        # Save the processed data as a typed frame artifact in the dashboard directory
+        output_path = write_frame(rfm_df, RFM_FEATURES_BASE)
         print(f"Processed data saved to {output_path}")
 
 if __name__ == "__main__":
@@ -5,58 +5,44 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+from django.conf import settings
+from dashboard.churn_training import churn_labels, update_churn_model
+from dashboard.frames import read_frame, write_frame
+from dashboard.ml_utils import RFM_FEATURES_BASE, RFM_SEGMENTS_BASE, load_churn_model_and_scaler, predict_churn_batch, publish_artifact
+from dashboard.segmentation import get_rules, rfm_code
+from dashboard.segments import publish_segments
 
 def load_features():
-    print("Loading features from rfm_features.csv...")
-    # Construct the path to rfm_features.csv
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    features_path = os.path.join(project_dir, 'dashboard', 'rfm_features.csv')
-    
-    if not os.path.exists(features_path):
-        print(f"Error: {features_path} does not exist.")
+    print("Loading features from rfm_features...")
+    df = read_frame(RFM_FEATURES_BASE)
+    if df is None:
+        print(f"Error: {RFM_FEATURES_BASE} does not exist.")
         return None
     
-    df = pd.read_csv(features_path)
     print(f"Loaded {len(df)} customer records.")
     return df
 
 def perform_rfm_analysis(df):
     print("Performing RFM analysis...")
     
-    # Calculate RFM scores (1 to 5) using quantiles
+    # Calculate RFM scores (1 to 5) using quantiles, as small integers
     # Recency: Lower is better (more recent), so reverse the scoring
-    r_labels = range(5, 0, -1)  # 5 (most recent) to 1 (least recent)
-    r_quartiles = pd.qcut(df['recency'], q=5, labels=r_labels)
-    df['R'] = r_quartiles
+    # 5 (most recent) to 1 (least recent)
+    df['R'] = (5 - pd.qcut(df['recency'], q=5, labels=False)).astype(np.int8)
     
     # Frequency: Higher is better
-    f_labels = range(1, 6)  # 1 (least frequent) to 5 (most frequent)
-    f_quartiles = pd.qcut(df['frequency'].rank(method='first'), q=5, labels=f_labels)
-    df['F'] = f_quartiles
+    # 1 (least frequent) to 5 (most frequent)
+    df['F'] = (pd.qcut(df['frequency'].rank(method='first'), q=5, labels=False) + 1).astype(np.int8)
     
     # Monetary: Higher is better
-    m_labels = range(1, 6)  # 1 (lowest spending) to 5 (highest spending)
-    m_quartiles = pd.qcut(df['monetary'], q=5, labels=m_labels)
-    df['M'] = m_quartiles
-    
-    # Combine RFM scores into a single score
-    df['RFM_Score'] = df['R'].astype(str) + df['F'].astype(str) + df['M'].astype(str)
-    
-    # Assign customer segments based on RFM scores
-    def assign_segment(row):
-        r, f, m = int(row['R']), int(row['F']), int(row['M'])
-        if r >= 4 and f >= 4 and m >= 4:
-            return "Loyal Customer"
-        elif r >= 3 and f >= 3 and m >= 3:
-            return "Active Customer"
-        elif r >= 2 and f >= 2 and m >= 2:
-            return "Average Customer"
-        elif r <= 2 and f <= 2 and m <= 2:
-            return "At Risk"
-        else:
-            return "New Customer"
-    
-    df['Segment'] = df.apply(assign_segment, axis=1)
+    # 1 (lowest spending) to 5 (highest spending)
+    df['M'] = (pd.qcut(df['monetary'], q=5, labels=False) + 1).astype(np.int8)
+    
+    # Combine RFM scores into a single integer code (R=5, F=4, M=3 -> 543)
+    df['RFM_Score'] = rfm_code(df['R'], df['F'], df['M'])
+    
+    # Assign customer segments with the configured rules (SEGMENT_RULES_PATH)
+    df['Segment'] = get_rules().assign(df)
     
     print("RFM analysis completed:")
     print(df[['customer_name', 'R', 'F', 'M', 'RFM_Score', 'Segment']].head())
@@ -97,8 +83,9 @@ def train_churn_model(df):
     model_path = os.path.join(project_dir, 'dashboard', 'churn_model.joblib')
     scaler_path = os.path.join(project_dir, 'dashboard', 'scaler.joblib')
     
-    joblib.dump(model, model_path)
-    joblib.dump(scaler, scaler_path)
+    # Renamed into place so the serving processes' artifact registry never loads a partial file
+    publish_artifact(scaler, scaler_path)
+    publish_artifact(model, model_path)
     print(f"Churn model saved to {model_path}")
     print(f"Scaler saved to {scaler_path}")
     
@@ -114,12 +101,23 @@ def main():
     df = perform_rfm_analysis(df)
     
     # Train the churn prediction model
-    df, model, scaler = train_churn_model(df)
+    if getattr(settings, 'CHURN_TRAINING_MODE', 'full') == 'incremental':
+        # Only the customers whose features changed since the last run are trained on
+        df['Churn'] = churn_labels(df['recency'])
+        print(f"Churn model update: {update_churn_model()}")
+        model, scaler = load_churn_model_and_scaler()
+    else:
+        df, model, scaler = train_churn_model(df)
     
     # Save the updated DataFrame with RFM segments and churn labels
-    output_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dashboard', 'rfm_features_with_segments.csv')
-    df.to_csv(output_path, index=False)
+    output_path = write_frame(df, RFM_SEGMENTS_BASE)
     print(f"Updated features with segments saved to {output_path}")
 
+    # The segment views read the table; the new generation becomes visible in one switch
+    if model is not None and scaler is not None:
+        df['churn_probability'] = predict_churn_batch(df, model, scaler)
+    generation = publish_segments(df)
+    print(f"Published segments generation {generation}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
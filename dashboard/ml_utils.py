@@ -1,50 +1,214 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 import joblib
-import os
+from django.conf import settings
+
+from .frames import frame_path, read_frame
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frame artifacts are named without an extension (see frames.py)
+RFM_FEATURES_BASE = os.path.join(ARTIFACT_DIR, 'rfm_features')
+RFM_SEGMENTS_BASE = os.path.join(ARTIFACT_DIR, 'rfm_features_with_segments')
+RFM_SEGMENTS_PATH = frame_path(RFM_SEGMENTS_BASE)
+CHURN_MODEL_PATH = os.path.join(ARTIFACT_DIR, 'churn_model.joblib')
+SCALER_PATH = os.path.join(ARTIFACT_DIR, 'scaler.joblib')
+ARTIFACT_PATHS = [RFM_SEGMENTS_PATH, CHURN_MODEL_PATH, SCALER_PATH]
+# Churn model inputs, in training order (see ml_model_building.train_churn_model)
+CHURN_FEATURES = ['recency', 'frequency', 'monetary', 'avg_days_between_orders']
+# Recency is measured from this date, as in ml_data_preparation
+CHURN_REFERENCE_DATE = pd.Timestamp('2025-04-01', tz='UTC')
 
 def load_rfm_segments():
-    print("Loading RFM segments...")
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    rfm_path = os.path.join(project_dir, 'dashboard', 'rfm_features_with_segments.csv')
-    
-    if not os.path.exists(rfm_path):
-        print(f"Error: {rfm_path} does not exist.")
+    logger.info("Loading RFM segments...")
+    # Only the two columns the lookup needs are read
+    rfm_df = read_frame(RFM_SEGMENTS_BASE, columns=['customer_name', 'Segment'])
+    if rfm_df is None:
+        logger.error(f"{RFM_SEGMENTS_PATH} does not exist.")
         return None
-    
-    rfm_df = pd.read_csv(rfm_path)
+
     # Create a dictionary for quick lookup: {customer_name: segment}
     rfm_dict = dict(zip(rfm_df['customer_name'], rfm_df['Segment']))
-    print(f"Loaded RFM segments for {len(rfm_dict)} customers.")
+    logger.info(f"Loaded RFM segments for {len(rfm_dict)} customers.")
     return rfm_dict
 
 def load_churn_model_and_scaler():
-    print("Loading churn model and scaler...")
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    model_path = os.path.join(project_dir, 'dashboard', 'churn_model.joblib')
-    scaler_path = os.path.join(project_dir, 'dashboard', 'scaler.joblib')
-    
-    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
-        print(f"Error: Model or scaler file does not exist.")
+    logger.info("Loading churn model and scaler...")
+    if not os.path.exists(CHURN_MODEL_PATH) or not os.path.exists(SCALER_PATH):
+        logger.error("Model or scaler file does not exist.")
         return None, None
-    
-    model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
-    print("Churn model and scaler loaded successfully.")
+
+    model = joblib.load(CHURN_MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    logger.info("Churn model and scaler loaded successfully.")
     return model, scaler
 
+def publish_artifact(obj, path):
+    """
+    Write a joblib artifact next to its final path and rename it into place, so readers
+    (and the registry's mtime check) never see a half-written file.
+    """
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(obj, temp_path)
+    os.replace(temp_path, path)
+
+def artifact_signature():
+    # (mtime_ns, size) per artifact; None for a missing file. A few stat() calls.
+    signature = []
+    for path in ARTIFACT_PATHS:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ArtifactSnapshot:
+    """
+    One consistent set of loaded artifacts. Never mutated; a reload builds a new snapshot.
+    """
+    def __init__(self, rfm_segments, model, scaler, signature):
+        self.rfm_segments = rfm_segments
+        self.model = model
+        self.scaler = scaler
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    @property
+    def ready(self):
+        return self.rfm_segments is not None and self.model is not None and self.scaler is not None
+
+    @property
+    def model_version(self):
+        # Identifies the churn model + scaler files this snapshot was loaded from
+        return hashlib.sha1(repr(self.signature[1:]).encode('utf-8')).hexdigest()[:12]
+
+
+class ArtifactRegistry:
+    """
+    Process-wide cache of the RFM segments, churn model and scaler. The first get() loads
+    synchronously; afterwards get() only compares file mtimes/sizes (at most once per
+    check_interval seconds) and, when a retrain has published new files, reloads them in a
+    background thread and swaps the snapshot in a single assignment. Requests keep being
+    served from the previous snapshot until the new one is complete.
+    """
+    def __init__(self, check_interval=None):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+
+    def _interval(self):
+        if self.check_interval is not None:
+            return self.check_interval
+        return getattr(settings, 'ML_ARTIFACT_CHECK_INTERVAL', 1.0)
+
+    def _load(self):
+        signature = artifact_signature()
+        rfm_segments = load_rfm_segments()
+        model, scaler = load_churn_model_and_scaler()
+        if artifact_signature() != signature:
+            # Files changed while loading (a publish in progress); keep the old snapshot
+            # and let the next check pick up the finished set
+            raise RuntimeError("Artifacts changed while loading")
+        return ArtifactSnapshot(rfm_segments, model, scaler, signature)
+
+    def _load_when_stable(self, attempts=3):
+        # Synchronous loads have nothing to fall back on, so retry a publish in progress
+        for attempt in range(attempts):
+            try:
+                return self._load()
+            except RuntimeError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(0.1)
+
+    def _reload_in_background(self):
+        try:
+            self._snapshot = self._load()
+            logger.info("Reloaded ML artifacts.")
+        except Exception as e:
+            logger.warning(f"ML artifact reload failed, keeping the previous version: {str(e)}")
+        finally:
+            self._reloading = False
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load_when_stable()
+                    self._checked_at = time.monotonic()
+                return self._snapshot
+
+        now = time.monotonic()
+        if now - self._checked_at < self._interval():
+            return snapshot
+        self._checked_at = now
+        if artifact_signature() != snapshot.signature:
+            with self._lock:
+                if not self._reloading:
+                    self._reloading = True
+                    threading.Thread(target=self._reload_in_background, name='ml-artifact-reload', daemon=True).start()
+        return snapshot
+
+    def reload(self):
+        """
+        Load the current artifacts synchronously (e.g. right after a retrain in this process).
+        """
+        with self._lock:
+            self._snapshot = self._load_when_stable()
+            self._checked_at = time.monotonic()
+        return self._snapshot
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'loaded': snapshot is not None,
+            'ready': snapshot.ready if snapshot else False,
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'stale': snapshot.signature != artifact_signature() if snapshot else None,
+            'reloading': self._reloading,
+        }
+
+
+registry = ArtifactRegistry()
+
+def get_artifacts():
+    """
+    Current ArtifactSnapshot from the process-wide registry.
+    """
+    return registry.get()
+
+def predict_churn_batch(features, model, scaler):
+    """
+    Churn probabilities for many customers in one scaler/model pass. `features` is a
+    DataFrame with the CHURN_FEATURES columns or an (n, 4) array in that order.
+    Returns a float64 array of length n.
+    """
+    if isinstance(features, pd.DataFrame):
+        values = features[CHURN_FEATURES].to_numpy(dtype=np.float64)
+    else:
+        values = np.asarray(features, dtype=np.float64).reshape(-1, len(CHURN_FEATURES))
+    if not len(values):
+        return np.zeros(0, dtype=np.float64)
+    if hasattr(scaler, 'feature_names_in_'):
+        # Fitted on a DataFrame; pass one back so scikit-learn doesn't warn about feature names
+        values = pd.DataFrame(values, columns=CHURN_FEATURES)
+    scaled = scaler.transform(values)
+    return model.predict_proba(scaled)[:, 1]
+
 def predict_churn(customer_features, model, scaler):
-    print("Predicting churn probability...")
-    # Features must match the order used during training: ['recency', 'frequency', 'monetary', 'avg_days_between_orders']
-    features = [[
-        customer_features['recency'],
-        customer_features['frequency'],
-        customer_features['monetary'],
-        customer_features['avg_days_between_orders']
-    ]]
-    
-    # Standardize the features using the loaded scaler
-    features_scaled = scaler.transform(features)
-    
-    # Predict churn probability
-    churn_prob = model.predict_proba(features_scaled)[0][1]  # Probability of churn (class 1)
-    return churn_prob
\ No newline at end of file
+    """
+    Churn probability for one customer (a dict with the CHURN_FEATURES keys).
+    """
+    return float(predict_churn_batch(pd.DataFrame([customer_features]), model, scaler)[0])
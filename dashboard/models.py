@@ -1,12 +1,14 @@
 
 ### TESTING ####
 
+import threading
+from contextlib import contextmanager
 from django.db import models
 ## NEW ##
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.core.management import call_command
+from django.utils import timezone
 
 class Order(models.Model):
     order_id = models.AutoField(primary_key=True)
@@ -36,14 +38,282 @@ class Order(models.Model):
 
     class Meta:
         db_table = 'orders'  # Changed from 'order' to 'orders'
+        indexes = [
+            # Per-customer history lookups (cohort stats on insert, cohort backfill)
+            models.Index(fields=['customer_email', 'order_date'], name='orders_email_date_idx'),
+            models.Index(fields=['customer_name', 'order_date'], name='orders_name_date_idx'),
+        ]
 
-# Signal to update RFM and churn model when a new order is added
+class CustomerFeatures(models.Model):
+    """
+    Per-customer RFM aggregates, updated in O(1) for every new order (see feature_store.apply_order).
+    """
+    customer_name = models.CharField(max_length=100, unique=True)
+    customer_email = models.EmailField()  # Email on the customer's most recent order
+    first_order_date = models.DateTimeField()
+    last_order_date = models.DateTimeField()
+    order_count = models.PositiveIntegerField(default=0)
+    monetary = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    gap_sum_days = models.FloatField(default=0.0)  # Running sum of days between consecutive orders
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Features for {self.customer_name}"
+
+    @property
+    def avg_days_between_orders(self):
+        if self.order_count > 1:
+            return self.gap_sum_days / (self.order_count - 1)
+        return 0.0
+
+    class Meta:
+        db_table = 'customer_features'
+
+class OrderDailyRollup(models.Model):
+    """
+    Orders pre-aggregated per day x status x payment method x product, kept up to date as
+    orders are created, edited and deleted (see order_rollups). Time-series charts read this
+    instead of `orders`.
+    """
+    day = models.DateField()
+    order_status = models.CharField(max_length=50)
+    payment_method = models.CharField(max_length=50)
+    product_name = models.CharField(max_length=100)
+    order_count = models.PositiveIntegerField(default=0)
+    order_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    order_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    shipping_charge = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    order_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    order_refunded = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    product_quantity = models.BigIntegerField(default=0)
+    product_row_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+
+    def __str__(self):
+        return f"Rollup {self.day} {self.order_status}/{self.payment_method}/{self.product_name}"
+
+    class Meta:
+        db_table = 'order_daily_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'order_status', 'payment_method', 'product_name'],
+                                    name='unique_order_daily_rollup'),
+        ]
+
+class CohortMonthlyStats(models.Model):
+    """
+    Cohort matrix cell: customers whose first order (by customer_email, UTC month) was in
+    cohort_month, and their activity months_since calendar months later. Only the cells of
+    the ordering customer change when an order is written (see cohort_stats.apply_order).
+    """
+    cohort_month = models.DateField()  # First day of the month
+    months_since = models.PositiveSmallIntegerField()
+    customers = models.PositiveIntegerField(default=0)  # Distinct customers with an order in that month
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # Distinct customers counted for the 'approx' (30-day) offset of this month: those with an
+    # order here and none in an earlier calendar month mapping to the same approx offset
+    approx_customers = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Cohort {self.cohort_month:%b %Y} +{self.months_since}"
+
+    class Meta:
+        db_table = 'cohort_monthly_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['cohort_month', 'months_since'], name='unique_cohort_month_cell'),
+        ]
+
+class CustomerCohort(models.Model):
+    """
+    One customer's (by customer_email) activity per UTC month, as counted in the cohort
+    matrix, so an order only needs this row to update the matrix cells it affects.
+    """
+    customer_email = models.EmailField(unique=True)
+    cohort_month = models.DateField()  # First day of the month of the first order
+    months = models.JSONField(default=dict)  # {'YYYY-MM-01': [orders, 'revenue']}
+
+    def __str__(self):
+        return f"{self.customer_email} ({self.cohort_month:%b %Y} cohort)"
+
+    class Meta:
+        db_table = 'customer_cohorts'
+
+class CustomerScore(models.Model):
+    """
+    Precomputed churn probability per customer, written in bulk by `manage.py score_customers`.
+    A score is current while model_version matches the loaded model and features_updated_at
+    matches the customer's CustomerFeatures row.
+    """
+    customer_name = models.CharField(max_length=100, unique=True)
+    churn_probability = models.FloatField()
+    model_version = models.CharField(max_length=40)
+    features_updated_at = models.DateTimeField()
+    scored_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Churn score for {self.customer_name}: {self.churn_probability:.3f}"
+
+    class Meta:
+        db_table = 'customer_scores'
+
+class CustomerSegment(models.Model):
+    """
+    RFM segment and churn label per customer, as published by a retrain. Each retrain writes
+    a new generation; readers only see the generation recorded as active (see segments.py).
+    """
+    generation = models.PositiveIntegerField()
+    customer_name = models.CharField(max_length=100)
+    customer_email = models.EmailField(blank=True)
+    last_order_date = models.DateTimeField()
+    recency = models.FloatField()
+    frequency = models.PositiveIntegerField()
+    monetary = models.DecimalField(max_digits=14, decimal_places=2)
+    avg_days_between_orders = models.FloatField(default=0.0)
+    r_score = models.PositiveSmallIntegerField()
+    f_score = models.PositiveSmallIntegerField()
+    m_score = models.PositiveSmallIntegerField()
+    rfm_score = models.PositiveSmallIntegerField()  # R, F, M digits packed as an integer (543)
+    segment = models.CharField(max_length=50)
+    churn = models.BooleanField()
+    churn_probability = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.customer_name}: {self.segment} (generation {self.generation})"
+
+    class Meta:
+        db_table = 'customer_segments'
+        indexes = [
+            models.Index(fields=['generation', 'segment'], name='segments_gen_segment_idx'),
+            models.Index(fields=['generation', 'last_order_date'], name='segments_gen_last_order_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'customer_name'], name='unique_segment_generation_customer'),
+        ]
+
+class RetrainJob(models.Model):
+    """
+    Durable record of a pending RFM/churn retrain. Signals only mark the model as dirty;
+    the process_retrain_queue worker merges all pending rows into a single retrain.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    reason = models.CharField(max_length=255, blank=True)
+    trigger_count = models.PositiveIntegerField(default=1)
+    first_triggered_at = models.DateTimeField(default=timezone.now)
+    last_triggered_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"RetrainJob {self.pk} ({self.status})"
+
+    @property
+    def duration_seconds(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    class Meta:
+        db_table = 'retrain_jobs'
+
+class DataVersion(models.Model):
+    """
+    Monotonic counter bumped whenever data behind the analytics endpoints changes (order
+    writes, derived table rebuilds, retrains). Cached responses are keyed on it.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    class Meta:
+        db_table = 'data_versions'
+
+_signal_state = threading.local()
+
+@contextmanager
+def suppress_order_signals():
+    """
+    Skip the per-order feature update and retrain trigger, e.g. during bulk imports that
+    refresh derived tables once at the end.
+    """
+    previous = getattr(_signal_state, 'suppressed', False)
+    _signal_state.suppressed = True
+    try:
+        yield
+    finally:
+        _signal_state.suppressed = previous
+
+# Signal to update the feature store and daily rollups, and mark the RFM and churn model as dirty when a new order is added
 @receiver(post_save, sender=Order)
 def update_rfm_and_churn_on_new_order(sender, instance, created, **kwargs):
-    if created:  # Only trigger on new orders (not updates)
+    if created and not getattr(_signal_state, 'suppressed', False):  # Edits are handled below
+        try:
+            from . import cohort_stats, feature_store, order_rollups
+            from .retrain_queue import enqueue_retrain
+            feature_store.apply_order(instance)
+            order_rollups.apply_order(instance)
+            cohort_stats.apply_order(instance)
+            enqueue_retrain(reason=f"New order {instance.order_id}")
+        except Exception as e:
+            print(f"Error updating derived order tables or queueing retrain: {str(e)}")
+
+# The stored version of an order about to be edited, so the derived tables can take it out
+@receiver(pre_save, sender=Order)
+def remember_previous_order(sender, instance, **kwargs):
+    if instance.pk is not None and not getattr(_signal_state, 'suppressed', False):
+        instance._previous_order = Order.objects.filter(pk=instance.pk).first()
+
+@receiver(post_save, sender=Order)
+def update_derived_tables_on_order_edit(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_order', None)
+    if created or previous is None or getattr(_signal_state, 'suppressed', False):
+        return
+    try:
+        from . import cohort_stats, feature_store, order_rollups
+        from .retrain_queue import enqueue_retrain
+        feature_store.refresh_customers({previous.customer_name, instance.customer_name})
+        order_rollups.remove_order(previous)
+        order_rollups.apply_order(instance)
+        cohort_stats.remove_order(previous)
+        cohort_stats.apply_order(instance)
+        enqueue_retrain(reason=f"Edited order {instance.order_id}")
+    except Exception as e:
+        print(f"Error updating derived order tables or queueing retrain: {str(e)}")
+
+@receiver(post_delete, sender=Order)
+def update_derived_tables_on_order_delete(sender, instance, **kwargs):
+    if getattr(_signal_state, 'suppressed', False):
+        return
+    try:
+        from . import cohort_stats, feature_store, order_rollups
+        from .retrain_queue import enqueue_retrain
+        feature_store.refresh_customers({instance.customer_name})
+        order_rollups.remove_order(instance)
+        cohort_stats.remove_order(instance)
+        enqueue_retrain(reason=f"Deleted order {instance.order_id}")
+    except Exception as e:
+        print(f"Error updating derived order tables or queueing retrain: {str(e)}")
+
+# Invalidate cached analytics responses whenever an order is written or deleted
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_data_version_on_order_change(sender, instance, **kwargs):
+    if not getattr(_signal_state, 'suppressed', False):
         try:
-            print(f"New order detected: {instance.order_id}. Updating RFM and churn model...")
-            call_command('update_rfm_and_churn')
-            print("RFM and churn model updated successfully.")
+            from .caching import bump_data_version
+            bump_data_version()
         except Exception as e:
-            print(f"Error updating RFM and churn model: {str(e)}")
\ No newline at end of file
+            print(f"Error bumping data version: {str(e)}")
@@ -0,0 +1,98 @@
+import csv
+import json
+import logging
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+from .upserts import bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+# Every column of the orders table except the auto-generated primary key
+IMPORT_FIELDS = [field for field in Order._meta.concrete_fields if not field.primary_key]
+UPDATE_FIELDS = [field.name for field in IMPORT_FIELDS if field.name != 'order_number']
+
+
+def detect_format(path):
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def iter_raw_rows(path, file_format=None):
+    """
+    Yield raw rows (dicts) one at a time, so files of any size are read in constant memory.
+    """
+    file_format = file_format or detect_format(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def parse_row(raw):
+    """
+    Validate a raw row and build an (unsaved) Order. Raises ValidationError on bad input.
+    """
+    values = {}
+    errors = {}
+    for field in IMPORT_FIELDS:
+        value = raw.get(field.name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if field.has_default():
+                values[field.name] = field.get_default()
+                continue
+            if field.null:
+                values[field.name] = None
+                continue
+        try:
+            value = field.clean(value, None)
+        except ValidationError as e:
+            errors[field.name] = e.messages
+            continue
+        if field.name == 'order_date' and timezone.is_naive(value):
+            value = timezone.make_aware(value, dt_timezone.utc)
+        values[field.name] = value
+
+    if errors:
+        raise ValidationError(errors)
+    return Order(**values)
+
+
+def iter_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def existing_order_dates(orders):
+    """
+    order_date of the stored rows the given orders will overwrite (matched on order_number),
+    so the derived tables of the days they move away from can be refreshed too.
+    """
+    order_numbers = {order.order_number for order in orders}
+    return list(Order.objects.filter(order_number__in=order_numbers).values_list('order_date', flat=True))
+
+
+def upsert_orders(orders):
+    """
+    Insert a batch of orders, updating existing rows that share an order_number.
+    bulk_create does not send post_save, so no per-row feature update or retrain is triggered.
+    """
+    # The last occurrence of an order_number within a batch wins
+    deduplicated = list({order.order_number: order for order in orders}.values())
+    with transaction.atomic():
+        bulk_upsert(Order, deduplicated, unique_fields=['order_number'], update_fields=UPDATE_FIELDS)
+    return len(deduplicated)
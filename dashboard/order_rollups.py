@@ -0,0 +1,160 @@
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderDailyRollup
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ['order_status', 'payment_method', 'product_name']
+SUM_FIELDS = ['order_total', 'order_tax', 'shipping_charge', 'order_discount', 'order_refunded', 'product_row_total']
+
+
+def rollup_day(order_date):
+    # Same day boundaries as TruncDay in the current time zone
+    return timezone.localtime(order_date).date()
+
+
+def _order_values(product_quantity, sums):
+    values = {
+        'order_count': 1,
+        'product_quantity': product_quantity or 0,
+    }
+    for field, value in zip(SUM_FIELDS, sums):
+        values[field] = Decimal(str(value or 0))
+    return values
+
+
+def _accumulate(target, values):
+    target['order_count'] += values['order_count']
+    target['product_quantity'] += values['product_quantity']
+    for field in SUM_FIELDS:
+        target[field] += values[field]
+
+
+def apply_order(order):
+    """
+    Fold a newly created order into its daily rollup row.
+    """
+    key = {field: getattr(order, field) for field in KEY_FIELDS}
+    key['day'] = rollup_day(order.order_date)
+    values = _order_values(order.product_quantity, [getattr(order, field) for field in SUM_FIELDS])
+
+    with transaction.atomic():
+        rollup, created = OrderDailyRollup.objects.select_for_update().get_or_create(defaults=values, **key)
+        if created:
+            return rollup
+        rollup.order_count += 1
+        rollup.product_quantity += values['product_quantity']
+        for field in SUM_FIELDS:
+            setattr(rollup, field, getattr(rollup, field) + values[field])
+        rollup.save()
+    return rollup
+
+
+def remove_order(order):
+    """
+    Take an order (the stored version of an edited one, or a deleted one) back out of its
+    daily rollup row, deleting the row once it counts no orders.
+    """
+    key = {field: getattr(order, field) for field in KEY_FIELDS}
+    key['day'] = rollup_day(order.order_date)
+    values = _order_values(order.product_quantity, [getattr(order, field) for field in SUM_FIELDS])
+
+    with transaction.atomic():
+        rollup = OrderDailyRollup.objects.select_for_update().filter(**key).first()
+        if rollup is None:
+            return
+        if rollup.order_count <= 1:
+            rollup.delete()
+            return
+        rollup.order_count -= 1
+        rollup.product_quantity -= values['product_quantity']
+        for field in SUM_FIELDS:
+            setattr(rollup, field, getattr(rollup, field) - values[field])
+        rollup.save()
+
+
+def rebuild_rollups(start_day=None, end_day=None, batch_size=5000):
+    """
+    Recompute rollups for [start_day, end_day] (the whole history by default) by streaming
+    orders in date order, so only one day's groups are held in memory at a time.
+    """
+    orders = Order.objects.all()
+    rollups = OrderDailyRollup.objects.all()
+    if start_day:
+        orders = orders.filter(order_date__date__gte=start_day)
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day:
+        orders = orders.filter(order_date__date__lte=end_day)
+        rollups = rollups.filter(day__lte=end_day)
+
+    rows = (orders.order_by('order_date')
+            .values_list('order_date', *KEY_FIELDS, 'product_quantity', *SUM_FIELDS))
+
+    total = 0
+    pending = []
+
+    def flush(day, groups):
+        for key, values in groups.items():
+            pending.append(OrderDailyRollup(day=day, **dict(zip(KEY_FIELDS, key)), **values))
+
+    with transaction.atomic():
+        rollups.delete()
+        current_day = None
+        groups = {}
+        for row in rows.iterator(chunk_size=batch_size):
+            order_date, key, product_quantity, sums = row[0], row[1:4], row[4], row[5:]
+            day = rollup_day(order_date)
+            if day != current_day:
+                flush(current_day, groups)
+                groups = {}
+                current_day = day
+                if len(pending) >= batch_size:
+                    OrderDailyRollup.objects.bulk_create(pending)
+                    total += len(pending)
+                    pending = []
+
+            values = _order_values(product_quantity, sums)
+            if key in groups:
+                _accumulate(groups[key], values)
+            else:
+                groups[key] = values
+        flush(current_day, groups)
+        if pending:
+            OrderDailyRollup.objects.bulk_create(pending)
+            total += len(pending)
+
+    logger.info(f"Rebuilt {total} daily rollup rows.")
+    return total
+
+
+def rebuild_days(days, batch_size=5000):
+    """
+    Rebuild the rollups of the given days, one rebuild_rollups call per run of consecutive
+    days, so scattered days don't pull in the whole range between them.
+    """
+    total = 0
+    runs = []
+    for day in sorted(set(days)):
+        if runs and (day - runs[-1][1]).days == 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    for start_day, end_day in runs:
+        total += rebuild_rollups(start_day, end_day, batch_size=batch_size)
+    return total
+
+
+def rollups_between(start_day=None, end_day=None):
+    """
+    Rollup rows for an inclusive day range (either bound may be None).
+    """
+    queryset = OrderDailyRollup.objects.all()
+    if start_day:
+        queryset = queryset.filter(day__gte=start_day)
+    if end_day:
+        queryset = queryset.filter(day__lte=end_day)
+    return queryset
@@ -0,0 +1,136 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Customer-sharded execution of the batch aggregations (features, cohorts) in a process
+# pool. Inputs are integer-coded numpy arrays, grouped by shard and placed in shared memory
+# once; each worker attaches to them, slices out its shard's rows and returns small
+# per-shard aggregates, which the caller merges in shard order. Nothing here touches the database, so workers need no
+# Django setup beyond importing this module.
+
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # Fibonacci hashing
+
+
+def get_workers(workers=None):
+    """
+    Worker processes to use: the argument, else ML_PARALLEL_WORKERS (0 means one per CPU).
+    """
+    workers = getattr(settings, 'ML_PARALLEL_WORKERS', 1) if workers is None else workers
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def shard_ids(codes, shards):
+    """
+    Hash partition of integer customer codes into shards (uint16 per row).
+    """
+    hashed = np.asarray(codes, dtype=np.int64).view(np.uint64) * HASH_MULTIPLIER
+    return ((hashed >> np.uint64(32)) % np.uint64(shards)).astype(np.uint16)
+
+
+class SharedArrays:
+    """
+    Copies named arrays into shared memory blocks for the duration of a `with` block.
+    `specs` is the small picklable description workers pass to attach().
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.blocks = []
+        self.specs = {}
+
+    def __enter__(self):
+        try:
+            for name, array in self.arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                self.specs[name] = (block.name, array.shape, array.dtype.str)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach(specs):
+    """
+    Worker side of SharedArrays: ({name: ndarray view}, blocks to close when done).
+    """
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in specs.items():
+        # Pool workers share the creating process's resource tracker, which unlinks the
+        # block once when SharedArrays exits
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return arrays, blocks
+
+
+def _run_shard(task, specs, start, end, args):
+    arrays, blocks = attach(specs)
+    try:
+        # The rows are grouped by shard, so a shard is one contiguous slice
+        shard_arrays = {name: values[start:end] for name, values in arrays.items() if name != 'rows'}
+        return task(shard_arrays, arrays['rows'][start:end], *args)
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def run_sharded(task, codes, arrays, workers, *args, pool=None):
+    """
+    Call task(shard_arrays, rows, *args) once per shard, where shard_arrays are the rows of
+    `arrays` whose customer code hashes to that shard and rows their positions (ascending).
+    task must be a module-level function. Callers sharding many inputs in a row can pass
+    their own ProcessPoolExecutor as pool. Returns the results in shard order.
+    """
+    shards = workers
+    ids = shard_ids(codes, shards)
+    # Stable sort by shard, keeping input order within a shard; shard i is rows bounds[i]:bounds[i + 1]
+    rows = np.argsort(ids, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=shards))]).tolist()
+    arrays = {name: np.asarray(values)[rows] for name, values in arrays.items()}
+    arrays['rows'] = rows.astype(np.int64)
+    with SharedArrays(arrays) as shared:
+        if pool is not None:
+            return _submit_shards(pool, task, shared.specs, bounds, args)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return _submit_shards(pool, task, shared.specs, bounds, args)
+
+
+def _submit_shards(pool, task, specs, bounds, args):
+    futures = [pool.submit(_run_shard, task, specs, start, end, args) for start, end in zip(bounds, bounds[1:])]
+    return [future.result() for future in futures]
+
+
+def customer_partials_task(arrays, rows):
+    """
+    Per-customer count, total, first/last order date (int64 ns) and the row of the last
+    order (the first such row on ties) for one shard.
+    """
+    customers, local_codes = np.unique(arrays['codes'], return_inverse=True)
+    local_codes = local_codes.ravel()
+    dates = arrays['dates']
+    count = np.bincount(local_codes, minlength=len(customers))
+    total = np.bincount(local_codes, weights=arrays['totals'], minlength=len(customers))
+    first = np.full(len(customers), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, local_codes, dates)
+    last = np.full(len(customers), np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last, local_codes, dates)
+    # Rows are in input order, so the first row reaching the maximum is kept on ties
+    is_last = dates == last[local_codes]
+    last_row = np.full(len(customers), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(last_row, local_codes[is_last], rows[is_last])
+    return customers, count, total, first, last, last_row
@@ -0,0 +1,84 @@
+import logging
+import os
+
+import numpy as np
+
+from .caching import get_data_version
+from .models import CustomerFeatures
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'percentile_index.npz')
+DAYS_PER_MONTH = 30.42  # Same month length the customer profile uses for lifetime_months
+
+# Loaded index and the (mtime_ns, size) of the file it came from, or ('computed', data version)
+# when it was computed from the database for lack of a file
+_loaded = {'signature': None, 'index': None}
+
+
+def customer_distributions(batch_size=5000):
+    """
+    Sorted per-customer LTV and lifetime (months) arrays from the feature store.
+    """
+    rows = CustomerFeatures.objects.values_list('monetary', 'first_order_date', 'last_order_date')
+    ltv, lifetime = [], []
+    for monetary, first_order_date, last_order_date in rows.iterator(chunk_size=batch_size):
+        if monetary is not None:
+            ltv.append(float(monetary))
+        lifetime.append((last_order_date.date() - first_order_date.date()).days / DAYS_PER_MONTH)
+    return {'ltv': np.sort(np.array(ltv, dtype=np.float64)),
+            'lifetime_months': np.sort(np.array(lifetime, dtype=np.float64))}
+
+
+def build_percentile_index(path=INDEX_PATH):
+    """
+    Rebuild the index file (sorted arrays, renamed into place) from CustomerFeatures.
+    Run at refresh time; profile requests only read it.
+    """
+    index = customer_distributions()
+    temp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(temp_path, **index)
+    os.replace(temp_path, path)
+    _loaded['signature'] = None
+    logger.info(f"Built percentile index for {len(index['lifetime_months'])} customers.")
+    return index
+
+
+def get_percentile_index():
+    """
+    The sorted arrays, loaded once per process and reloaded when the file changes. Built
+    from the database (and not saved) when no index file exists yet, then kept until the
+    data version changes.
+    """
+    try:
+        stat = os.stat(INDEX_PATH)
+    except FileNotFoundError:
+        signature = ('computed', get_data_version())
+        if _loaded['signature'] != signature:
+            logger.warning("No percentile index file; computing the distributions in memory.")
+            _loaded['index'], _loaded['signature'] = customer_distributions(), signature
+        return _loaded['index']
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if _loaded['signature'] != signature:
+        with np.load(INDEX_PATH) as data:
+            index = {name: data[name] for name in data.files}
+        _loaded['index'], _loaded['signature'] = index, signature
+    return _loaded['index']
+
+
+def rank(sorted_values, value):
+    """
+    Position of value in an ascending array in O(log n):
+    rank (1 = highest), percentile (share of customers at or below value, 0-100) and
+    whether it is in the top 10% (value >= the value at that cut-off, as before).
+    """
+    count = len(sorted_values)
+    if not count:
+        return {'rank': None, 'percentile': None, 'is_top': False}
+    at_or_below = int(np.searchsorted(sorted_values, value, side='right'))
+    top_threshold = sorted_values[count - max(1, count // 10)]
+    return {
+        'rank': count - at_or_below + 1,
+        'percentile': round(at_or_below / count * 100, 2),
+        'is_top': bool(value >= top_threshold),
+    }
@@ -0,0 +1,150 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import RetrainJob
+
+logger = logging.getLogger(__name__)
+
+
+def get_debounce_seconds():
+    return getattr(settings, 'RETRAIN_DEBOUNCE_SECONDS', 300)
+
+
+def get_max_wait_seconds():
+    return getattr(settings, 'RETRAIN_MAX_WAIT_SECONDS', 3600)
+
+
+def get_stale_seconds():
+    return getattr(settings, 'RETRAIN_STALE_SECONDS', 3 * 3600)
+
+
+def enqueue_retrain(reason=''):
+    """
+    Mark the RFM/churn model as dirty. This is a single UPDATE (or INSERT when nothing is
+    pending), so it is cheap enough to run on the order write path.
+    """
+    now = timezone.now()
+    updated = (RetrainJob.objects.filter(status=RetrainJob.PENDING)
+               .update(trigger_count=F('trigger_count') + 1, last_triggered_at=now, reason=reason[:255]))
+    if not updated:
+        RetrainJob.objects.create(reason=reason[:255], first_triggered_at=now, last_triggered_at=now)
+
+
+def requeue_stale_jobs(stale_seconds=None):
+    """
+    Put jobs left RUNNING for longer than RETRAIN_STALE_SECONDS (their worker died) back in
+    the queue. Returns the number of jobs requeued.
+    """
+    if stale_seconds is None:
+        stale_seconds = get_stale_seconds()
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    requeued = (RetrainJob.objects.filter(status=RetrainJob.RUNNING, started_at__lt=cutoff)
+                .update(status=RetrainJob.PENDING, started_at=None,
+                        error=f'Requeued after running for over {stale_seconds}s'))
+    if requeued:
+        logger.warning(f"Requeued {requeued} retrain job(s) left running by a stopped worker.")
+    return requeued
+
+
+def claim_pending_jobs(debounce_seconds=None, max_wait_seconds=None):
+    """
+    Claim every pending job once the newest trigger is older than the debounce window, or
+    the oldest has waited RETRAIN_MAX_WAIT_SECONDS (so a steady order stream can't postpone
+    the retrain forever). Nothing is claimed while another worker's retrain is still running
+    (and not yet stale), so two runs never overlap on the artifacts and segment generations.
+    Returns the list of claimed job ids (empty if there is nothing to do yet).
+    """
+    if debounce_seconds is None:
+        debounce_seconds = get_debounce_seconds()
+    if max_wait_seconds is None:
+        max_wait_seconds = get_max_wait_seconds()
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=debounce_seconds)
+    max_wait_cutoff = now - timedelta(seconds=max_wait_seconds)
+    stale_cutoff = now - timedelta(seconds=get_stale_seconds())
+
+    with transaction.atomic():
+        pending = list(RetrainJob.objects.select_for_update(skip_locked=True)
+                       .filter(status=RetrainJob.PENDING)
+                       .values_list('pk', 'first_triggered_at', 'last_triggered_at'))
+        if not pending:
+            return []
+        # Stale runs are requeued by requeue_stale_jobs rather than waited for
+        if RetrainJob.objects.filter(status=RetrainJob.RUNNING, started_at__gte=stale_cutoff).exists():
+            return []
+        # Keep waiting while orders are still arriving, up to the maximum wait
+        if (max(last_triggered for _, _, last_triggered in pending) > cutoff
+                and min(first_triggered for _, first_triggered, _ in pending) > max_wait_cutoff):
+            return []
+        job_ids = [pk for pk, _, _ in pending]
+        RetrainJob.objects.filter(pk__in=job_ids).update(status=RetrainJob.RUNNING, started_at=timezone.now())
+    return job_ids
+
+
+def run_retrain(job_ids):
+    """
+    Run a single ml_data_preparation/ml_model_building pass for all claimed jobs.
+    """
+    logger.info(f"Running retrain for {len(job_ids)} merged job(s)...")
+    started = time.monotonic()
+    try:
+        call_command('update_rfm_and_churn')
+    except Exception as e:
+        logger.error(f"Retrain failed: {str(e)}", exc_info=True)
+        RetrainJob.objects.filter(pk__in=job_ids).update(
+            status=RetrainJob.FAILED, finished_at=timezone.now(), error=str(e))
+        return False
+
+    RetrainJob.objects.filter(pk__in=job_ids).update(status=RetrainJob.DONE, finished_at=timezone.now())
+    logger.info(f"Retrain completed in {time.monotonic() - started:.2f}s.")
+    return True
+
+
+def process_queue(debounce_seconds=None):
+    """
+    Process the queue once. Returns True if a retrain was run.
+    """
+    requeue_stale_jobs()
+    job_ids = claim_pending_jobs(debounce_seconds)
+    if not job_ids:
+        return False
+    run_retrain(job_ids)
+    return True
+
+
+def queue_status():
+    """
+    Queue depth and last-run latency for monitoring.
+    """
+    pending = (RetrainJob.objects.filter(status=RetrainJob.PENDING)
+               .aggregate(triggers=Sum('trigger_count'), last_triggered_at=Max('last_triggered_at')))
+    running = RetrainJob.objects.filter(status=RetrainJob.RUNNING).exists()
+    last_job = (RetrainJob.objects.filter(status__in=[RetrainJob.DONE, RetrainJob.FAILED])
+                .order_by('-finished_at').first())
+
+    last_run = None
+    if last_job:
+        last_run = {
+            'status': last_job.status,
+            'finished_at': last_job.finished_at.isoformat() if last_job.finished_at else None,
+            'duration_seconds': last_job.duration_seconds,
+            'triggers_merged': last_job.trigger_count,
+            'error': last_job.error,
+        }
+
+    return {
+        'queue_depth': pending['triggers'] or 0,
+        'pending_jobs': RetrainJob.objects.filter(status=RetrainJob.PENDING).count(),
+        'last_triggered_at': pending['last_triggered_at'].isoformat() if pending['last_triggered_at'] else None,
+        'running': running,
+        'debounce_seconds': get_debounce_seconds(),
+        'max_wait_seconds': get_max_wait_seconds(),
+        'last_run': last_run,
+    }
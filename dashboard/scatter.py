@@ -0,0 +1,187 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, Count, F, FloatField, IntegerField, Max, Min, Value
+from django.db.models.functions import Cast, Floor, Least, Mod
+
+# Scatter reduction strategies:
+#   sample - deterministic stratified sample (strata = label, or x deciles when unlabelled)
+#   grid   - 2D density binning: one point per occupied grid cell (and label), with its count
+#   cap    - every k-th point, so at most max_points remain
+#   none   - every point (still capped at SCATTER_HARD_LIMIT)
+STRATEGIES = ('sample', 'grid', 'cap', 'none')
+DEFAULT_STRATEGY = 'sample'
+
+
+def get_max_points(requested=None):
+    """
+    Points budget for one scatter: the requested value clamped to [1, SCATTER_HARD_LIMIT].
+    """
+    default = getattr(settings, 'SCATTER_MAX_POINTS', 5000)
+    hard_limit = getattr(settings, 'SCATTER_HARD_LIMIT', 20000)
+    try:
+        max_points = int(requested) if requested not in (None, '') else default
+    except (TypeError, ValueError):
+        max_points = default
+    return max(1, min(max_points, hard_limit))
+
+
+def _strata(x, labels):
+    if labels is not None:
+        return np.asarray(labels)
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.int64)
+    edges = np.unique(np.quantile(x, np.linspace(0, 1, 11)))
+    return np.searchsorted(edges[1:-1], x, side='right')
+
+
+def stratified_sample(x, labels=None, max_points=5000, seed=0):
+    """
+    Indices of a deterministic sample of at most max_points, allocated to strata in proportion
+    to their size (every non-empty stratum keeps at least one point, unless there are more
+    strata than max_points: then max_points strata, drawn in proportion to their size, keep
+    one each). Returned in input order.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    strata = _strata(x, labels)
+    values, inverse, sizes = np.unique(strata, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    rng = np.random.default_rng(seed)
+    if len(values) > max_points:
+        quotas = np.zeros(len(values), dtype=np.int64)
+        quotas[rng.choice(len(values), size=max_points, replace=False, p=sizes / n)] = 1
+    else:
+        quotas = np.maximum(1, np.floor(sizes * max_points / n).astype(np.int64))
+        # Rounding up to one point per stratum may overshoot the budget; trim the largest strata
+        while quotas.sum() > max_points:
+            quotas[np.argmax(quotas)] -= 1
+
+    chosen = []
+    for stratum in np.flatnonzero(quotas):
+        members = np.flatnonzero(inverse == stratum)
+        chosen.append(rng.choice(members, size=min(quotas[stratum], len(members)), replace=False))
+    return np.sort(np.concatenate(chosen))
+
+
+def capped(n, max_points=5000):
+    """
+    Indices of every k-th point so that at most max_points remain.
+    """
+    if n <= max_points:
+        return np.arange(n)
+    return np.arange(0, n, int(np.ceil(n / max_points)))
+
+
+def grid_bins(x, y, labels=None, max_points=5000):
+    """
+    Bin points on a regular grid and return one point per occupied cell (and label): the mean
+    position of its members and how many points it stands for.
+    Returns (x, y, labels or None, counts, grid_size).
+    """
+    n_labels = len(np.unique(labels)) if labels is not None and len(labels) else 1
+    grid_size = max(1, int(np.sqrt(max_points / n_labels)))
+    if len(x) == 0:
+        return x, y, labels, np.zeros(0, dtype=np.int64), grid_size
+
+    def cell_index(values):
+        low, high = values.min(), values.max()
+        if high == low:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - low) / (high - low) * grid_size).astype(np.int64), grid_size - 1)
+
+    cells = cell_index(x) * grid_size + cell_index(y)
+    keys = np.column_stack([cells, labels]) if labels is not None else cells[:, None]
+    unique_keys, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    mean_x = np.bincount(inverse, weights=x) / counts
+    mean_y = np.bincount(inverse, weights=y) / counts
+    cell_labels = unique_keys[:, 1] if labels is not None else None
+    return mean_x, mean_y, cell_labels, counts, grid_size
+
+
+def reduce_scatter(x, y, labels=None, strategy=DEFAULT_STRATEGY, max_points=5000, seed=0):
+    """
+    Reduce a scatter to a bounded number of points.
+
+    Returns (x, y, labels, counts, reduction) as lists; counts is None unless strategy is
+    'grid', and reduction describes what was applied so the client can say so.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    labels = np.asarray(labels, dtype=np.int64) if labels is not None else None
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown scatter strategy: {strategy}")
+
+    reduction = {'strategy': strategy, 'total_points': len(x), 'max_points': max_points}
+    counts = None
+    if strategy == 'grid':
+        x, y, labels, counts, reduction['grid_size'] = grid_bins(x, y, labels, max_points)
+    else:
+        if strategy == 'sample':
+            indices = stratified_sample(x, labels, max_points, seed)
+        else:
+            limit = max_points if strategy == 'cap' else getattr(settings, 'SCATTER_HARD_LIMIT', 20000)
+            indices = capped(len(x), limit)
+        x, y = x[indices], y[indices]
+        labels = labels[indices] if labels is not None else None
+
+    reduction['returned_points'] = len(x)
+    reduction['reduced'] = reduction['returned_points'] < reduction['total_points']
+    return (x.tolist(), y.tolist(),
+            labels.tolist() if labels is not None else None,
+            counts.tolist() if counts is not None else None,
+            reduction)
+
+
+def _db_grid_cell(value, low, high, grid_size):
+    # Same cell as grid_bins' cell_index, computed by the database
+    if high == low:
+        return Value(0, output_field=IntegerField())
+    scaled = Floor((value - Value(low)) * Value(grid_size / (high - low)))
+    return Cast(Least(scaled, Value(float(grid_size - 1))), IntegerField())
+
+
+def db_reduce_scatter(queryset, x_field, y_field, strategy=DEFAULT_STRATEGY, max_points=5000, seed=0):
+    """
+    reduce_scatter for two columns of a queryset, without loading every row: 'grid' bins in
+    the database (GROUP BY cell), the other strategies first fetch at most their point budget
+    as a systematic sample (every k-th primary key over the rows' key range) and reduce that.
+    Returns the same (x, y, labels, counts, reduction) as reduce_scatter, labels always None.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown scatter strategy: {strategy}")
+    queryset = queryset.filter(**{f'{x_field}__isnull': False, f'{y_field}__isnull': False})
+    x_value, y_value = Cast(x_field, FloatField()), Cast(y_field, FloatField())
+    bounds = queryset.aggregate(n=Count('pk'), x_low=Min(x_value), x_high=Max(x_value),
+                                y_low=Min(y_value), y_high=Max(y_value), pk_low=Min('pk'), pk_high=Max('pk'))
+    total = bounds['n']
+
+    if strategy == 'grid':
+        grid_size = max(1, int(np.sqrt(max_points)))
+        cells = []
+        if total:
+            cells = list(queryset
+                         .annotate(cell_x=_db_grid_cell(x_value, bounds['x_low'], bounds['x_high'], grid_size),
+                                   cell_y=_db_grid_cell(y_value, bounds['y_low'], bounds['y_high'], grid_size))
+                         .values('cell_x', 'cell_y')
+                         .annotate(mean_x=Avg(x_value), mean_y=Avg(y_value), points=Count('pk'))
+                         .order_by('cell_x', 'cell_y')
+                         .values_list('mean_x', 'mean_y', 'points'))
+        reduction = {'strategy': strategy, 'total_points': total, 'max_points': max_points, 'grid_size': grid_size,
+                     'returned_points': len(cells), 'reduced': len(cells) < total}
+        return ([row[0] for row in cells], [row[1] for row in cells], None, [row[2] for row in cells], reduction)
+
+    limit = max_points if strategy != 'none' else getattr(settings, 'SCATTER_HARD_LIMIT', 20000)
+    rows = queryset.order_by('pk')
+    if total > limit:
+        step = math.ceil((bounds['pk_high'] - bounds['pk_low'] + 1) / limit)
+        rows = rows.annotate(sample_slot=Mod(F('pk') - Value(bounds['pk_low']), Value(step))).filter(sample_slot=0)
+    points = np.array(list(rows.values_list(x_field, y_field)[:limit]), dtype=float).reshape(-1, 2)
+    x, y, labels, counts, reduction = reduce_scatter(points[:, 0], points[:, 1], strategy=strategy,
+                                                     max_points=max_points, seed=seed)
+    reduction['total_points'] = total
+    reduction['reduced'] = reduction['returned_points'] < total
+    return x, y, labels, counts, reduction
@@ -0,0 +1,105 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.utils import timezone
+
+from .ml_utils import CHURN_REFERENCE_DATE, predict_churn_batch, registry
+from .models import CustomerFeatures, CustomerScore
+from .upserts import bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 3600
+SCORE_COLUMNS = ['id', 'customer_name', 'last_order_date', 'order_count', 'monetary', 'gap_sum_days', 'updated_at']
+
+
+def churn_features(frame):
+    """
+    CHURN_FEATURES columns from CustomerFeatures rows (the same definitions
+    ml_data_preparation uses for training), vectorized over the whole frame.
+    """
+    last_order_date = pd.to_datetime(frame['last_order_date'], utc=True)
+    frequency = frame['order_count'].to_numpy(dtype=np.float64)
+    gaps = frame['gap_sum_days'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_days = np.where(frequency > 1, gaps / (frequency - 1), 0.0)
+    return pd.DataFrame({
+        'recency': (CHURN_REFERENCE_DATE - last_order_date).dt.total_seconds().to_numpy() / SECONDS_PER_DAY,
+        'frequency': frequency,
+        'monetary': frame['monetary'].astype(float).to_numpy(),
+        'avg_days_between_orders': avg_days,
+    })
+
+
+def iter_feature_chunks(chunk_size, queryset=None):
+    """
+    CustomerFeatures (or the rows of queryset) as DataFrames of up to chunk_size rows,
+    paged by primary key.
+    """
+    if queryset is None:
+        queryset = CustomerFeatures.objects.all()
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk')
+                    .values_list(*SCORE_COLUMNS)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield pd.DataFrame(rows, columns=SCORE_COLUMNS)
+
+
+def score_customers(chunk_size=50000, batch_size=5000, snapshot=None):
+    """
+    Score every customer with the current churn model and upsert CustomerScore. Scores of
+    customers that no longer exist are removed. Returns per-stage timings and counts.
+    """
+    snapshot = snapshot or registry.reload()
+    if snapshot.model is None or snapshot.scaler is None:
+        raise RuntimeError("Churn model or scaler not available")
+
+    run_started = timezone.now()
+    stats = {'customers': 0, 'read_seconds': 0.0, 'score_seconds': 0.0, 'write_seconds': 0.0}
+    chunks = iter_feature_chunks(chunk_size)
+    while True:
+        started = time.perf_counter()
+        frame = next(chunks, None)
+        stats['read_seconds'] += time.perf_counter() - started
+        if frame is None:
+            break
+
+        started = time.perf_counter()
+        probabilities = predict_churn_batch(churn_features(frame), snapshot.model, snapshot.scaler)
+        stats['score_seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        scores = [CustomerScore(customer_name=name, churn_probability=probability,
+                                model_version=snapshot.model_version,
+                                features_updated_at=features_updated_at, scored_at=run_started)
+                  for name, probability, features_updated_at
+                  in zip(frame['customer_name'], probabilities.tolist(), frame['updated_at'])]
+        with transaction.atomic():
+            bulk_upsert(CustomerScore, scores, unique_fields=['customer_name'],
+                        update_fields=['churn_probability', 'model_version', 'features_updated_at', 'scored_at'],
+                        batch_size=batch_size)
+        stats['write_seconds'] += time.perf_counter() - started
+        stats['customers'] += len(frame)
+
+    stats['removed'] = CustomerScore.objects.filter(scored_at__lt=run_started).delete()[0]
+    logger.info(f"Scored {stats['customers']} customers with model {snapshot.model_version}.")
+    return stats
+
+
+def current_score(features, model_version):
+    """
+    The stored churn probability for a CustomerFeatures row, or None when it is missing or
+    stale (scored with another model, or the customer has ordered since).
+    """
+    score = (CustomerScore.objects.filter(customer_name=features.customer_name)
+             .values('churn_probability', 'model_version', 'features_updated_at').first())
+    if (score is None or score['model_version'] != model_version
+            or score['features_updated_at'] != features.updated_at):
+        return None
+    return score['churn_probability']
@@ -0,0 +1,116 @@
+import json
+import logging
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Customer segments are declared as data (SEGMENT_RULES_PATH, a JSON file) rather than code:
+#   {"default": {"segment": ..., "action": ...},
+#    "rules": [{"segment": ..., "all": [[column, op, value], ...], "any": [...], "action": ...}, ...]}
+# Rules are checked in order and the first match wins; a rule matches when every "all"
+# condition and (if given) at least one "any" condition holds. Conditions may use any
+# column of the segmented frame (R, F, M, RFM_Score, recency, monetary, ...).
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'segment_rules.json')
+OPERATORS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda values, options: np.isin(values, options),
+    'not in': lambda values, options: ~np.isin(values, options),
+    'between': lambda values, bounds: (values >= bounds[0]) & (values <= bounds[1]),
+}
+
+# Loaded rules and the (mtime_ns, size) of the file they came from
+_loaded = {'signature': None, 'rules': None}
+
+
+def rfm_code(r, f, m):
+    """
+    R, F and M scores (1-5) packed into one integer that reads as the old 'RFM' string (5, 4, 3 -> 543).
+    """
+    return (np.asarray(r, dtype=np.int16) * 100 + np.asarray(f, dtype=np.int16) * 10
+            + np.asarray(m, dtype=np.int16))
+
+
+class SegmentRules:
+    """
+    Validated segment rules, compiled to one boolean mask per rule and an np.select over them.
+    """
+    def __init__(self, config):
+        if not isinstance(config, dict) or not isinstance(config.get('rules'), list) or 'default' not in config:
+            raise ValueError("Segment rules need a 'default' segment and a 'rules' list")
+        self.default = config['default']['segment']
+        self.rules = []
+        for position, rule in enumerate(config['rules']):
+            if not rule.get('segment'):
+                raise ValueError(f"Segment rule {position} has no segment name")
+            conditions = {'all': rule.get('all', []), 'any': rule.get('any', [])}
+            if not conditions['all'] and not conditions['any']:
+                raise ValueError(f"Segment rule '{rule['segment']}' has no conditions")
+            for condition in conditions['all'] + conditions['any']:
+                if len(condition) != 3 or condition[1] not in OPERATORS:
+                    raise ValueError(f"Invalid condition {condition} in segment rule '{rule['segment']}' "
+                                     f"(expected [column, operator, value] with one of {', '.join(OPERATORS)})")
+            self.rules.append((rule['segment'], conditions))
+        self.actions = {rule['segment']: rule.get('action', 'No action specified.') for rule in config['rules']}
+        self.actions.setdefault(self.default, config['default'].get('action', 'No action specified.'))
+        # Segment names in rule order, the default last (the categories of the result)
+        self.segments = list(dict.fromkeys([segment for segment, _ in self.rules] + [self.default]))
+        self.columns = sorted({column for _, conditions in self.rules
+                               for column, _, _ in conditions['all'] + conditions['any']})
+
+    def _mask(self, columns, conditions, size):
+        mask = np.ones(size, dtype=bool)
+        for column, op, value in conditions['all']:
+            mask &= OPERATORS[op](columns[column], value)
+        if conditions['any']:
+            matched = np.zeros(size, dtype=bool)
+            for column, op, value in conditions['any']:
+                matched |= OPERATORS[op](columns[column], value)
+            mask &= matched
+        return mask
+
+    def assign(self, df):
+        """
+        Segment of every row of df, as a Categorical with the segments in rule order.
+        """
+        missing = [column for column in self.columns if column not in df]
+        if missing:
+            raise KeyError(f"Segment rules use columns missing from the data: {missing}")
+        # Each column is converted to a numpy array once and shared by every condition
+        columns = {column: np.asarray(df[column]) for column in self.columns}
+        masks = [self._mask(columns, conditions, len(df)) for _, conditions in self.rules]
+        codes = np.select(masks, [self.segments.index(segment) for segment, _ in self.rules],
+                          default=self.segments.index(self.default)) if masks else np.full(len(df), 0)
+        return pd.Categorical.from_codes(codes.astype(np.int8), categories=self.segments)
+
+
+def load_rules(path=None):
+    """
+    SegmentRules from a JSON file (default: SEGMENT_RULES_PATH).
+    """
+    path = str(path or getattr(settings, 'SEGMENT_RULES_PATH', DEFAULT_RULES_PATH))
+    with open(path, encoding='utf-8') as f:
+        return SegmentRules(json.load(f))
+
+
+def get_rules():
+    """
+    The configured rules, loaded once per process and reloaded when the file changes.
+    """
+    path = str(getattr(settings, 'SEGMENT_RULES_PATH', DEFAULT_RULES_PATH))
+    stat = os.stat(path)
+    signature = (path, stat.st_mtime_ns, stat.st_size)
+    if _loaded['signature'] != signature:
+        _loaded['rules'], _loaded['signature'] = load_rules(path), signature
+        logger.info(f"Loaded {len(_loaded['rules'].rules)} segment rules from {path}.")
+    return _loaded['rules']
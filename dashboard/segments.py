@@ -0,0 +1,142 @@
+import logging
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncMonth
+
+from .models import CustomerSegment, DataVersion
+
+logger = logging.getLogger(__name__)
+
+# DataVersion row holding the active CustomerSegment generation
+SEGMENT_GENERATION_NAME = 'segments'
+# Columns of the published segments, in the order ml_model_building writes them
+EXPORT_COLUMNS = ['customer_name', 'last_order_date', 'frequency', 'monetary', 'recency', 'avg_days_between_orders',
+                  'customer_email', 'R', 'F', 'M', 'RFM_Score', 'Segment', 'Churn', 'churn_probability']
+# CSV column -> CustomerSegment field
+FIELD_NAMES = {
+    'customer_name': 'customer_name',
+    'last_order_date': 'last_order_date',
+    'frequency': 'frequency',
+    'monetary': 'monetary',
+    'recency': 'recency',
+    'avg_days_between_orders': 'avg_days_between_orders',
+    'customer_email': 'customer_email',
+    'R': 'r_score',
+    'F': 'f_score',
+    'M': 'm_score',
+    'RFM_Score': 'rfm_score',
+    'Segment': 'segment',
+    'Churn': 'churn',
+    'churn_probability': 'churn_probability',
+}
+
+
+def active_generation():
+    """
+    The CustomerSegment generation readers should use, or None before the first publish.
+    """
+    return DataVersion.objects.filter(name=SEGMENT_GENERATION_NAME).values_list('version', flat=True).first()
+
+
+def active_segments():
+    """
+    CustomerSegment rows of the active generation (an empty queryset before the first publish).
+    """
+    generation = active_generation()
+    if generation is None:
+        return CustomerSegment.objects.none()
+    return CustomerSegment.objects.filter(generation=generation)
+
+
+def segment_counts(queryset):
+    """
+    {segment: customers}, largest first (ties in order of first appearance).
+    """
+    rows = queryset.values('segment').annotate(total=Count('id'), first=Min('id')).order_by('-total', 'first')
+    return {row['segment']: row['total'] for row in rows}
+
+
+def monthly_churn(queryset):
+    """
+    [(YYYY-MM of last_order_date, customers, churned customers)] in month order.
+    """
+    rows = (queryset.annotate(month=TruncMonth('last_order_date', tzinfo=dt_timezone.utc))
+            .values('month').annotate(total=Count('id'), churned=Count('id', filter=Q(churn=True)))
+            .order_by('month'))
+    return [(row['month'].strftime('%Y-%m'), row['total'], row['churned']) for row in rows]
+
+
+def _segment_rows(df, generation):
+    churn_probability = df['churn_probability'] if 'churn_probability' in df else pd.Series(np.nan, index=df.index)
+    last_order_date = pd.to_datetime(df['last_order_date'], utc=True)
+    for row in zip(df['customer_name'], df['customer_email'].fillna(''), last_order_date, df['recency'],
+                   df['frequency'], df['monetary'], df['avg_days_between_orders'].fillna(0.0),
+                   df['R'], df['F'], df['M'], df['RFM_Score'], df['Segment'], df['Churn'], churn_probability):
+        (customer_name, customer_email, order_date, recency, frequency, monetary, avg_days,
+         r, f, m, rfm_score, segment, churn, probability) = row
+        yield CustomerSegment(
+            generation=generation,
+            customer_name=customer_name,
+            customer_email=customer_email,
+            last_order_date=order_date.to_pydatetime(),
+            recency=float(recency),
+            frequency=int(frequency),
+            monetary=Decimal(str(round(float(monetary), 2))),
+            avg_days_between_orders=float(avg_days),
+            r_score=int(r),
+            f_score=int(f),
+            m_score=int(m),
+            rfm_score=int(rfm_score),
+            segment=segment,
+            churn=bool(churn),
+            churn_probability=None if pd.isna(probability) else float(probability),
+        )
+
+
+def publish_segments(df, batch_size=5000):
+    """
+    Write a retrain's segments (the rfm_features_with_segments columns, optionally with
+    churn_probability) as a new generation, then make it active in one transaction. Rows are
+    inserted before the switch, so readers see either the old or the new generation in full.
+    The previous generation is kept for requests still reading it; older ones are deleted.
+    """
+    with transaction.atomic():
+        version, _ = DataVersion.objects.select_for_update().get_or_create(name=SEGMENT_GENERATION_NAME)
+        # Past both the active generation and any left behind by an interrupted publish
+        last = CustomerSegment.objects.order_by('-generation').values_list('generation', flat=True).first() or 0
+        generation = max(version.version, last) + 1
+
+    rows = _segment_rows(df, generation)
+    total = 0
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        CustomerSegment.objects.bulk_create(batch)
+        total += len(batch)
+
+    with transaction.atomic():
+        previous = DataVersion.objects.select_for_update().get(name=SEGMENT_GENERATION_NAME).version
+        DataVersion.objects.filter(name=SEGMENT_GENERATION_NAME).update(version=generation)
+    CustomerSegment.objects.exclude(generation__in=[generation, previous]).delete()
+    logger.info(f"Published {total} customer segments as generation {generation}.")
+    return generation
+
+
+def export_rows(queryset=None, chunk_size=5000):
+    """
+    Active segments as lists in EXPORT_COLUMNS order, streamed in chunks.
+    """
+    queryset = active_segments() if queryset is None else queryset
+    fields = [FIELD_NAMES[column] for column in EXPORT_COLUMNS]
+    churn_position = EXPORT_COLUMNS.index('Churn')
+    for row in queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size):
+        row = list(row)
+        row[churn_position] = int(row[churn_position])  # 0/1 as in the CSV
+        yield row
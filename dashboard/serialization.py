@@ -0,0 +1,182 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+# Numeric lists shorter than this stay plain JSON in the compact encoding; the typed-array
+# wrapper costs more than it saves on tiny arrays
+COMPACT_MIN_LENGTH = 8
+COMPACT_VERSION = 1
+
+
+def _default(value):
+    # Types neither encoder handles natively
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (pd.Series, pd.Index)):
+        return _default(value.to_numpy())
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'M':
+            return [None if pd.isna(item) else pd.Timestamp(item).isoformat() for item in value]
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, pd.Period):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class NumpyJSONEncoder(DjangoJSONEncoder):
+    """
+    Stdlib encoder that also understands NumPy arrays/scalars and pandas columns.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime, date)) and not isinstance(o, pd.Timestamp):
+            return super().default(o)
+        try:
+            return _default(o)
+        except TypeError:
+            return super().default(o)
+
+
+def dumps(data):
+    """
+    Serialize to JSON bytes: orjson (NumPy arrays written natively) when installed,
+    otherwise the stdlib encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=NumpyJSONEncoder).encode('utf-8')
+
+
+def _numeric_array(value):
+    # ndarray for a homogeneous numeric list/array (1-D, or 2-D with equal row lengths), else None
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, list) and value:
+        first = value[0]
+        if isinstance(first, list):
+            if not all(isinstance(row, list) and len(row) == len(first) for row in value):
+                return None
+            items = (item for row in value for item in row)
+        else:
+            items = iter(value)
+        if not all(isinstance(item, (int, float, np.integer, np.floating)) and not isinstance(item, bool)
+                   for item in items):
+            return None
+        array = np.asarray(value)
+    else:
+        return None
+    if array.dtype.kind not in 'iuf' or array.ndim not in (1, 2) or array.size < COMPACT_MIN_LENGTH:
+        return None
+    return array
+
+
+def _narrowest_int(array):
+    low, high = array.min(), array.max()
+    for dtype, little_endian in (('uint8', '<u1'), ('int16', '<i2'), ('int32', '<i4')):
+        limits = np.iinfo(dtype)
+        if low >= limits.min and high <= limits.max:
+            return dtype, little_endian
+    return None
+
+
+def _typed(array):
+    """
+    Smallest exact typed encoding of a numeric array: integers (or values with at most two
+    decimals, stored as scaled integers) in the narrowest integer type, else float64.
+    """
+    encoded = {'shape': list(array.shape)}
+    packed = None
+    if array.size and np.all(np.isfinite(array)):
+        for scale in (1, 100):
+            scaled = np.round(array * scale)
+            # Exact only if dividing back reproduces every value bit for bit (the JS decoder divides too)
+            if np.array_equal(scaled / scale, array):
+                int_type = _narrowest_int(scaled)
+                if int_type:
+                    encoded['$typed'] = int_type[0]
+                    if scale != 1:
+                        encoded['scale'] = scale
+                    packed = scaled.astype(int_type[1])
+                break
+    if packed is None:
+        encoded['$typed'] = 'float64'
+        packed = array.astype('<f8')
+    encoded['data'] = base64.b64encode(packed.tobytes()).decode('ascii')
+    return encoded
+
+
+def _label_key(value):
+    if isinstance(value, (pd.Series, pd.Index, np.ndarray)):
+        value = value.tolist()
+    if isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+        return tuple(value)
+    return None
+
+
+def compact_encode(data, _seen=None, _path=''):
+    """
+    Columnar encoding of a response payload:
+    - numeric arrays become {"$typed": "uint8"|"int16"|"int32"|"float64", "shape": [...],
+      "scale": 100 (optional divisor), "data": <base64, little-endian>} when that is smaller
+    - a label array identical to one earlier in the payload becomes {"$ref": "<dotted path>"}
+    Decoded by decodeCompactPayload in static/js/compact.js.
+    """
+    seen = {} if _seen is None else _seen
+    if isinstance(data, dict):
+        return {key: compact_encode(value, seen, f"{_path}.{key}" if _path else str(key))
+                for key, value in data.items()}
+
+    array = _numeric_array(data)
+    if array is not None:
+        encoded = _typed(array)
+        # Typed arrays only pay off for short integers and cents; keep whichever is smaller
+        if len(dumps(encoded)) < len(dumps(array)):
+            return encoded
+        return data
+
+    label_key = _label_key(data)
+    if label_key is not None:
+        if label_key in seen:
+            return {'$ref': seen[label_key]}
+        seen[label_key] = _path
+        return list(label_key)
+
+    if isinstance(data, list):
+        return [compact_encode(item, seen, f"{_path}.{index}") for index, item in enumerate(data)]
+    return data
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse counterpart that serializes with dumps() (NumPy/pandas aware).
+    """
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def json_response(data, request=None, **kwargs):
+    """
+    Success response for the analytics endpoints; `?encoding=compact` selects the
+    columnar encoding.
+    """
+    if request is not None and request.GET.get('encoding') == 'compact':
+        data = {'encoding': 'compact', 'version': COMPACT_VERSION, 'data': compact_encode(data)}
+    return FastJsonResponse(data, **kwargs)
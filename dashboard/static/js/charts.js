@@ -49,6 +49,21 @@ function updateDateRangeNote(startDate, endDate, dateRangeOption) {
     }
 }
 
+// Point radius for a density-binned scatter point standing for `count` points
+function scatterRadius(counts, i) {
+    if (!counts) return 3;
+    return Math.min(12, 2 + Math.log2(counts[i]));
+}
+
+// Label suffix describing how a scatter was reduced server-side
+function scatterReductionNote(reduction) {
+    if (!reduction || !reduction.reduced) return '';
+    if (reduction.strategy === 'grid') {
+        return ` (${reduction.total_points} points binned into ${reduction.returned_points} cells)`;
+    }
+    return ` (${reduction.returned_points} of ${reduction.total_points} points, ${reduction.strategy})`;
+}
+
 // Fetch chart data and populate charts
 function fetchChartData(selectedMonth = '') {
     console.log("Fetching chart data with parameters:", { selectedMonth });
@@ -84,6 +99,14 @@ function fetchChartData(selectedMonth = '') {
     if (startDate) params.append('start_date', startDate);
     if (endDate) params.append('end_date', endDate);
     params.append('date_range_option', dateRangeOption);
+    // Typed-array encoding keeps the (potentially large) chart payload small
+    params.append('encoding', 'compact');
+
+    // Scatter reduction (server defaults apply when the controls are absent)
+    const scatterStrategy = document.getElementById('scatterStrategy');
+    if (scatterStrategy && scatterStrategy.value) params.append('scatter_strategy', scatterStrategy.value);
+    const scatterMaxPoints = document.getElementById('scatterMaxPoints');
+    if (scatterMaxPoints && scatterMaxPoints.value) params.append('scatter_max_points', scatterMaxPoints.value);
 
     // Construct the final URL
     const url = params.toString() ? `${baseUrl}?${params.toString()}` : baseUrl;
@@ -96,7 +119,7 @@ function fetchChartData(selectedMonth = '') {
             }
             return response.text().then(text => {
                 try {
-                    return JSON.parse(text);
+                    return decodeCompactPayload(JSON.parse(text));
                 } catch (e) {
                     console.error("Failed to parse JSON response:", text);
                     throw new Error("Invalid JSON response from server.");
@@ -198,6 +221,8 @@ function fetchChartData(selectedMonth = '') {
             if (totalVsQuantityCanvas) {
                 const orderTotals = data.order_totals;
                 const quantities = data.quantities;
+                const orderCounts = data.order_scatter_counts;
+                const orderReduction = data.scatter_reduction ? data.scatter_reduction.order_total_vs_quantity : null;
                 console.log("Scatter Plot Data:", { totals: orderTotals, quantities: quantities });
                 destroyChart('totalVsQuantityChart');
                 if (orderTotals.length > 0 && quantities.length > 0) {
@@ -205,8 +230,9 @@ function fetchChartData(selectedMonth = '') {
                         type: 'scatter',
                         data: {
                             datasets: [{
-                                label: 'Order Total vs Quantity',
+                                label: 'Order Total vs Quantity' + scatterReductionNote(orderReduction),
                                 data: orderTotals.map((total, i) => ({ x: quantities[i], y: total })),
+                                pointRadius: orderTotals.map((total, i) => scatterRadius(orderCounts, i)),
                                 backgroundColor: 'green'
                             }]
                         },
@@ -355,6 +381,8 @@ function fetchChartData(selectedMonth = '') {
                 const recencyScatter = data.recency_scatter;
                 const monetaryScatter = data.monetary_scatter;
                 const churnScatter = data.churn_scatter;
+                const rfmCounts = data.rfm_scatter_counts;
+                const rfmReduction = data.scatter_reduction ? data.scatter_reduction.recency_vs_monetary : null;
                 console.log("Recency vs Monetary Data:", { recency: recencyScatter, monetary: monetaryScatter, churn: churnScatter });
                 destroyChart('recencyVsMonetaryChart');
                 if (recencyScatter.length > 0 && monetaryScatter.length > 0) {
@@ -362,7 +390,8 @@ function fetchChartData(selectedMonth = '') {
                         type: 'scatter',
                         data: {
                             datasets: [{
-                                label: 'Recency vs Monetary',
+                                label: 'Recency vs Monetary' + scatterReductionNote(rfmReduction),
+                                pointRadius: recencyScatter.map((recency, i) => scatterRadius(rfmCounts, i)),
                                 data: recencyScatter.map((recency, i) => ({
                                     x: recency,
                                     y: monetaryScatter[i],
@@ -154,23 +154,16 @@ function renderPagination(totalPages, currentPage) {
     pagination.appendChild(nextButton);
 }
 
-// Function to export cohort data as CSV
-function exportCohortData(exportData) {
-    const csvRows = [];
-    csvRows.push('Cohort,Customer Email');
-
-    for (const cohort in exportData) {
-        exportData[cohort].forEach(email => {
-            csvRows.push(`"${cohort}","${email}"`);
-        });
+// Function to export cohort members as CSV (streamed by the server, one row per customer)
+function exportCohortData(exportInfo) {
+    if (!exportInfo || !exportInfo.url) {
+        console.error("No cohort export link in the response.");
+        return;
     }
-
-    const csvContent = csvRows.join('\n');
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-    const url = URL.createObjectURL(blob);
+    console.log(`Exporting ${exportInfo.customers} cohort members`);
     const link = document.createElement('a');
-    link.setAttribute('href', url);
-    link.setAttribute('download', 'cohort_data.csv');
+    link.setAttribute('href', exportInfo.url);
+    link.setAttribute('download', 'cohort_members.csv');
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
@@ -209,7 +202,7 @@ function fetchCohortData(page = 1) {
             renderPagination(data.total_pages, data.current_page);
 
             const exportButton = document.getElementById('exportCohortData');
-            exportButton.onclick = () => exportCohortData(data.export_data);
+            exportButton.onclick = () => exportCohortData(data.export);
         })
         .catch(error => {
             console.error('Error fetching cohort data:', error);
@@ -0,0 +1,65 @@
+// Decoder for `?encoding=compact` responses (see dashboard/serialization.py)
+
+// Base64 little-endian typed array -> plain array (nested for 2-D shapes)
+function decodeTypedArray(encoded) {
+    const binary = atob(encoded.data);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    const arrayTypes = { uint8: Uint8Array, int16: Int16Array, int32: Int32Array, float64: Float64Array };
+    let values = new arrayTypes[encoded.$typed](bytes.buffer);
+    if (encoded.scale) {
+        values = Float64Array.from(values, value => value / encoded.scale);
+    }
+    if (encoded.shape.length === 2) {
+        const [rows, columns] = encoded.shape;
+        const matrix = [];
+        for (let r = 0; r < rows; r++) {
+            matrix.push(Array.from(values.subarray(r * columns, (r + 1) * columns)));
+        }
+        return matrix;
+    }
+    return Array.from(values);
+}
+
+// Resolve a dotted path ("a.b.0") against the decoded payload
+function resolvePath(root, path) {
+    return path.split('.').reduce((node, key) => (node == null ? node : node[key]), root);
+}
+
+// Decode a compact payload back into the plain JSON structure; plain payloads pass through
+function decodeCompactPayload(payload) {
+    if (!payload || payload.encoding !== 'compact') return payload;
+    const refs = [];
+
+    function decode(node, parent, key) {
+        if (Array.isArray(node)) {
+            const result = [];
+            node.forEach((item, i) => {
+                result[i] = decode(item, result, i);
+            });
+            return result;
+        }
+        if (node && typeof node === 'object') {
+            if ('$typed' in node) return decodeTypedArray(node);
+            if ('$ref' in node) {
+                refs.push({ parent, key, path: node.$ref });
+                return null;
+            }
+            const result = {};
+            Object.keys(node).forEach(k => {
+                result[k] = decode(node[k], result, k);
+            });
+            return result;
+        }
+        return node;
+    }
+
+    const data = decode(payload.data, null, null);
+    // Resolved once the whole tree is decoded
+    refs.forEach(ref => {
+        ref.parent[ref.key] = resolvePath(data, ref.path);
+    });
+    return data;
+}
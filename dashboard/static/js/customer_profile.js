@@ -99,18 +99,8 @@ function fetchCustomerProfileData(customerName = null) {
             console.log("Customer profile data received:", data);
 
             if (data.customers) {
-                // Populate the customer dropdown
-                const customerSelect = document.getElementById('customerSelect');
-                if (customerSelect) {
-                    customerSelect.innerHTML = '<option value="">-- Select a Customer --</option>';
-                    data.customers.forEach(customer => {
-                        const option = document.createElement('option');
-                        option.value = customer;
-                        option.textContent = customer;
-                        customerSelect.appendChild(option);
-                    });
-                    console.log("Customer dropdown populated with:", data.customers);
-                }
+                // Initial request without a customer; the typeahead fetches its own matches
+                return;
             } else {
                 // Display the customer profile
                 const customerProfile = document.getElementById('customerProfile');
@@ -141,6 +131,13 @@ function fetchCustomerProfileData(customerName = null) {
                 document.getElementById('ltvBadge').style.display = data.is_top_10_ltv ? 'block' : 'none';
                 document.getElementById('lifetimeBadge').style.display = data.is_top_10_lifetime ? 'block' : 'none';
 
+                // Exact percentile and rank among all customers
+                const percentileText = (percentile, rank) => typeof percentile === 'number'
+                    ? `${percentile.toFixed(1)}th percentile (rank ${rank.toLocaleString()} of ${(data.ranked_customers || 0).toLocaleString()})`
+                    : '';
+                document.getElementById('ltvPercentile').textContent = percentileText(data.ltv_percentile, data.ltv_rank);
+                document.getElementById('lifetimePercentile').textContent = percentileText(data.lifetime_percentile, data.lifetime_rank);
+
                 // Overdue Badge (compare with current date: April 1, 2025)
                 const estNextOrderDate = data.est_next_order_date ? new Date(data.est_next_order_date) : null;
                 const currentDate = new Date('2025-04-01');
@@ -194,21 +191,99 @@ function fetchCustomerProfileData(customerName = null) {
         });
 }
 
-// Initial fetch to populate the customer dropdown
+// Customer typeahead backed by /customer-search/ (prefix matches on name or email,
+// falling back to substring matches), paged with the returned cursor
+let searchTimer = null;
+let searchRequest = 0;
+
+function renderSearchResults(results, nextCursor, query, mode, append) {
+    const list = document.getElementById('customerResults');
+    if (!list) return;
+    if (!append) list.innerHTML = '';
+    const more = list.querySelector('li.more');
+    if (more) more.remove();
+
+    results.forEach(customer => {
+        const item = document.createElement('li');
+        item.textContent = customer.name;
+        const email = document.createElement('small');
+        email.textContent = customer.email;
+        item.appendChild(email);
+        item.onclick = () => {
+            document.getElementById('customerSearch').value = customer.name;
+            list.style.display = 'none';
+            fetchCustomerProfileData(customer.name);
+        };
+        list.appendChild(item);
+    });
+    if (nextCursor) {
+        const item = document.createElement('li');
+        item.className = 'more';
+        item.textContent = 'Show more...';
+        item.onclick = () => searchCustomers(query, mode, nextCursor);
+        list.appendChild(item);
+    }
+    if (!list.children.length) {
+        const item = document.createElement('li');
+        item.textContent = 'No matching customers';
+        list.appendChild(item);
+    }
+    list.style.display = 'block';
+}
+
+function searchCustomers(query, mode = 'prefix', cursor = null, append = Boolean(cursor)) {
+    const requestId = ++searchRequest;
+    const params = new URLSearchParams({ q: query, mode: mode, limit: 20 });
+    if (cursor) params.set('cursor', cursor);
+
+    fetch(`/customer-search/?${params.toString()}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (requestId !== searchRequest) return; // A newer keystroke superseded this request
+            if (data.error) throw new Error(data.error);
+            // Nothing starts with the text: look for it anywhere in names and emails
+            if (!cursor && mode === 'prefix' && !data.results.length && query.trim().length >= 2) {
+                searchCustomers(query, 'substring');
+                return;
+            }
+            // Substring pages scan a bounded slice of the index; keep going until something matches
+            if (!data.results.length && data.next_cursor) {
+                searchCustomers(query, mode, data.next_cursor, append);
+                return;
+            }
+            renderSearchResults(data.results, data.next_cursor, query, mode, append);
+        })
+        .catch(error => console.error("Error searching customers:", error));
+}
+
+// Initial fetch (checks the endpoint and models are available)
 window.addEventListener('load', () => {
     setTimeout(() => {
         fetchCustomerProfileData();
         window.scrollTo(0, 0);
 
-        // Add event listener for the customer dropdown
-        const customerSelect = document.getElementById('customerSelect');
-        if (customerSelect) {
-            customerSelect.addEventListener('change', () => {
-                const selectedCustomer = customerSelect.value;
-                if (selectedCustomer) {
-                    fetchCustomerProfileData(selectedCustomer);
-                } else {
+        // Typeahead: search 150 ms after the last keystroke
+        const customerSearch = document.getElementById('customerSearch');
+        if (customerSearch) {
+            customerSearch.addEventListener('input', () => {
+                clearTimeout(searchTimer);
+                const query = customerSearch.value;
+                if (!query.trim()) {
+                    document.getElementById('customerResults').style.display = 'none';
                     document.getElementById('customerProfile').style.display = 'none';
+                    return;
+                }
+                searchTimer = setTimeout(() => searchCustomers(query), 150);
+            });
+            customerSearch.addEventListener('focus', () => searchCustomers(customerSearch.value));
+            document.addEventListener('click', event => {
+                if (!event.target.closest('.typeahead')) {
+                    document.getElementById('customerResults').style.display = 'none';
                 }
             });
         }
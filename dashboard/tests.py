@@ -1,3 +1,1059 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.linear_model import SGDClassifier
+
+from . import (benchmarking, churn_training, cohort_stats, customer_search, feature_store, order_import, order_rollups,
+               percentiles, retrain_queue, scoring, views)
+from .caching import analytics_endpoint, bump_data_version, cached_json_response, get_cache, get_data_version
+from .cohorts import MONTH_DIFF_MODES, build_cohorts, build_cohorts_from_cells
+from .frames import read_frame, write_frame
+from .histograms import array_histogram, db_correlation, db_days_since_histogram, db_histogram
+from .management.commands.benchmark_features import legacy_create_features, max_difference
+from .ml_data_preparation import (clean_and_standardize_data, create_features, extract_data, extract_partials,
+                                  features_from_partials, merge_partials, order_partials)
+from .ml_utils import registry
+from .models import (CohortMonthlyStats, CustomerCohort, CustomerFeatures, CustomerScore, CustomerSegment, Order,
+                     OrderDailyRollup, RetrainJob)
+from .parallel import run_sharded, shard_ids
+from .scatter import db_reduce_scatter, grid_bins, stratified_sample
+from .segmentation import SegmentRules, load_rules
+from .segments import active_generation, publish_segments
+from .serialization import json_response
+from .timeseries import aggregate_series, calendar_buckets, densify, floor_to_bucket
+
+
+def order_row(order_number, **overrides):
+    row = {
+        'order_number': order_number,
+        'order_date': '2024-03-05 10:00:00',
+        'order_status': 'completed',
+        'order_total': '100.00',
+        'customer_name': 'Ada Lovelace',
+        'customer_email': 'ada@example.com',
+        'payment_method': 'card',
+        'product_name': 'Widget',
+        'product_sku': 'W-1',
+        'product_unit_price': '100.00',
+        'product_quantity': '1',
+        'product_row_total': '100.00',
+    }
+    row.update(overrides)
+    return row
+
+
+class UpsertOrdersTests(TestCase):
+    def test_inserts_then_updates_on_order_number(self):
+        order_import.upsert_orders([order_import.parse_row(order_row('A-1')),
+                                    order_import.parse_row(order_row('A-2'))])
+        order_import.upsert_orders([order_import.parse_row(order_row('A-1', order_total='250.00'))])
+
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(Order.objects.get(order_number='A-1').order_total, Decimal('250.00'))
+
+    def test_last_duplicate_in_batch_wins(self):
+        count = order_import.upsert_orders([order_import.parse_row(order_row('A-1', order_total='1.00')),
+                                            order_import.parse_row(order_row('A-1', order_total='2.00'))])
+
+        self.assertEqual(count, 1)
+        self.assertEqual(Order.objects.get(order_number='A-1').order_total, Decimal('2.00'))
+
+    def test_no_conflict_target_without_backend_support(self):
+        # MySQL's ON DUPLICATE KEY UPDATE takes no target; passing unique_fields raises NotSupportedError
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(Order.objects, 'bulk_create') as bulk_create:
+            order_import.upsert_orders([order_import.parse_row(order_row('A-1'))])
+
+        self.assertIsNone(bulk_create.call_args.kwargs['unique_fields'])
+        self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+
+    def test_import_rebuilds_the_days_updated_orders_leave(self):
+        save_order('A-1', order_date='2024-01-10 08:00:00')
+        save_order('A-2', order_date='2024-06-01 08:00:00')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps(order_row('A-1', order_date='2024-03-05 10:00:00')) + '\n')
+            with mock.patch('dashboard.percentiles.build_percentile_index'):
+                call_command('import_orders', path, stdout=StringIO())
+
+        self.assertFalse(OrderDailyRollup.objects.filter(day=date(2024, 1, 10)).exists())
+        self.assertEqual(sorted(OrderDailyRollup.objects.values_list('day', 'order_count')),
+                         [(date(2024, 3, 5), 1), (date(2024, 6, 1), 1)])
+
+
+def save_order(order_number, **overrides):
+    # Saved through the ORM, so the post_save signals fold it into the derived tables
+    order = order_import.parse_row(order_row(order_number, **overrides))
+    order.save()
+    return order
+
+
+class FeatureStoreTests(TestCase):
+    def features(self):
+        return sorted((row[0], row[1], row[2], row[3], row[4], row[5], round(row[6], 6)) for row in
+                      CustomerFeatures.objects.values_list('customer_name', 'customer_email', 'first_order_date',
+                                                           'last_order_date', 'order_count', 'monetary', 'gap_sum_days'))
+
+    def assert_matches_rebuild(self):
+        incremental = self.features()
+        feature_store.rebuild_customer_features()
+        self.assertEqual(incremental, self.features())
+
+    def setUp(self):
+        save_order('F-1', order_date='2024-03-05 10:00:00', order_total='100.00')
+        save_order('F-2', order_date='2024-05-01 10:00:00', order_total='50.00', customer_email='ada@new.example.com')
+        # Out of order: before the first order, then between the two
+        save_order('F-3', order_date='2024-01-10 08:00:00', order_total='20.00', customer_email='ada@old.example.com')
+        save_order('F-4', order_date='2024-04-01 08:00:00', order_total='5.00')
+        save_order('F-5', customer_name='Bob', customer_email='bob@example.com', order_total='70.00')
+
+    def test_inserts_match_rebuild(self):
+        features = CustomerFeatures.objects.get(customer_name='Ada Lovelace')
+        self.assertEqual((features.order_count, features.monetary, features.customer_email),
+                         (4, Decimal('175.00'), 'ada@new.example.com'))
+        self.assert_matches_rebuild()
+
+    def test_updates_match_rebuild(self):
+        order = Order.objects.get(order_number='F-2')
+        order.order_total = Decimal('500.00')
+        order.order_date = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+        order.save()
+        self.assertEqual(CustomerFeatures.objects.get(customer_name='Ada Lovelace').monetary, Decimal('625.00'))
+        self.assert_matches_rebuild()
+
+        # Moving an order to another customer updates both rows
+        order.customer_name = 'Bob'
+        order.save()
+        self.assertEqual(CustomerFeatures.objects.get(customer_name='Bob').order_count, 2)
+        self.assert_matches_rebuild()
+
+    def test_deletes_match_rebuild(self):
+        Order.objects.get(order_number='F-3').delete()
+        self.assertEqual(CustomerFeatures.objects.get(customer_name='Ada Lovelace').first_order_date,
+                         datetime(2024, 3, 5, 10, tzinfo=dt_timezone.utc))
+        self.assert_matches_rebuild()
+
+        Order.objects.get(order_number='F-5').delete()
+        self.assertFalse(CustomerFeatures.objects.filter(customer_name='Bob').exists())
+        self.assert_matches_rebuild()
+
+
+class OrderRollupTests(TestCase):
+    def rollups(self):
+        return sorted(OrderDailyRollup.objects.values_list('day', 'order_status', 'payment_method', 'product_name',
+                                                           'order_count', 'product_quantity', 'order_total',
+                                                           'product_row_total'))
+
+    def assert_matches_rebuild(self):
+        incremental = self.rollups()
+        order_rollups.rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def setUp(self):
+        save_order('R-1', order_date='2024-03-05 10:00:00', order_total='100.00')
+        save_order('R-2', order_date='2024-03-05 12:00:00', order_total='40.00', product_quantity='3')
+        save_order('R-3', order_date='2024-01-10 08:00:00', order_total='20.00', order_status='pending')
+
+    def test_inserts_match_rebuild(self):
+        self.assertEqual(OrderDailyRollup.objects.get(day=date(2024, 3, 5)).order_count, 2)
+        self.assert_matches_rebuild()
+
+    def test_updates_match_rebuild(self):
+        order = Order.objects.get(order_number='R-2')
+        order.order_total = Decimal('45.00')
+        order.save()
+        self.assertEqual(OrderDailyRollup.objects.get(day=date(2024, 3, 5)).order_total, Decimal('145.00'))
+        self.assert_matches_rebuild()
+
+        # Moving an order to another day and status leaves R-1 alone in its old row
+        order.order_date = datetime(2024, 1, 10, 9, tzinfo=dt_timezone.utc)
+        order.order_status = 'pending'
+        order.save()
+        self.assertEqual(OrderDailyRollup.objects.get(day=date(2024, 1, 10)).order_count, 2)
+        self.assert_matches_rebuild()
+
+    def test_deletes_match_rebuild(self):
+        Order.objects.get(order_number='R-3').delete()
+        self.assertFalse(OrderDailyRollup.objects.filter(day=date(2024, 1, 10)).exists())
+        self.assert_matches_rebuild()
+
+        Order.objects.get(order_number='R-1').delete()
+        self.assertEqual(OrderDailyRollup.objects.get(day=date(2024, 3, 5)).order_total, Decimal('40.00'))
+        self.assert_matches_rebuild()
+
+
+class ScoreCustomersTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            CustomerFeatures.objects.create(
+                customer_name=f'Customer {index}', customer_email=f'customer{index}@example.com',
+                first_order_date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+                last_order_date=datetime(2024, 6, 1, tzinfo=dt_timezone.utc),
+                order_count=index + 1, monetary=Decimal('50.00') * (index + 1), gap_sum_days=30.0 * index)
+
+    def test_rescoring_updates_existing_scores(self):
+        snapshot = registry.reload()
+        if snapshot.model is None or snapshot.scaler is None:
+            self.skipTest('Churn model artifacts not available')
+        scoring.score_customers(snapshot=snapshot)
+        CustomerScore.objects.update(churn_probability=-1.0)
+        stats = scoring.score_customers(snapshot=snapshot)
+
+        self.assertEqual(stats['customers'], 3)
+        self.assertEqual(CustomerScore.objects.count(), 3)
+        self.assertFalse(CustomerScore.objects.filter(churn_probability=-1.0).exists())
+
+    def test_scoring_failure_does_not_fail_the_retrain(self):
+        with mock.patch('dashboard.ml_data_preparation.main'), mock.patch('dashboard.ml_model_building.main'), \
+                mock.patch('dashboard.percentiles.build_percentile_index') as build_percentile_index, \
+                mock.patch('dashboard.scoring.score_customers', side_effect=RuntimeError('no model')), \
+                self.assertLogs('dashboard.management.commands.update_rfm_and_churn', level='ERROR'):
+            call_command('update_rfm_and_churn', stdout=StringIO())
+
+        build_percentile_index.assert_called_once()
+
+
+
+class DatabaseHistogramTests(TestCase):
+    def setUp(self):
+        totals = ['10.00', '12.50', '99.99', '40.00', '7.25', '300.00', '55.10', '12.50', '81.30']
+        order_import.upsert_orders([
+            order_import.parse_row(order_row(f'H-{index}', order_total=total, customer_email=f'c{index % 5}@example.com',
+                                             order_date=f'2024-0{1 + index % 7}-1{index} 0{index}:30:00'))
+            for index, total in enumerate(totals)])
+        self.per_customer = (Order.objects.values('customer_email')
+                             .annotate(last_order_date=Max('order_date'), frequency=Count('order_id'),
+                                       monetary=Sum('order_total')))
+        self.frame = pd.DataFrame(list(self.per_customer))
+
+    def test_column_matches_numpy(self):
+        totals = [float(total) for total in Order.objects.values_list('order_total', flat=True)]
+        self.assertEqual(db_histogram(Order.objects.all(), 'order_total', bins=4), array_histogram(totals, bins=4))
+
+    def test_aggregate_annotations_match_numpy(self):
+        for field in ('frequency', 'monetary'):
+            with self.subTest(field=field):
+                self.assertEqual(db_histogram(self.per_customer, field, bins=3),
+                                 array_histogram(self.frame[field].astype(float), bins=3))
+
+    def test_days_since_matches_numpy(self):
+        last_order_date = pd.to_datetime(self.frame['last_order_date'], utc=True)
+        reference = last_order_date.max() + pd.Timedelta(days=1)
+        self.assertEqual(db_days_since_histogram(self.per_customer, 'last_order_date', reference.to_pydatetime(), bins=4),
+                         array_histogram((reference - last_order_date).dt.days, bins=4))
+
+    def test_empty(self):
+        self.assertEqual(db_histogram(Order.objects.none(), 'order_total'), ([], []))
+
+
+class DatabaseScatterTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        quantities = rng.integers(1, 20, size=300)
+        # A large common offset: raw sums of squares would cancel catastrophically
+        totals = np.round(9_000_000 + quantities * 3.5 + rng.normal(0, 4, size=300), 2)
+        order_import.upsert_orders([
+            order_import.parse_row(order_row(f'S-{index}', product_quantity=str(quantity), order_total=f'{total:.2f}'))
+            for index, (quantity, total) in enumerate(zip(quantities, totals))])
+        self.totals = np.array([float(total) for total in Order.objects.order_by('pk').values_list('order_total', flat=True)])
+        self.quantities = np.array(list(Order.objects.order_by('pk').values_list('product_quantity', flat=True)), dtype=float)
+
+    def test_correlation_matches_numpy(self):
+        self.assertAlmostEqual(db_correlation(Order.objects.all(), 'order_total', 'product_quantity'),
+                               np.corrcoef(self.totals, self.quantities)[0, 1], places=9)
+        self.assertIsNone(db_correlation(Order.objects.none(), 'order_total', 'product_quantity'))
+        self.assertIsNone(db_correlation(Order.objects.filter(order_number='S-1'), 'order_total', 'product_quantity'))
+
+    def test_grid_matches_in_memory_binning(self):
+        x, y, labels, counts, reduction = db_reduce_scatter(Order.objects.all(), 'product_quantity', 'order_total',
+                                                            strategy='grid', max_points=100)
+        expected_x, expected_y, _, expected_counts, grid_size = grid_bins(self.quantities, self.totals, max_points=100)
+        self.assertIsNone(labels)
+        self.assertEqual(counts, expected_counts.tolist())
+        np.testing.assert_allclose(x, expected_x)
+        np.testing.assert_allclose(y, expected_y)
+        self.assertEqual((reduction['grid_size'], reduction['total_points']), (grid_size, 300))
+
+    def test_sampled_strategies_fetch_at_most_the_budget(self):
+        for strategy in ('sample', 'cap'):
+            with self.subTest(strategy=strategy):
+                x, y, _, counts, reduction = db_reduce_scatter(Order.objects.all(), 'product_quantity', 'order_total',
+                                                               strategy=strategy, max_points=40)
+                self.assertIsNone(counts)
+                self.assertLessEqual(len(x), 40)
+                self.assertGreater(len(x), 20)
+                self.assertEqual(reduction['total_points'], 300)
+                self.assertTrue(reduction['reduced'])
+                # Every point is a real order
+                self.assertTrue(set(zip(x, y)) <= set(zip(self.quantities, self.totals)))
+
+    def test_small_querysets_are_returned_whole(self):
+        x, _, _, _, reduction = db_reduce_scatter(Order.objects.all(), 'product_quantity', 'order_total',
+                                                  strategy='none', max_points=10)
+        self.assertEqual(len(x), 300)
+        self.assertFalse(reduction['reduced'])
+
+
+class RetrainQueueTests(TestCase):
+    def test_debounces_while_triggers_arrive(self):
+        retrain_queue.enqueue_retrain('order')
+        self.assertEqual(retrain_queue.claim_pending_jobs(debounce_seconds=300, max_wait_seconds=3600), [])
+        self.assertEqual(len(retrain_queue.claim_pending_jobs(debounce_seconds=0, max_wait_seconds=3600)), 1)
+
+    def test_steady_triggers_claimed_after_max_wait(self):
+        retrain_queue.enqueue_retrain('order')
+        RetrainJob.objects.update(first_triggered_at=timezone.now() - timedelta(hours=2))
+        retrain_queue.enqueue_retrain('another order')
+
+        job_ids = retrain_queue.claim_pending_jobs(debounce_seconds=300, max_wait_seconds=3600)
+
+        self.assertEqual(len(job_ids), 1)
+        self.assertEqual(RetrainJob.objects.get(pk=job_ids[0]).status, RetrainJob.RUNNING)
+
+    def test_stale_running_jobs_are_requeued(self):
+        retrain_queue.enqueue_retrain('order')
+        job_ids = retrain_queue.claim_pending_jobs(debounce_seconds=0)
+        RetrainJob.objects.update(started_at=timezone.now() - timedelta(hours=4))
+
+        with self.assertLogs('dashboard.retrain_queue', level='WARNING'):
+            self.assertEqual(retrain_queue.requeue_stale_jobs(stale_seconds=3 * 3600), 1)
+        self.assertEqual(retrain_queue.claim_pending_jobs(debounce_seconds=0), job_ids)
+
+    def test_waits_for_the_running_retrain(self):
+        retrain_queue.enqueue_retrain('order')
+        retrain_queue.claim_pending_jobs(debounce_seconds=0)
+        retrain_queue.enqueue_retrain('order during the retrain')
+
+        self.assertEqual(retrain_queue.claim_pending_jobs(debounce_seconds=0), [])
+        RetrainJob.objects.filter(status=RetrainJob.RUNNING).update(status=RetrainJob.DONE)
+        self.assertEqual(len(retrain_queue.claim_pending_jobs(debounce_seconds=0)), 1)
+
+    def test_stale_running_retrain_does_not_block(self):
+        retrain_queue.enqueue_retrain('order')
+        retrain_queue.claim_pending_jobs(debounce_seconds=0)
+        RetrainJob.objects.update(started_at=timezone.now() - timedelta(hours=4))
+        retrain_queue.enqueue_retrain('order after the worker died')
+
+        self.assertEqual(len(retrain_queue.claim_pending_jobs(debounce_seconds=0)), 1)
+
+    def test_recent_running_jobs_are_left_alone(self):
+        retrain_queue.enqueue_retrain('order')
+        retrain_queue.claim_pending_jobs(debounce_seconds=0)
+        self.assertEqual(retrain_queue.requeue_stale_jobs(stale_seconds=3 * 3600), 0)
+
+
+class CohortCellTests(TestCase):
+    # (customer, order date): ada orders in Feb and Mar, which share the 30-day offset 1 of the Jan cohort
+    ORDERS = [('ada', '2023-01-15'), ('ada', '2023-02-10'), ('ada', '2023-03-03'), ('ada', '2023-03-20'),
+              ('bob', '2023-01-31'), ('bob', '2023-03-01'), ('cy', '2023-02-28'), ('cy', '2023-03-01'),
+              ('cy', '2023-05-05'), ('dee', '2022-12-31'), ('dee', '2023-02-02')]
+
+    def setUp(self):
+        # Saved one by one, so the post_save signal folds each order into the matrix
+        for index, (customer, order_date) in enumerate(self.ORDERS):
+            order_import.parse_row(order_row(f'C-{index}', customer_email=f'{customer}@example.com',
+                                             order_date=f'{order_date} 12:00:00')).save()
+
+    def cells(self):
+        return sorted(CohortMonthlyStats.objects.values_list(
+            'cohort_month', 'months_since', 'customers', 'orders', 'revenue', 'approx_customers'))
+
+    def customers(self):
+        return sorted(CustomerCohort.objects.values_list('customer_email', 'cohort_month', 'months'))
+
+    def assert_matches_rebuild(self):
+        incremental = self.cells(), self.customers()
+        cohort_stats.rebuild_cohort_stats()
+        self.assertEqual(incremental, (self.cells(), self.customers()))
+
+    def test_incremental_cells_match_rebuild(self):
+        self.assert_matches_rebuild()
+
+    def test_inserts_read_no_order_history(self):
+        with mock.patch.object(Order.objects, 'filter', side_effect=AssertionError('order history read')):
+            cohort_stats.apply_order(order_import.parse_row(order_row('C-new', customer_email='ada@example.com',
+                                                                      order_date='2023-04-01 12:00:00')))
+            # Backdated first order: ada moves to the Dec 2022 cohort
+            cohort_stats.apply_order(order_import.parse_row(order_row('C-old', customer_email='ada@example.com',
+                                                                      order_date='2022-12-01 12:00:00')))
+        self.assertEqual(CustomerCohort.objects.get(customer_email='ada@example.com').cohort_month, date(2022, 12, 1))
+
+    def test_backdated_first_order_matches_rebuild(self):
+        save_order('C-old', customer_email='bob@example.com', order_date='2022-11-30 12:00:00')
+        # bob's Jan and Mar activity moves to the Nov 2022 cohort, leaving ada alone in Jan 2023
+        self.assertEqual(CohortMonthlyStats.objects.get(cohort_month=date(2023, 1, 1), months_since=0).customers, 1)
+        self.assertEqual(CohortMonthlyStats.objects.get(cohort_month=date(2022, 11, 1), months_since=2).customers, 1)
+        self.assert_matches_rebuild()
+
+    def test_updates_match_rebuild(self):
+        # cy's first order moves to another month, then to another customer
+        order = Order.objects.get(order_number='C-6')
+        order.order_date = datetime(2023, 4, 2, 12, tzinfo=dt_timezone.utc)
+        order.order_total = Decimal('12.50')
+        order.save()
+        self.assertEqual(CustomerCohort.objects.get(customer_email='cy@example.com').cohort_month, date(2023, 3, 1))
+        self.assert_matches_rebuild()
+
+        order.customer_email = 'dee@example.com'
+        order.save()
+        self.assert_matches_rebuild()
+
+    def test_deletes_match_rebuild(self):
+        # dee's first order: dee moves from the Dec 2022 cohort to Feb 2023
+        Order.objects.get(order_number='C-9').delete()
+        self.assertFalse(CohortMonthlyStats.objects.filter(cohort_month=date(2022, 12, 1)).exists())
+        self.assert_matches_rebuild()
+
+        Order.objects.get(order_number='C-10').delete()
+        self.assertFalse(CustomerCohort.objects.filter(customer_email='dee@example.com').exists())
+        self.assert_matches_rebuild()
+
+    def test_cells_match_raw_orders(self):
+        orders = pd.DataFrame(list(Order.objects.values('customer_email', 'order_date', 'order_total')))
+        for month_diff in MONTH_DIFF_MODES:
+            with self.subTest(month_diff=month_diff):
+                raw = build_cohorts(orders['customer_email'], orders['order_date'], orders['order_total'].astype(float),
+                                    max_months=6, month_diff=month_diff)
+                cells = build_cohorts_from_cells(*cohort_stats.load_cohort_cells(), max_months=6, month_diff=month_diff)
+                np.testing.assert_array_equal(cells['retention_matrix'], raw['retention_matrix'])
+                np.testing.assert_array_equal(cells['overall_retention'], raw['overall_retention'])
+                np.testing.assert_allclose(cells['revenue_matrix'], raw['revenue_matrix'])
+                np.testing.assert_array_equal(cells['sizes'], raw['sizes'])
+
+    def test_approx_counts_customer_once_per_offset(self):
+        cells = build_cohorts_from_cells(*cohort_stats.load_cohort_cells(), max_months=3, month_diff='approx')
+        january = cells['labels'].index('Jan 2023')
+        # ada (Feb and Mar) and bob (Mar) once each at offset 1; nobody at offset 2
+        self.assertEqual(cells['retention_matrix'][january].tolist(), [2, 0, 0])
+
+
+class CohortMemberExportTests(TestCase):
+    def setUp(self):
+        for index, (customer, order_date) in enumerate(CohortCellTests.ORDERS):
+            save_order(f'C-{index}', customer_email=f'{customer}@example.com', order_date=f'{order_date} 12:00:00')
+        self.client.force_login(User.objects.create_user('analyst'))
+
+    def export(self, params, url=None):
+        response = self.client.get(url or reverse('cohort_members_export'), params)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_selects_cohorts_by_month_and_range(self):
+        self.assertEqual(self.export({'cohort': '2023-01'}),
+                         ['Cohort,Customer Email', 'Jan 2023,ada@example.com', 'Jan 2023,bob@example.com'])
+        self.assertEqual(self.export({'cohort': ['2022-12', '2023-02']})[1:],
+                         ['Dec 2022,dee@example.com', 'Feb 2023,cy@example.com'])
+        self.assertEqual(self.export({'start_month': '2023-01', 'end_month': '2023-02'})[1:],
+                         ['Jan 2023,ada@example.com', 'Jan 2023,bob@example.com', 'Feb 2023,cy@example.com'])
+        self.assertEqual(len(self.export({})), 5)
+
+    def test_rejects_invalid_month(self):
+        self.assertEqual(self.client.get(reverse('cohort_members_export'), {'cohort': '2023-13'}).status_code, 400)
+
+    def test_cohort_data_links_to_export(self):
+        response = self.client.get(reverse('cohort_data'), {'start_date': '2023-01-01', 'end_date': '2023-05-31'})
+        export = json.loads(response.content)['export']
+        self.assertEqual(export['customers'], 3)
+        self.assertEqual(self.export({}, url=export['url'])[1:],
+                         ['Jan 2023,ada@example.com', 'Jan 2023,bob@example.com', 'Feb 2023,cy@example.com'])
+
+
+def _shard_rows_task(arrays, rows):
+    return arrays['codes'].tolist(), rows.tolist()
+
+
+class ShardedAggregationTests(TestCase):
+    def test_each_shard_gets_its_customers_rows_in_input_order(self):
+        codes = np.array([5, 1, 5, 2, 1, 3, 5, 4], dtype=np.int64)
+        results = run_sharded(_shard_rows_task, codes, {'codes': codes}, 3)
+
+        ids = shard_ids(codes, 3)
+        for shard, (shard_codes, rows) in enumerate(results):
+            self.assertEqual(rows, np.flatnonzero(ids == shard).tolist())
+            self.assertEqual(shard_codes, codes[rows].tolist())
+
+    def test_sharded_features_match_serial(self):
+        orders = benchmarking.synthetic_feature_orders(2000, 5)
+        with mock.patch('builtins.print'):
+            serial, sharded = create_features(orders, workers=1), create_features(orders, workers=3)
+        self.assertTrue(sharded.equals(serial))
+
+
+@cached_json_response
+def _counting_view(request):
+    _counting_view.calls += 1
+    return JsonResponse({'calls': _counting_view.calls})
+
+
+class ResponseCacheTests(TestCase):
+    SETTLED = {'loaded': True, 'ready': True, 'loaded_at': 1.0, 'stale': False, 'reloading': False}
+
+    def setUp(self):
+        get_cache().clear()
+        _counting_view.calls = 0
+        self.request = RequestFactory().get('/chart-data/', {'range': 'all'})
+
+    def fetch_twice(self, *statuses):
+        with mock.patch.object(registry, 'status', side_effect=list(statuses)):
+            _counting_view(self.request)
+            return _counting_view(self.request)
+
+    def test_caches_when_artifacts_settled(self):
+        response = self.fetch_twice(self.SETTLED, self.SETTLED)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_skips_cache_while_reloading_or_stale(self):
+        for change in ({'reloading': True}, {'stale': True}):
+            with self.subTest(**change):
+                get_cache().clear()
+                response = self.fetch_twice(self.SETTLED, dict(self.SETTLED, **change), self.SETTLED, self.SETTLED)
+                self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_skips_cache_when_snapshot_swapped_during_view(self):
+        response = self.fetch_twice(self.SETTLED, dict(self.SETTLED, loaded_at=2.0), self.SETTLED, self.SETTLED)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+
+@analytics_endpoint
+def _status_view(request):
+    return JsonResponse({}, status=int(request.GET['status']))
+
+
+class AnalyticsEndpointTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def test_validators_only_on_success(self):
+        ok = _status_view(RequestFactory().get('/data/', {'status': 200}))
+        self.assertTrue(ok.has_header('ETag'))
+        self.assertTrue(ok.has_header('Last-Modified'))
+
+        not_modified = _status_view(RequestFactory().get('/data/', {'status': 200}, HTTP_IF_NONE_MATCH=ok['ETag']))
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], ok['ETag'])
+
+        for status in (400, 500):
+            with self.subTest(status=status):
+                response = _status_view(RequestFactory().get('/data/', {'status': status}))
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+                self.assertIn('no-cache', response['Cache-Control'])
+
+
+def decode_compact(payload):
+    # Python port of decodeCompactPayload (static/js/compact.js)
+    refs = []
+
+    def decode(node, parent, key):
+        if isinstance(node, list):
+            result = [None] * len(node)
+            for index, item in enumerate(node):
+                result[index] = decode(item, result, index)
+            return result
+        if isinstance(node, dict):
+            if '$typed' in node:
+                dtype = {'uint8': '<u1', 'int16': '<i2', 'int32': '<i4', 'float64': '<f8'}[node['$typed']]
+                values = np.frombuffer(base64.b64decode(node['data']), dtype=dtype).astype(float)
+                if node.get('scale'):
+                    values = values / node['scale']
+                return values.reshape(node['shape']).tolist()
+            if '$ref' in node:
+                refs.append((parent, key, node['$ref']))
+                return None
+            result = {}
+            for item_key, value in node.items():
+                result[item_key] = decode(value, result, item_key)
+            return result
+        return node
+
+    data = decode(payload['data'], None, None)
+    for parent, key, path in refs:
+        target = data
+        for part in path.split('.'):
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        parent[key] = target
+    return data
+
+
+class CompactEncodingTests(TestCase):
+    DATA = {
+        'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug'],
+        'counts': np.arange(300, 500),
+        'revenue': (np.arange(100) * 1234 / 100).tolist(),
+        'ratios': np.linspace(0, 1, 9),
+        'matrix': np.arange(400).reshape(20, 20) % 250,
+        'short': [1, 2, 3],
+        'nested': {'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug'], 'name': 'cohorts'},
+        'series': [{'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug']}],
+    }
+
+    def fetch(self, **params):
+        return json.loads(json_response(self.DATA, RequestFactory().get('/data/', params)).content)
+
+    def test_round_trip_matches_plain_encoding(self):
+        compact = self.fetch(encoding='compact')
+        self.assertEqual((compact['encoding'], compact['version']), ('compact', 1))
+        self.assertEqual(decode_compact(compact), self.fetch())
+
+    def test_uses_typed_arrays_and_refs(self):
+        data = self.fetch(encoding='compact')['data']
+        self.assertEqual(data['counts']['$typed'], 'int16')
+        self.assertEqual((data['revenue']['$typed'], data['revenue']['scale']), ('int32', 100))
+        self.assertEqual((data['matrix']['$typed'], data['matrix']['shape']), ('uint8', [20, 20]))
+        self.assertEqual(data['short'], [1, 2, 3])
+        self.assertEqual(data['nested']['labels'], {'$ref': 'labels'})
+        self.assertEqual(data['series'][0]['labels'], {'$ref': 'labels'})
+
+
+class StratifiedSampleTests(TestCase):
+    def test_never_exceeds_max_points(self):
+        x = np.arange(1000, dtype=float)
+        for labels, max_points in ((np.arange(1000) % 50, 20), (np.arange(1000) % 7, 10),
+                                   (np.r_[np.zeros(990), np.arange(1, 11)], 5)):
+            with self.subTest(strata=len(np.unique(labels)), max_points=max_points):
+                indices = stratified_sample(x, labels, max_points)
+                self.assertLessEqual(len(indices), max_points)
+                self.assertEqual(len(np.unique(indices)), len(indices))
+
+    def test_keeps_every_stratum_within_budget(self):
+        labels = np.r_[np.zeros(900), np.ones(90), np.full(10, 2)]
+        indices = stratified_sample(np.arange(1000, dtype=float), labels, 100)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(set(labels[indices]), {0, 1, 2})
+
+
+class TimeseriesTests(TestCase):
+    def test_densify_fills_gaps_with_zero(self):
+        rows = [{'month': datetime(2024, 1, 1), 'total': 5}, {'month': datetime(2024, 4, 1), 'total': 7}]
+        buckets, values = densify(rows, date(2024, 1, 15), date(2024, 5, 2))
+
+        self.assertEqual(buckets.strftime('%Y-%m').tolist(), ['2024-01', '2024-02', '2024-03', '2024-04', '2024-05'])
+        self.assertEqual(values['total'].tolist(), [5, 0, 0, 7, 0])
+
+    def test_densify_empty_range(self):
+        buckets, values = densify([], date(2024, 1, 1), date(2024, 3, 31), metrics=('total', 'count'))
+        self.assertEqual(len(buckets), 3)
+        self.assertEqual(values['total'].tolist(), [0, 0, 0])
+        self.assertEqual(values['count'].tolist(), [0, 0, 0])
+
+    def test_densify_decimal_and_none_metrics(self):
+        rows = [{'month': datetime(2024, 1, 1), 'total': Decimal('1.50')}, {'month': datetime(2024, 2, 1), 'total': None}]
+        _, values = densify(rows, date(2024, 1, 1), date(2024, 2, 1))
+        self.assertEqual(values['total'].tolist(), [1.5, 0.0])
+
+    def test_week_and_quarter_buckets(self):
+        # 2024-01-01 is a Monday, so the week of Sunday 2024-01-07 starts then
+        self.assertEqual(calendar_buckets(date(2024, 1, 7), date(2024, 1, 15), 'week').strftime('%Y-%m-%d').tolist(),
+                         ['2024-01-01', '2024-01-08', '2024-01-15'])
+        self.assertEqual(calendar_buckets(date(2024, 2, 10), date(2024, 8, 1), 'quarter').strftime('%Y-%m').tolist(),
+                         ['2024-01', '2024-04', '2024-07'])
+        with self.assertRaises(ValueError):
+            calendar_buckets(date(2024, 1, 1), date(2024, 2, 1), 'fortnight')
+
+    def test_buckets_follow_local_time_across_dst(self):
+        # New York clocks go forward on 2024-03-10 at 07:00 UTC and back on 2024-11-03 at 06:00 UTC
+        order_dates = ['2024-03-10 04:30:00', '2024-03-10 06:30:00', '2024-03-10 08:00:00',
+                       '2024-11-03 05:30:00', '2024-11-03 06:30:00', '2024-11-04 04:30:00']
+        order_import.upsert_orders([order_import.parse_row(order_row(f'T-{index}', order_date=order_date))
+                                    for index, order_date in enumerate(order_dates)])
+        utc_dates = pd.to_datetime(order_dates).tz_localize('UTC')
+
+        with timezone.override('America/New_York'):
+            self.assertEqual(floor_to_bucket(utc_dates, 'day').dt.strftime('%Y-%m-%d').tolist(),
+                             ['2024-03-09', '2024-03-10', '2024-03-10', '2024-11-03', '2024-11-03', '2024-11-03'])
+            # 2024-03-09 and 2024-03-10 share the week starting Monday 2024-03-04
+            for grain, expected in (('day', {'2024-03-09': 1, '2024-03-10': 2, '2024-11-03': 3}),
+                                    ('week', {'2024-03-04': 3, '2024-10-28': 3}),
+                                    ('month', {'2024-03-01': 3, '2024-11-01': 3})):
+                with self.subTest(grain=grain):
+                    buckets, values = aggregate_series(Order.objects.all(), {'orders': Count('order_id')},
+                                                       date(2024, 3, 9), date(2024, 11, 4), grain=grain,
+                                                       date_field='order_date')
+                    counts = dict(zip(buckets.strftime('%Y-%m-%d'), values['orders'].tolist()))
+                    self.assertEqual({bucket: count for bucket, count in counts.items() if count}, expected)
+                    self.assertEqual(floor_to_bucket(utc_dates, grain).dt.strftime('%Y-%m-%d').value_counts().to_dict(),
+                                     expected)
+
+
+class FrameFormatTests(TestCase):
+    def frame(self):
+        return pd.DataFrame({
+            'customer_name': ['Ada', None, 'Cy'],
+            'frequency': np.array([1, 4, 2], dtype=np.int64),
+            'monetary': [10.5, 0.0, 99.99],
+            'churned': [True, False, True],
+            'last_order_date': pd.to_datetime(['2024-01-01 10:00', '2024-02-01 00:00', '2024-03-01 00:00']).tz_localize('UTC'),
+            'segment': pd.Categorical(['Loyal', 'New', 'Loyal'], categories=['Loyal', 'New']),
+        })
+
+    def test_columns_round_trip(self):
+        df = self.frame()
+        with tempfile.TemporaryDirectory() as directory:
+            base_path = os.path.join(directory, 'features')
+            self.assertEqual(write_frame(df, base_path, format='columns'), base_path + '.cols')
+            pd.testing.assert_frame_equal(read_frame(base_path, format='columns'), df)
+            pd.testing.assert_frame_equal(read_frame(base_path, columns=['segment', 'frequency'], format='columns'),
+                                          df[['segment', 'frequency']])
+
+    def test_empty_frame_and_missing_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            base_path = os.path.join(directory, 'features')
+            self.assertIsNone(read_frame(base_path, format='columns'))
+            write_frame(self.frame().iloc[:0], base_path, format='columns')
+            self.assertEqual(len(read_frame(base_path, format='columns')), 0)
+
+    def test_falls_back_to_legacy_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            base_path = os.path.join(directory, 'features')
+            pd.DataFrame({'frequency': [1, 2], 'monetary': [3.0, 4.0]}).to_csv(base_path + '.csv', index=False)
+            self.assertEqual(read_frame(base_path, columns=['monetary'], format='columns')['monetary'].tolist(), [3.0, 4.0])
+
+
+class SegmentRulesTests(TestCase):
+    CONFIG = {
+        'default': {'segment': 'Other', 'action': 'Nothing'},
+        'rules': [
+            {'segment': 'Loyal', 'all': [['R', '>=', 4], ['F', '>=', 4]], 'action': 'Reward'},
+            {'segment': 'Big spender', 'any': [['monetary', '>', 1000], ['M', '==', 5]]},
+            {'segment': 'Lapsed', 'all': [['R', 'in', [1, 2]]], 'any': [['F', 'between', [2, 3]]]},
+        ],
+    }
+
+    def test_first_matching_rule_wins(self):
+        df = pd.DataFrame({'R': [5, 5, 1, 1, 3], 'F': [4, 1, 2, 5, 3], 'M': [5, 5, 1, 1, 1],
+                           'monetary': [2000, 10, 10, 10, 10]})
+        segments = SegmentRules(self.CONFIG).assign(df)
+
+        self.assertEqual(segments.tolist(), ['Loyal', 'Big spender', 'Lapsed', 'Other', 'Other'])
+        self.assertEqual(list(segments.categories), ['Loyal', 'Big spender', 'Lapsed', 'Other'])
+
+    def test_actions(self):
+        rules = SegmentRules(self.CONFIG)
+        self.assertEqual(rules.actions, {'Loyal': 'Reward', 'Big spender': 'No action specified.',
+                                         'Lapsed': 'No action specified.', 'Other': 'Nothing'})
+
+    def test_invalid_rules(self):
+        for config in ({'rules': []},
+                       {'default': {'segment': 'Other'}, 'rules': [{'segment': 'Empty'}]},
+                       {'default': {'segment': 'Other'}, 'rules': [{'segment': 'Bad', 'all': [['R', '=>', 4]]}]}):
+            with self.subTest(config=config), self.assertRaises(ValueError):
+                SegmentRules(config)
+
+    def test_missing_column(self):
+        with self.assertRaises(KeyError):
+            SegmentRules(self.CONFIG).assign(pd.DataFrame({'R': [1], 'F': [1]}))
+
+    def test_shipped_rules_load(self):
+        rules = load_rules()
+        self.assertEqual(rules.segments[-1], rules.default)
+        self.assertEqual(rules.assign(pd.DataFrame({'R': [5, 1], 'F': [5, 1], 'M': [5, 1]})).tolist(),
+                         ['Loyal Customer', 'At Risk'])
+
+
+class PercentileIndexTests(TestCase):
+    def setUp(self):
+        for index, monetary in enumerate(['10.00', '20.00', '30.00', '40.00']):
+            CustomerFeatures.objects.create(
+                customer_name=f'Customer {index}', customer_email=f'customer{index}@example.com',
+                first_order_date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+                last_order_date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc) + timedelta(days=30 * index),
+                order_count=1, monetary=Decimal(monetary), gap_sum_days=0.0)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'percentile_index.npz')
+        patcher = mock.patch.object(percentiles, 'INDEX_PATH', self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(percentiles._loaded.update, {'signature': None, 'index': None})
+
+    def test_rank(self):
+        ltv = percentiles.customer_distributions()['ltv']
+        self.assertEqual(percentiles.rank(ltv, 40.0), {'rank': 1, 'percentile': 100.0, 'is_top': True})
+        self.assertEqual(percentiles.rank(ltv, 20.0), {'rank': 3, 'percentile': 50.0, 'is_top': False})
+        self.assertEqual(percentiles.rank(np.array([]), 1.0), {'rank': None, 'percentile': None, 'is_top': False})
+
+    def test_index_file_round_trip(self):
+        built = percentiles.build_percentile_index(self.path)
+        loaded = percentiles.get_percentile_index()
+        np.testing.assert_array_equal(loaded['ltv'], built['ltv'])
+        np.testing.assert_array_equal(loaded['lifetime_months'], built['lifetime_months'])
+
+    def test_missing_file_computed_once_per_data_version(self):
+        with mock.patch.object(percentiles, 'customer_distributions',
+                               wraps=percentiles.customer_distributions) as distributions, \
+                self.assertLogs('dashboard.percentiles', level='WARNING'):
+            percentiles.get_percentile_index()
+            percentiles.get_percentile_index()
+            self.assertEqual(distributions.call_count, 1)
+            bump_data_version()
+            percentiles.get_percentile_index()
+            self.assertEqual(distributions.call_count, 2)
+
+
+def segments_frame(segment, churn_probability=0.25):
+    return pd.DataFrame({
+        'customer_name': ['Ada Lovelace'], 'last_order_date': [pd.Timestamp('2024-03-05', tz='UTC')],
+        'frequency': [1], 'monetary': [100.0], 'recency': [392.0], 'avg_days_between_orders': [0.0],
+        'customer_email': ['ada@example.com'], 'R': [3], 'F': [1], 'M': [2], 'RFM_Score': [312],
+        'Segment': [segment], 'Churn': [1], 'churn_probability': [churn_probability],
+    })
+
+
+class SegmentGenerationTests(TestCase):
+    def test_publish_switches_generation_and_keeps_the_previous_one(self):
+        first = publish_segments(segments_frame('New Customer'))
+        second = publish_segments(segments_frame('At Risk'))
+        third = publish_segments(segments_frame('Loyal Customer'))
+
+        self.assertEqual(active_generation(), third)
+        self.assertEqual(list(CustomerSegment.objects.order_by('generation').values_list('generation', 'segment')),
+                         [(second, 'At Risk'), (third, 'Loyal Customer')])
+        self.assertNotIn(first, CustomerSegment.objects.values_list('generation', flat=True))
+
+    def test_interrupted_publish_is_never_active(self):
+        generation = publish_segments(segments_frame('New Customer'))
+        with mock.patch.object(CustomerSegment.objects, 'bulk_create', side_effect=RuntimeError('disk full')), \
+                self.assertRaises(RuntimeError):
+            publish_segments(segments_frame('At Risk'))
+        self.assertEqual(active_generation(), generation)
+        self.assertEqual(publish_segments(segments_frame('Loyal Customer')), generation + 1)
+
+    def test_customer_profile_reads_the_active_generation(self):
+        order_import.upsert_orders([order_import.parse_row(order_row('P-1'))])
+        CustomerFeatures.objects.create(
+            customer_name='Ada Lovelace', customer_email='ada@example.com',
+            first_order_date=datetime(2024, 3, 5, 10, tzinfo=dt_timezone.utc),
+            last_order_date=datetime(2024, 3, 5, 10, tzinfo=dt_timezone.utc),
+            order_count=1, monetary=Decimal('100.00'), gap_sum_days=0.0)
+        publish_segments(segments_frame('Loyal Customer'))
+        # The file artifact may lag the published generation during a retrain
+        artifacts = mock.Mock(rfm_segments={'Ada Lovelace': 'At Risk'}, model=object(), scaler=object(),
+                              model_version='test')
+        request = RequestFactory().get('/customer-profile-data/', {'customer_name': 'Ada Lovelace'})
+        with mock.patch.object(views, 'get_artifacts', return_value=artifacts), \
+                mock.patch.object(views, 'predict_churn', return_value=0.5):
+            response = views.customer_profile_data(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['rfm_segment'], 'Loyal Customer')
+
+
+def add_customer_features(name, email, monetary='10.00', order_date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc)):
+    return CustomerFeatures.objects.create(customer_name=name, customer_email=email, first_order_date=order_date,
+                                           last_order_date=order_date, order_count=1, monetary=Decimal(monetary),
+                                           gap_sum_days=0.0)
+
+
+class CustomerSearchTests(TestCase):
+    CUSTOMERS = [('Ann', 'zz@example.com'), ('Abe', 'q@example.com'), ('Bob', 'ab@example.com'),
+                 ('Cid', 'ac@example.com'), ('Dan', 'ad@example.com'), ('Eve', 'eve@example.com')]
+
+    def setUp(self):
+        for name, email in self.CUSTOMERS:
+            add_customer_features(name, email)
+        self.index = customer_search.CustomerSearchIndex()
+        patcher = mock.patch.object(customer_search, 'REFRESH_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def all_pages(self, query, mode='prefix', limit=2):
+        names, cursor = [], None
+        while True:
+            results, cursor = self.index.search(query, mode=mode, limit=limit, cursor=cursor)
+            names.extend(result['name'] for result in results)
+            if cursor is None:
+                return names
+
+    def test_prefix_pages_cross_from_names_to_emails(self):
+        # Abe and Ann match by name, then Bob, Cid and Dan by email
+        results, cursor = self.index.search('a', limit=2)
+        self.assertEqual([result['name'] for result in results], ['Abe', 'Ann'])
+        self.assertEqual(customer_search.decode_cursor(cursor), ('email', None, None))
+        for limit in (1, 2, 3, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.all_pages('a', limit=limit), ['Abe', 'Ann', 'Bob', 'Cid', 'Dan'])
+
+    def test_empty_prefix_lists_everyone_once(self):
+        self.assertEqual(self.all_pages(''), ['Abe', 'Ann', 'Bob', 'Cid', 'Dan', 'Eve'])
+
+    def test_substring_windows_continue_through_the_cursor(self):
+        expected = self.all_pages('example', mode='substring', limit=100)
+        self.assertEqual(expected, ['Abe', 'Ann', 'Bob', 'Cid', 'Dan', 'Eve'])
+        # A window of a few characters ends most pages early; the cursor resumes the scan
+        with mock.patch.object(customer_search, 'SUBSTRING_SCAN_CHARS', 5):
+            self.assertEqual(self.all_pages('example', mode='substring', limit=100), expected)
+            self.assertEqual(self.all_pages('e', mode='substring', limit=1), expected)
+            self.assertEqual(self.all_pages('an', mode='substring', limit=1), ['Ann', 'Dan'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', customer_search.encode_cursor('substring', 'a', 'A')):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                self.index.search('a', cursor=cursor)
+
+    def test_new_customers_are_merged_from_the_pending_list(self):
+        self.index.search('a')
+        add_customer_features('Amy', 'amy@example.com')
+        add_customer_features('Zed', 'aa@example.com')
+        bump_data_version()
+
+        self.assertEqual(self.all_pages('a'), ['Abe', 'Amy', 'Ann', 'Zed', 'Bob', 'Cid', 'Dan'])
+        self.assertEqual(self.index.status()['pending'], 2)
+
+        # Past MERGE_THRESHOLD the pending rows move into a rebuilt snapshot in the background
+        add_customer_features('Alf', 'alf@example.com')
+        bump_data_version()
+        with mock.patch.object(customer_search, 'MERGE_THRESHOLD', 2):
+            self.index.search('a')
+            for _ in range(100):
+                if not self.index._merging:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(self.index.status(), {'customers': 9, 'pending': 0, 'data_version': get_data_version()})
+        self.assertEqual(self.all_pages('a'), ['Abe', 'Alf', 'Amy', 'Ann', 'Zed', 'Bob', 'Cid', 'Dan'])
+
+
+def feature_orders(rows):
+    # (customer_name, customer_email, order_date, order_total) rows as extract_data returns them
+    return pd.DataFrame({
+        'customer_name': [row[0] for row in rows],
+        'customer_email': [row[1] for row in rows],
+        'order_date': pd.to_datetime([row[2] for row in rows], utc=True),
+        'order_id': np.arange(len(rows)),
+        'order_total': [row[3] for row in rows],
+    })
+
+
+class CreateFeaturesTests(TestCase):
+    def test_features_from_unsorted_orders(self):
+        orders = feature_orders([('Ada', 'ada@old.example.com', '2024-01-01 10:00', 10.0),
+                                 ('Bob', 'bob@example.com', '2024-05-05 00:00', 7.0),
+                                 ('Ada', 'ada@new.example.com', '2024-03-01 10:00', 20.5),
+                                 ('Ada', 'ada@old.example.com', '2024-02-01 10:00', 5.25)])
+        with mock.patch('builtins.print'):
+            features = create_features(orders, workers=1)
+
+        self.assertEqual(features['customer_name'].tolist(), ['Ada', 'Bob'])
+        self.assertEqual(features['frequency'].tolist(), [3, 1])
+        self.assertEqual(features['monetary'].tolist(), [35.75, 7.0])
+        self.assertEqual(features['customer_email'].tolist(), ['ada@new.example.com', 'bob@example.com'])
+        # 60 days from Jan 1 to Mar 1 2024 over two gaps; a single order has no gap
+        self.assertEqual(features['avg_days_between_orders'].tolist(), [30.0, 0.0])
+        self.assertEqual(features['last_order_date'].tolist(),
+                         [pd.Timestamp('2024-03-01 10:00', tz='UTC'), pd.Timestamp('2024-05-05', tz='UTC')])
+
+    def test_matches_legacy_implementation(self):
+        with mock.patch('builtins.print'):
+            orders = clean_and_standardize_data(benchmarking.synthetic_feature_orders(3000, 6))
+            difference = max_difference(legacy_create_features(orders), create_features(orders, workers=1))
+        self.assertIsNotNone(difference)
+        self.assertLess(difference, 1e-9)
+
+
+class OrderPartialsTests(TestCase):
+    def test_merged_chunk_partials_match_whole_table(self):
+        orders = benchmarking.synthetic_feature_orders(500, 5)
+        whole = merge_partials(order_partials(orders))
+        for chunk_size in (1, 7, 120):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = [merge_partials(order_partials(orders.iloc[start:start + chunk_size]))
+                          for start in range(0, len(orders), chunk_size)]
+                pd.testing.assert_frame_equal(merge_partials(pd.concat(chunks, ignore_index=True)), whole)
+
+    def test_extracted_features_match_create_features(self):
+        benchmarking.insert_synthetic_orders(60, chunk_size=25)
+        with mock.patch('builtins.print'):
+            expected = create_features(clean_and_standardize_data(extract_data()), workers=1)
+            for chunk_size, workers in ((1, 1), (3, 1), (7, 1), (1000, 1), (7, 2)):
+                with self.subTest(chunk_size=chunk_size, workers=workers):
+                    features = features_from_partials(extract_partials(chunk_size, workers=workers))
+                    pd.testing.assert_frame_equal(features, expected)
+
+    def test_no_orders(self):
+        self.assertIsNone(extract_partials(10, workers=1))
+
+
+class ChurnTrainingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = {'CHURN_MODEL_PATH': os.path.join(directory.name, 'churn_model.joblib'),
+                 'SCALER_PATH': os.path.join(directory.name, 'scaler.joblib')}
+        for patcher in (mock.patch.multiple('dashboard.ml_utils', **paths),
+                        mock.patch.multiple('dashboard.churn_training', **paths,
+                                            CHURN_TRAINING_STATE_PATH=os.path.join(directory.name, 'state.joblib'))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Last orders every ten days from 2024-01-01, so both churned and active customers
+        for index in range(60):
+            add_customer_features(f'Customer {index}', f'customer{index}@example.com', monetary=f'{10 + index}.00',
+                                  order_date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc) + timedelta(days=10 * index))
+        self.holdout = churn_training.holdout_mask([f'Customer {index}' for index in range(60)])
+
+    def touch(self, indexes):
+        for index in indexes:
+            features = CustomerFeatures.objects.get(customer_name=f'Customer {index}')
+            features.order_count += 1
+            features.save()
+
+    def test_first_run_refits_on_training_customers(self):
+        stats = churn_training.update_churn_model()
+
+        self.assertEqual(stats['mode'], 'full_refit')
+        self.assertEqual(stats['customers'], int((~self.holdout).sum()))
+        self.assertEqual(stats['comparison']['held_out'], int(self.holdout.sum()))
+        self.assertIsNotNone(stats['comparison']['full_refit_baseline'])
+        state = churn_training.load_training_state()
+        self.assertEqual(state['trained_through'], CustomerFeatures.objects.aggregate(Max('updated_at'))['updated_at__max'])
+
+    def test_incremental_update_trains_changed_customers_past_watermark(self):
+        churn_training.update_churn_model()
+        changed = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+        self.touch(changed)
+
+        stats = churn_training.update_churn_model()
+        held_out = int(self.holdout[changed].sum())
+        self.assertEqual(stats, {'mode': 'incremental', 'customers': len(changed) - held_out, 'held_out': held_out})
+        state = churn_training.load_training_state()
+        self.assertEqual(state['trained_through'], CustomerFeatures.objects.aggregate(Max('updated_at'))['updated_at__max'])
+        self.assertEqual((state['incremental_updates'], state['customers_since_refit']), (1, len(changed) - held_out))
+
+        # Nothing changed since: the watermark and state stay put
+        self.assertEqual(churn_training.update_churn_model(), {'mode': 'incremental', 'customers': 0, 'held_out': 0})
+        self.assertEqual(churn_training.load_training_state(), state)
+
+    def test_held_out_customers_are_never_trained_on(self):
+        churn_training.update_churn_model()
+        held_out = [index for index in range(60) if self.holdout[index]]
+        self.assertTrue(held_out)
+        self.touch(held_out)
+
+        with mock.patch.object(SGDClassifier, 'partial_fit') as partial_fit:
+            stats = churn_training.update_churn_model()
+        partial_fit.assert_not_called()
+        self.assertEqual(stats, {'mode': 'incremental', 'customers': 0, 'held_out': len(held_out)})
+
+    def test_refits_when_due(self):
+        churn_training.update_churn_model()
+        self.touch([0])
+        with self.settings(CHURN_FULL_REFIT_DAYS=7):
+            stats = churn_training.update_churn_model(now=timezone.now() + timedelta(days=8))
+        self.assertEqual(stats['mode'], 'full_refit')
+        self.assertEqual(churn_training.load_training_state()['incremental_updates'], 0)
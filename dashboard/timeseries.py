@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+# Calendar grains supported by the charts: pandas frequency of bucket starts and the
+# matching database truncation function
+GRAINS = {
+    'day': ('D', TruncDay),
+    'week': ('W-MON', TruncWeek),  # ISO weeks start on Monday, like TruncWeek
+    'month': ('MS', TruncMonth),
+    'quarter': ('QS', TruncQuarter),
+}
+
+
+def trunc_function(grain):
+    return GRAINS[grain][1]
+
+
+def _to_naive(values):
+    # Aware datetimes are bucketed in the current time zone, like the Trunc* functions
+    timestamps = pd.DatetimeIndex(pd.to_datetime(values))
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert(timezone.get_current_timezone_name()).tz_localize(None)
+    return timestamps
+
+
+def floor_to_bucket(values, grain='month'):
+    """
+    Vectorized: start of the calendar bucket containing each value.
+    """
+    timestamps = pd.Series(_to_naive(values)).dt.normalize()
+    if grain == 'day':
+        return timestamps
+    if grain == 'week':
+        return timestamps - pd.to_timedelta(timestamps.dt.weekday, unit='D')
+    if grain == 'month':
+        return timestamps.dt.to_period('M').dt.start_time
+    if grain == 'quarter':
+        return timestamps.dt.to_period('Q').dt.start_time
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def bucket_start(value, grain='month'):
+    """
+    Start of the calendar bucket containing a single date, datetime or Timestamp.
+    """
+    return floor_to_bucket([value], grain).iloc[0]
+
+
+def calendar_buckets(start, end, grain='month'):
+    """
+    Bucket start timestamps covering [start, end] inclusive.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain: {grain}")
+    return pd.date_range(bucket_start(start, grain), bucket_start(end, grain), freq=GRAINS[grain][0])
+
+
+def densify(rows, start, end, grain='month', key='month', metrics=('total',)):
+    """
+    Align aggregate rows (e.g. a `.values(key).annotate(...)` queryset) onto every bucket
+    between start and end, filling missing buckets with 0.
+
+    Returns (buckets, values) where values maps each metric to a NumPy array aligned with
+    buckets. Integer metrics stay integers; Decimal/None metrics become floats.
+    """
+    metrics = list(metrics)
+    buckets = calendar_buckets(start, end, grain)
+    frame = pd.DataFrame.from_records(list(rows), columns=[key] + metrics)
+
+    values = {}
+    if frame.empty:
+        for metric in metrics:
+            values[metric] = np.zeros(len(buckets), dtype=np.int64)
+        return buckets, values
+
+    frame[key] = floor_to_bucket(frame[key], grain).to_numpy()
+    for metric in metrics:
+        column = frame[metric].fillna(0)
+        frame[metric] = column.astype(float) if column.dtype == object else column
+
+    aligned = frame.groupby(key)[metrics].sum().reindex(buckets, fill_value=0)
+    for metric in metrics:
+        values[metric] = aligned[metric].to_numpy()
+    return buckets, values
+
+
+def format_buckets(buckets, fmt='%Y-%m'):
+    return buckets.strftime(fmt).tolist()
+
+
+def aggregate_series(queryset, metrics, start, end, grain='month', date_field='day'):
+    """
+    Compute any number of metrics per calendar bucket in a single GROUP BY and densify them.
+
+    metrics maps output names to aggregate expressions, e.g.
+    {'shipping': Sum('shipping_charge'), 'net': Sum('order_total') - Sum('order_refunded')}.
+    Works on OrderDailyRollup (date_field='day') or Order (date_field='order_date').
+    """
+    rows = (queryset
+            .annotate(bucket=trunc_function(grain)(date_field))
+            .values('bucket')
+            .annotate(**metrics)
+            .order_by('bucket'))
+    return densify(rows, start, end, grain=grain, key='bucket', metrics=list(metrics))
@@ -0,0 +1,13 @@
+from django.db import connections, router
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=None):
+    """
+    bulk_create that updates update_fields of rows conflicting on unique_fields. Backends
+    without a conflict target (MySQL's ON DUPLICATE KEY UPDATE) reject unique_fields and
+    match on the table's unique indexes instead, so it is only passed where supported.
+    """
+    connection = connections[router.db_for_write(model)]
+    target = unique_fields if connection.features.supports_update_conflicts_with_target else None
+    return model.objects.bulk_create(objs, batch_size=batch_size, update_conflicts=True,
+                                     unique_fields=target, update_fields=update_fields)
@@ -20,6 +20,7 @@ urlpatterns = [
     #new
     path('customer_profile/', views.customer_profile, name='customer_profile'),
     path('customer_profile_data/', views.customer_profile_data, name='customer_profile_data'),
+    path('customer-search/', views.customer_search, name='customer_search'),
     path('customer_insights/', views.customer_insights_view, name='customer_insights'),
     path('customer_insights_data/',views.customer_insights_data,name='customer_insights_data'),
     path('financial-insights/', views.financial_insights_view, name='financial_insights'),
@@ -29,6 +30,9 @@ urlpatterns = [
     path('rfm_churn_visualizations_data/', views.rfm_churn_visualizations_data, name='rfm_churn_visualizations_data'),
     path('download_rfm_data/', views.download_rfm_data, name='download_rfm_data'),  # New route
     path('cohort-data/', views.cohort_data, name='cohort_data'),
+    path('cohort-members/', views.cohort_members_export, name='cohort_members_export'),
     path('cohort_analysis/', views.cohort_analysis, name='cohort_analysis'),
+    path('retrain-status/', views.retrain_status, name='retrain_status'),
+    path('cache-status/', views.cache_status, name='cache_status'),
     ## NEW ##
 ]
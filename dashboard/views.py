@@ -6,9 +6,9 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from .models import Order
+from .models import Order, CustomerFeatures, OrderDailyRollup
 from django.db.models import Count, Sum, Avg
-from django.db.models.functions import TruncMonth, TruncDay, ExtractYear, ExtractMonth
+from django.db.models.functions import TruncMonth, ExtractYear, ExtractMonth
 import pandas as pd
 import numpy as np
 import logging
@@ -16,17 +16,42 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Max, Min, Avg, F, ExpressionWrapper, DurationField
 from django.utils.timezone import now
-from .ml_utils import load_rfm_segments, load_churn_model_and_scaler, predict_churn
+from .ml_utils import get_artifacts, predict_churn, registry as artifact_registry
+from .retrain_queue import queue_status
+from .caching import analytics_endpoint, cache_stats
+from .serialization import json_response
+from .cohorts import MONTH_DIFF_MODES, build_cohorts_from_cells, cohort_metrics as build_cohort_metrics
+from .cohort_stats import iter_cohort_members, load_cohort_cells
+from .customer_search import DEFAULT_LIMIT as CUSTOMER_SEARCH_DEFAULT_LIMIT, MAX_LIMIT as CUSTOMER_SEARCH_MAX_LIMIT
+from .customer_search import SEARCH_MODES as CUSTOMER_SEARCH_MODES, SUBSTRING_MIN_LENGTH as CUSTOMER_SEARCH_SUBSTRING_MIN_LENGTH
+from .customer_search import index as customer_search_index
+from .percentiles import get_percentile_index, rank as percentile_rank
+from .scoring import current_score as current_churn_score
+from .segmentation import get_rules
+from .segments import EXPORT_COLUMNS as SEGMENT_EXPORT_COLUMNS, active_segments, monthly_churn
+from .segments import export_rows as segment_export_rows, segment_counts as segment_counts_of
+from .order_rollups import rollups_between
+from .timeseries import aggregate_series, densify, format_buckets
+from .histograms import db_correlation, db_days_since_histogram, db_histogram
+from .scatter import DEFAULT_STRATEGY as DEFAULT_SCATTER_STRATEGY, STRATEGIES as SCATTER_STRATEGIES
+from .scatter import db_reduce_scatter, get_max_points as get_scatter_max_points, reduce_scatter
 import pytz
 from django.conf import settings
 import os
 import json
-from django.http import HttpResponse
+import itertools
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from urllib.parse import urlencode
+import csv
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# JSON endpoints served through the analytics response cache and conditional GET
+CACHED_VIEWS = ['chart_data', 'dashboard_data', 'customer_insights_data', 'cohort_data', 'financial_insights_data', 'product_insights_data', 'customer_profile_data', 'rfm_churn_visualizations_data']
+
 @login_required(login_url='/signin/')
 def dashboard_view(request):
     # Get today's date and yesterday's date
@@ -110,6 +135,7 @@ def rfm_analysis_view(request):
     return render(request, 'dashboard/rfm_analysis.html')
 
 
+@analytics_endpoint
 def chart_data(request):
     try:
         # Get query parameters
@@ -117,6 +143,10 @@ def chart_data(request):
         date_range_option = request.GET.get('date_range_option', 'last_1_year')
         start_date_str = request.GET.get('start_date', None)
         end_date_str = request.GET.get('end_date', None)
+        scatter_strategy = request.GET.get('scatter_strategy', DEFAULT_SCATTER_STRATEGY)
+        scatter_max_points = get_scatter_max_points(request.GET.get('scatter_max_points'))
+        if scatter_strategy not in SCATTER_STRATEGIES:
+            return JsonResponse({'error': f"Invalid scatter_strategy. Use one of: {', '.join(SCATTER_STRATEGIES)}."}, status=400)
 
         # Determine the date range
         today = timezone.now().date()
@@ -151,32 +181,18 @@ def chart_data(request):
             logger.error("No orders found in the database within the specified date range.")
             return JsonResponse({'error': 'No orders found in the database within the specified date range.'}, status=400)
 
-        # Convert to DataFrame for easier manipulation
-        df = pd.DataFrame(list(orders.values()))
-        logger.debug(f"DataFrame shape: {df.shape}")
-
         # Get available months and years for the dropdown (unfiltered by date to ensure all options are available)
-        available_months = (Order.objects.annotate(
-            year=ExtractYear('order_date'),
-            month=ExtractMonth('order_date')
+        available_months = (OrderDailyRollup.objects.annotate(
+            year=ExtractYear('day'),
+            month=ExtractMonth('day')
         ).values('year', 'month').distinct().order_by('year', 'month'))
         month_options = [f"{m['year']}-{str(m['month']).zfill(2)}" for m in available_months]
 
-        # 1. Distribution of Order Totals (Bin the data)
-        if 'order_total' not in df.columns or df['order_total'].empty:
-            logger.error("order_total column is missing or empty.")
-            hist_labels, hist_values = [], []
-        else:
-            order_totals = df['order_total'].dropna().astype(float).to_numpy()
-            if len(order_totals) == 0:
-                logger.warning("No valid order_totals after dropping NaN.")
-                hist_labels, hist_values = [], []
-            else:
-                hist, bin_edges = np.histogram(order_totals, bins=30)
-                hist_labels = [f"{int(bin_edges[i])}-{int(bin_edges[i+1])}" for i in range(len(bin_edges)-1)]
-                hist_values = hist.tolist()
-                logger.debug(f"Order Totals Histogram - Labels: {hist_labels[:5]}, Values: {hist_values[:5]}")
-
+        # 1. Distribution of Order Totals (Bin the data, counted by the database)
+        hist_labels, hist_values = db_histogram(orders, 'order_total', bins=30)
+        if not hist_values:
+            logger.warning("No valid order_totals in the selected range.")
+        logger.debug(f"Order Totals Histogram - Labels: {hist_labels[:5]}, Values: {hist_values[:5]}")
         # 2. Trend of Orders Over Time (with month filter)
         if selected_month:
             try:
@@ -184,121 +200,83 @@ def chart_data(request):
                 if not (1 <= month <= 12) or year < 1900 or year > 9999:
                     logger.error(f"Invalid year or month: {selected_month}")
                     return JsonResponse({'error': 'Invalid year or month format.'}, status=400)
-                monthly_orders = (Order.objects.filter(
-                    order_date__year=year,
-                    order_date__month=month,
-                    order_date__date__gte=start_date,
-                    order_date__date__lte=end_date
-                ).annotate(month=TruncMonth('order_date'))
+                monthly_orders = (rollups_between(start_date, end_date).filter(
+                    day__year=year,
+                    day__month=month
+                ).annotate(month=TruncMonth('day'))
                  .values('month')
-                 .annotate(count=Count('order_id'))
+                 .annotate(count=Sum('order_count'))
                  .order_by('month'))
             except (ValueError, TypeError) as e:
                 logger.error(f"Invalid month format: {selected_month}, Error: {str(e)}")
                 return JsonResponse({'error': 'Invalid month format. Use YYYY-MM.'}, status=400)
         else:
-            monthly_orders = (Order.objects.filter(
-                order_date__date__gte=start_date,
-                order_date__date__lte=end_date
-            ).annotate(month=TruncMonth('order_date'))
+            monthly_orders = (rollups_between(start_date, end_date)
+             .annotate(month=TruncMonth('day'))
              .values('month')
-             .annotate(count=Count('order_id'))
+             .annotate(count=Sum('order_count'))
              .order_by('month'))
-        months = [mo['month'].strftime('%Y-%m') for mo in monthly_orders] if monthly_orders else []
-        order_counts = [mo['count'] for mo in monthly_orders] if monthly_orders else []
+        if selected_month:
+            trend_start = trend_end = datetime(year, month, 1).date()
+        else:
+            trend_start, trend_end = start_date, end_date
+        month_buckets, monthly_values = densify(monthly_orders, trend_start, trend_end, metrics=['count'])
+        months = format_buckets(month_buckets)
+        order_counts = monthly_values['count']
         logger.debug(f"Months: {months[:5]}, Order Counts: {order_counts[:5]}")
 
         # 3. Boxplot of Order Totals by Order Status (approximated as grouped bar)
-        if 'order_status' not in df.columns:
-            logger.error("order_status column is missing.")
-            statuses, means, mins, maxs = [], [], [], []
-        else:
-            status_totals = (df.groupby('order_status')['order_total']
-                            .agg(['mean', 'min', 'max']).reset_index())
-            statuses = status_totals['order_status'].tolist()
-            means = status_totals['mean'].astype(float).tolist()
-            mins = status_totals['min'].astype(float).tolist()
-            maxs = status_totals['max'].astype(float).tolist()
-            logger.debug(f"Statuses: {statuses}, Means: {means}")
-
-        # 4. Scatter Plot: Order Total vs. Product Quantity
-        if 'product_quantity' not in df.columns:
-            logger.error("product_quantity column is missing.")
-            quantities, order_totals_list = [], []
-        else:
-            quantities = df['product_quantity'].dropna().astype(int).tolist()
-            order_totals_list = df['order_total'].dropna().astype(float).tolist()
-            logger.debug(f"Quantities: {quantities[:5]}, Order Totals: {order_totals_list[:5]}")
+        status_totals = (orders.values('order_status')
+                         .annotate(mean=Avg('order_total'), min=Min('order_total'), max=Max('order_total'))
+                         .order_by('order_status'))
+        statuses = [row['order_status'] for row in status_totals]
+        means = [float(row['mean']) for row in status_totals]
+        mins = [float(row['min']) for row in status_totals]
+        maxs = [float(row['max']) for row in status_totals]
+        logger.debug(f"Statuses: {statuses}, Means: {means}")
+
+        # 4. Scatter Plot: Order Total vs. Product Quantity (binned or sampled by the database)
+        quantities, order_totals_list, _, order_scatter_counts, order_scatter_reduction = db_reduce_scatter(
+            orders, 'product_quantity', 'order_total', strategy=scatter_strategy, max_points=scatter_max_points)
+        if order_scatter_counts is None:
+            quantities = [int(quantity) for quantity in quantities]
+        logger.debug(f"Quantities: {quantities[:5]}, Order Totals: {order_totals_list[:5]}")
 
         # 5. Correlation Heatmap (approximated as bar chart of correlations)
-        num_cols = ['order_total', 'product_quantity']
-        if not all(col in df.columns for col in num_cols):
-            logger.error("Missing numeric columns for correlation.")
-            corr, corr_labels = [], []
-        else:
-            corr = df[num_cols].corr().values.flatten().tolist()[1:-1]
-            corr_labels = ['order_total vs product_quantity']
-            logger.debug(f"Correlation: {corr}")
+        correlation = db_correlation(orders, 'order_total', 'product_quantity')
+        corr = [correlation, correlation] if correlation is not None else [float('nan'), float('nan')]
+        corr_labels = ['order_total vs product_quantity']
+        logger.debug(f"Correlation: {corr}")
 
         # RFM Analysis
-        if 'customer_email' not in df.columns:
-            logger.error("customer_email column is missing.")
-            rfm = pd.DataFrame()
-        else:
-            rfm = (df.groupby('customer_email')
-                   .agg({'order_date': ['min', 'max', 'count'], 'order_total': 'sum'})
-                   .reset_index())
-            rfm.columns = ['customer_email', 'first_order_date', 'last_order_date', 'frequency', 'monetary']
-            reference_date = df['order_date'].max() + pd.Timedelta(days=1)
-            rfm['recency'] = (reference_date - rfm['last_order_date']).dt.days
-            churn_threshold = 180
-            rfm['churn'] = (rfm['recency'] > churn_threshold).astype(int)
-            logger.debug(f"RFM DataFrame shape: {rfm.shape}")
-
-        # 6. Recency Distribution (Bin the data)
-        if 'recency' not in rfm.columns or rfm['recency'].empty:
-            logger.error("recency column is missing or empty.")
-            recency_hist_labels, recency_hist_values = [], []
-        else:
-            recency = rfm['recency'].dropna().astype(float).to_numpy()
-            if len(recency) == 0:
-                logger.warning("No valid recency values after dropping NaN.")
-                recency_hist_labels, recency_hist_values = [], []
-            else:
-                recency_hist, recency_bin_edges = np.histogram(recency, bins=20)
-                recency_hist_labels = [f"{int(recency_bin_edges[i])}-{int(recency_bin_edges[i+1])}" for i in range(len(recency_bin_edges)-1)]
-                recency_hist_values = recency_hist.tolist()
-                logger.debug(f"Recency Histogram - Labels: {recency_hist_labels[:5]}, Values: {recency_hist_values[:5]}")
-
-        # 7. Frequency Distribution (Bin the data)
-        if 'frequency' not in rfm.columns or rfm['frequency'].empty:
-            logger.error("frequency column is missing or empty.")
-            freq_hist_labels, freq_hist_values = [], []
-        else:
-            frequency = rfm['frequency'].dropna().astype(float).to_numpy()
-            if len(frequency) == 0:
-                logger.warning("No valid frequency values after dropping NaN.")
-                freq_hist_labels, freq_hist_values = [], []
-            else:
-                freq_hist, freq_bin_edges = np.histogram(frequency, bins=20)
-                freq_hist_labels = [f"{int(freq_bin_edges[i])}-{int(freq_bin_edges[i+1])}" for i in range(len(freq_bin_edges)-1)]
-                freq_hist_values = freq_hist.tolist()
-                logger.debug(f"Frequency Histogram - Labels: {freq_hist_labels[:5]}, Values: {freq_hist_values[:5]}")
-
-        # 8. Monetary Distribution (Bin the data)
-        if 'monetary' not in rfm.columns or rfm['monetary'].empty:
-            logger.error("monetary column is missing or empty.")
-            monetary_hist_labels, monetary_hist_values = [], []
-        else:
-            monetary = rfm['monetary'].dropna().astype(float).to_numpy()
-            if len(monetary) == 0:
-                logger.warning("No valid monetary values after dropping NaN.")
-                monetary_hist_labels, monetary_hist_values = [], []
-            else:
-                monetary_hist, monetary_bin_edges = np.histogram(monetary, bins=20)
-                monetary_hist_labels = [f"{int(monetary_bin_edges[i])}-{int(monetary_bin_edges[i+1])}" for i in range(len(monetary_bin_edges)-1)]
-                monetary_hist_values = monetary_hist.tolist()
-                logger.debug(f"Monetary Histogram - Labels: {monetary_hist_labels[:5]}, Values: {monetary_hist_values[:5]}")
+        churn_threshold = 180
+        # Aggregate per customer (by email, for every range) in the database and fetch only the RFM columns
+        per_customer = (orders.values('customer_email')
+                        .annotate(last_order_date=Max('order_date'), frequency=Count('order_id'),
+                                  monetary=Sum('order_total'))
+                        .order_by('customer_email'))
+        rfm = pd.DataFrame.from_records(
+            per_customer.values_list('customer_email', 'last_order_date', 'frequency', 'monetary'),
+            columns=['customer_email', 'last_order_date', 'frequency', 'monetary'])
+        rfm['last_order_date'] = pd.to_datetime(rfm['last_order_date'], utc=True)
+        rfm['monetary'] = rfm['monetary'].astype(float)
+        reference_date = rfm['last_order_date'].max() + pd.Timedelta(days=1)
+        logger.debug(f"RFM DataFrame shape: {rfm.shape}")
+        rfm['recency'] = (reference_date - rfm['last_order_date']).dt.days
+        rfm['churn'] = (rfm['recency'] > churn_threshold).astype(int)
+
+        # 6. Recency Distribution (Bin the per-customer aggregates in the database)
+        recency_hist_labels, recency_hist_values = db_days_since_histogram(
+            per_customer, 'last_order_date', reference_date.to_pydatetime(), bins=20)
+        logger.debug(f"Recency Histogram - Labels: {recency_hist_labels[:5]}, Values: {recency_hist_values[:5]}")
+
+        # 7. Frequency Distribution (Bin the per-customer aggregates in the database)
+        freq_hist_labels, freq_hist_values = db_histogram(per_customer, 'frequency', bins=20)
+        logger.debug(f"Frequency Histogram - Labels: {freq_hist_labels[:5]}, Values: {freq_hist_values[:5]}")
+
+        # 8. Monetary Distribution (Bin the per-customer aggregates in the database)
+        monetary_hist_labels, monetary_hist_values = db_histogram(per_customer, 'monetary', bins=20)
+        logger.debug(f"Monetary Histogram - Labels: {monetary_hist_labels[:5]}, Values: {monetary_hist_values[:5]}")
 
         # 9. Frequency by Churn Status
         churn_freq = rfm.groupby('churn')['frequency'].mean().tolist()
@@ -309,9 +287,11 @@ def chart_data(request):
         logger.debug(f"Churn Monetary: {churn_monetary}")
 
         # 11. Recency vs. Monetary with Churn Highlight
-        recency_scatter = rfm['recency'].tolist()
-        monetary_scatter = rfm['monetary'].tolist()
-        churn_scatter = rfm['churn'].tolist()
+        recency_scatter, monetary_scatter, churn_scatter, rfm_scatter_counts, rfm_scatter_reduction = reduce_scatter(
+            rfm['recency'].to_numpy(), rfm['monetary'].to_numpy(), labels=rfm['churn'].to_numpy(),
+            strategy=scatter_strategy, max_points=scatter_max_points)
+        if rfm_scatter_counts is None:
+            recency_scatter = [int(recency) for recency in recency_scatter]
         logger.debug(f"Recency Scatter: {recency_scatter[:5]}, Monetary Scatter: {monetary_scatter[:5]}")
 
         data = {
@@ -339,59 +319,54 @@ def chart_data(request):
             'recency_scatter': recency_scatter,
             'monetary_scatter': monetary_scatter,
             'churn_scatter': churn_scatter,
+            'order_scatter_counts': order_scatter_counts,
+            'rfm_scatter_counts': rfm_scatter_counts,
+            'scatter_reduction': {
+                'order_total_vs_quantity': order_scatter_reduction,
+                'recency_vs_monetary': rfm_scatter_reduction,
+            },
         }
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in chart_data: {str(e)}")
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
 
+@analytics_endpoint
 def dashboard_data(request):
     try:
         # 1. Website Views (orders per day over the last 7 days)
         today = timezone.now().date()
         seven_days_ago = today - timedelta(days=6)
-        daily_orders = (Order.objects.filter(order_date__date__gte=seven_days_ago)
-                       .annotate(day=TruncDay('order_date'))
+        daily_orders = (rollups_between(seven_days_ago)
                        .values('day')
-                       .annotate(count=Count('order_id'))
+                       .annotate(count=Sum('order_count'))
                        .order_by('day'))
-        days = []
-        order_counts = []
-        current_date = seven_days_ago
-        while current_date <= today:
-            days.append(current_date.strftime('%a'))
-            count = next((item['count'] for item in daily_orders if item['day'].date() == current_date), 0)
-            order_counts.append(count)
-            current_date += timedelta(days=1)
+        day_buckets, daily_values = densify(daily_orders, seven_days_ago, today, grain='day', key='day', metrics=['count'])
+        days = format_buckets(day_buckets, '%a')
+        order_counts = daily_values['count']
 
         # 2. Daily Sales (revenue over the last 9 months)
         nine_months_ago = today - timedelta(days=270)  # Approx 9 months
-        monthly_revenue = (Order.objects.filter(order_date__date__gte=nine_months_ago)
-                          .annotate(month=TruncMonth('order_date'))
+        monthly_revenue = (rollups_between(nine_months_ago)
+                          .annotate(month=TruncMonth('day'))
                           .values('month')
                           .annotate(total=Sum('order_total'))
                           .order_by('month'))
-        months = []
-        revenues = []
-        current_month = nine_months_ago.replace(day=1)
-        while current_month <= today:
-            months.append(current_month.strftime('%b'))
-            revenue = next((item['total'] for item in monthly_revenue if item['month'].date() == current_month), 0)
-            revenues.append(float(revenue) if revenue else 0)
-            # Move to the next month
-            current_month = (current_month + timedelta(days=32)).replace(day=1)
+        month_buckets, monthly_values = densify(monthly_revenue, nine_months_ago, today, metrics=['total'])
+        months = format_buckets(month_buckets, '%b')
+        revenues = monthly_values['total'].astype(float)
 
         # 3. Order Status Breakdown (average order total by status)
-        status_totals = (Order.objects.values('order_status')
-                        .annotate(avg_total=Avg('order_total'))
+        status_totals = (OrderDailyRollup.objects.values('order_status')
+                        .annotate(total=Sum('order_total'), count=Sum('order_count'))
                         .order_by('order_status'))
         statuses = [item['order_status'] for item in status_totals]
-        avg_totals = [float(item['avg_total']) if item['avg_total'] else 0 for item in status_totals]
+        avg_totals = [float(item['total'] / item['count']) if item['total'] and item['count'] else 0 for item in status_totals]
 
         # 4. Revenue by Payment Method
-        payment_revenue = (Order.objects.values('payment_method')
+        payment_revenue = (OrderDailyRollup.objects.values('payment_method')
                           .annotate(total_revenue=Sum('order_total'))
                           .order_by('payment_method'))
         payment_methods = [item['payment_method'] for item in payment_revenue]
@@ -405,8 +380,8 @@ def dashboard_data(request):
         avg_values = [float(item['avg_order']) if item['avg_order'] else 0 for item in avg_order_value]
 
         # 6. Payment Method Popularity (count of orders by payment method)
-        payment_popularity = (Order.objects.values('payment_method')
-                             .annotate(order_count=Count('order_id'))
+        payment_popularity = (OrderDailyRollup.objects.values('payment_method')
+                             .annotate(order_count=Sum('order_count'))
                              .order_by('-order_count'))
         payment_methods_pop = [item['payment_method'] for item in payment_popularity]
         order_counts_payment = [item['order_count'] for item in payment_popularity]
@@ -425,13 +400,14 @@ def dashboard_data(request):
             'payment_methods_pop': payment_methods_pop,
             'order_counts_payment': order_counts_payment,
         }
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in dashboard_data: {str(e)}")
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
 @login_required
+@analytics_endpoint
 def customer_insights_data(request):
     """
     API endpoint to provide data for customer insights visualizations.
@@ -469,17 +445,17 @@ def customer_insights_data(request):
         logger.debug(f"Top Customers Data: {list(top_customers)}")
 
         # 2. Customer Order Trend Over Time (total orders per month)
-        orders_over_time_query = (Order.objects
-                                 .annotate(month=TruncMonth('order_date'))
+        orders_over_time_query = (OrderDailyRollup.objects
+                                 .annotate(month=TruncMonth('day'))
                                  .values('month')
-                                 .annotate(total_orders=Count('order_id'))
+                                 .annotate(total_orders=Sum('order_count'))
                                  .order_by('month'))
 
         # Apply date range filter to orders_over_time
         if start_date and end_date:
-            orders_over_time_query = orders_over_time_query.filter(order_date__gte=start_date, order_date__lte=end_date)
+            orders_over_time_query = orders_over_time_query.filter(day__gte=start_date.date(), day__lte=end_date.date())
         elif date_range_option != 'all':
-            orders_over_time_query = orders_over_time_query.filter(order_date__gte=start_date, order_date__lte=end_date)
+            orders_over_time_query = orders_over_time_query.filter(day__gte=start_date.date(), day__lte=end_date.date())
 
         orders_over_time = list(orders_over_time_query)
 
@@ -500,14 +476,9 @@ def customer_insights_data(request):
             timeline_start = start_date.date().replace(day=1)
             timeline_end = end_date.date().replace(day=1)
 
-        order_months = []
-        order_values = []
-        current_month = timeline_start
-        while current_month <= timeline_end:
-            order_months.append(current_month.strftime('%Y-%m'))
-            order_value = next((item['total_orders'] for item in orders_over_time if item['month'].date() == current_month), 0)
-            order_values.append(order_value)
-            current_month = (current_month + timedelta(days=32)).replace(day=1)
+        month_buckets, monthly_values = densify(orders_over_time, timeline_start, timeline_end, metrics=['total_orders'])
+        order_months = format_buckets(month_buckets)
+        order_values = monthly_values['total_orders']
         logger.debug(f"Order Trend Data: Months={order_months}, Values={order_values}")
 
         # 3. Customer Details Table (group by customer, count total orders, filter by range, paginate)
@@ -564,7 +535,7 @@ def customer_insights_data(request):
             'order_ranges': order_ranges,
         }
         logger.info("Customer insights data fetched successfully.")
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in customer_insights_data: {str(e)}", exc_info=True)
@@ -574,6 +545,7 @@ def customer_insights(request):
     return render(request, 'dashboard/customer_insights.html')
     
 @login_required
+@analytics_endpoint
 def cohort_data(request):
     """
     API endpoint to provide data for cohort analysis visualizations with revenue over 12 months.
@@ -587,6 +559,9 @@ def cohort_data(request):
         date_range_option = request.GET.get('date_range_option', 'last_1_year')  # Default to last 1 year
         page = int(request.GET.get('page', 1))
         items_per_page = 10  # Number of cohorts per page for the metrics table
+        month_diff = request.GET.get('month_diff', 'approx')  # 'approx' (30-day periods) or 'calendar'
+        if month_diff not in MONTH_DIFF_MODES:
+            return JsonResponse({'error': f"Invalid month_diff. Use one of: {', '.join(MONTH_DIFF_MODES)}."}, status=400)
 
         # Determine the date range
         today = timezone.now().date()
@@ -602,131 +577,124 @@ def cohort_data(request):
             end_date = pd.to_datetime('2025-04-02').tz_localize('UTC')
             start_date = end_date - pd.Timedelta(days=365)
         else:
-            earliest_order = Order.objects.earliest('order_date')
-            if earliest_order:
-                start_timestamp = pd.to_datetime(earliest_order.order_date)
-                if start_timestamp.tzinfo is not None:
-                    start_date = start_timestamp.tz_convert('UTC')
-                else:
-                    start_date = start_timestamp.tz_localize('UTC')
-            else:
-                start_date = pd.to_datetime(today).tz_localize('UTC')
+            # Every cohort up to today
+            start_date = None
             end_date = pd.to_datetime(today).tz_localize('UTC')
 
-        if start_date > end_date:
+        if start_date is not None and start_date > end_date:
             logger.error("Start date is after end date.")
             return JsonResponse({'error': 'Start date must be before end date.'}, status=400)
 
-        start_date = start_date.replace(day=1)
-
-        orders = Order.objects.filter(order_date__gte=start_date, order_date__lte=end_date)
-        if not orders.exists():
+        # Cohorts whose first month falls in the range, with activity up to the end month,
+        # read from the persisted cohort matrix (cost depends on the number of cohorts only)
+        start_month = start_date.date().replace(day=1) if start_date is not None else None
+        end_month = end_date.date().replace(day=1)
+        cells = load_cohort_cells(start_month, end_month)
+        if not len(cells[0]):
             logger.error("No orders found in the database within the specified date range.")
             return JsonResponse({'error': 'No orders found in the database within the specified date range.'}, status=400)
-
-        df = pd.DataFrame(list(orders.values('order_date', 'customer_email', 'order_total')))
-        df['order_date'] = pd.to_datetime(df['order_date'])
-        logger.debug(f"Cohort DataFrame shape: {df.shape}")
-
-        # Assign customers to cohorts based on their first purchase
-        first_orders = df.groupby('customer_email')['order_date'].min().reset_index()
-        first_orders['cohort'] = first_orders['order_date'].dt.strftime('%b %Y')
-        df = df.merge(first_orders[['customer_email', 'cohort']], on='customer_email', how='left')
-
-        # Calculate the month difference (reverted to original logic)
-        df['order_month'] = df['order_date'].dt.to_period('M')
-        df['cohort_month'] = pd.to_datetime(df['cohort'], format='%b %Y').dt.to_period('M')
-        df['month_diff'] = (df['order_month'].dt.start_time - df['cohort_month'].dt.start_time).dt.days // 30
+        logger.debug(f"Cohort cells: {len(cells[0])}")
 
         max_months = 12
-        cohort_matrix = []
-        cohort_sizes = {}
-        cohort_metrics = []
-        cohorts = sorted(df['cohort'].unique(), key=lambda x: pd.to_datetime(x, format='%b %Y'))
-
-        for cohort in cohorts:
-            cohort_data = df[df['cohort'] == cohort]
-            cohort_size = len(cohort_data['customer_email'].unique())
-            cohort_sizes[cohort] = cohort_size
-
-            # Ensure 12 months of revenue data
-            revenue_rates = [cohort_size]  # New customers
-            for month in range(1, max_months + 1):
-                revenue = cohort_data[cohort_data['month_diff'] == month]['order_total'].sum() or 0
-                revenue_rates.append(round(float(revenue), 2))
-            # Pad with zeros if less than 12 months
-            while len(revenue_rates) < (1 + max_months):  # 1 (new customers) + 12 months
-                revenue_rates.append(0.0)
-            cohort_matrix.append({'cohort': cohort, 'revenue_rates': revenue_rates})
-            logger.debug(f"Cohort {cohort} revenue rates: {revenue_rates} (length: {len(revenue_rates)})")
-
-            # Calculate metrics ensuring no division by zero
-            total_revenue = cohort_data['order_total'].sum() or 0
-            purchase_frequency = len(cohort_data) / cohort_size if cohort_size > 0 else 0
-            aov = float(total_revenue / len(cohort_data)) if len(cohort_data) > 0 else 0
-            revenue_per_customer = float(total_revenue / cohort_size) if cohort_size > 0 else 0
-            gross_margin = 0.4  # Assume 40% gross margin
-            ltv = (aov * purchase_frequency) * gross_margin
-
-            # Ensure metrics are added to cohort_metrics
-            cohort_metrics.append({
-                'cohort': cohort,
-                'cohort_size': cohort_size,
-                'purchase_frequency': round(purchase_frequency, 2),
-                'aov': round(aov, 2),
-                'revenue_per_customer': round(revenue_per_customer, 2),
-                'ltv': round(ltv, 2)
-            })
-            logger.debug(f"Cohort {cohort} metrics: {cohort_metrics[-1]}")  # Debug the last added metric
-
-        # Calculate overall revenue
-        overall_revenue = [df['customer_email'].nunique()]
-        for month in range(1, max_months + 1):
-            total_revenue = df[df['month_diff'] == month]['order_total'].sum() or 0
-            overall_revenue.append(round(float(total_revenue), 2))
-        while len(overall_revenue) < (1 + max_months):
-            overall_revenue.append(0.0)
-        cohort_matrix.insert(0, {'cohort': 'Overall', 'revenue_rates': overall_revenue})
-        cohort_sizes['Overall'] = df['customer_email'].nunique()
-
-        cohorts_list = [row['cohort'] for row in cohort_matrix]
-        revenue_matrix = [row['revenue_rates'] for row in cohort_matrix]
+        result = build_cohorts_from_cells(*cells, max_months=max_months, month_diff=month_diff)
+        revenue_rows = np.round(result['revenue_matrix'], 2)
+
+        cohorts_list = ['Overall'] + result['labels']
+        revenue_matrix = ([[result['total_customers']] + np.round(result['overall_revenue'], 2).tolist()] +
+                          [[int(size)] + revenue.tolist() for size, revenue in zip(result['sizes'], revenue_rows)])
+        retention_matrix = ([[result['total_customers']] + result['overall_retention'].tolist()] +
+                            [[int(size)] + retention.tolist() for size, retention in zip(result['sizes'], result['retention_matrix'])])
         month_labels = [f"After {i} Months" for i in range(1, max_months + 1)]
         logger.debug(f"Final month_labels: {month_labels}")
         logger.debug(f"Final revenue_matrix: {revenue_matrix}")
 
+        cohort_metrics = build_cohort_metrics(result)
         total_cohorts = len(cohort_metrics)
         total_pages = (total_cohorts + items_per_page - 1) // items_per_page
         start_index = (page - 1) * items_per_page
         end_index = start_index + items_per_page
         paginated_cohort_metrics = cohort_metrics[start_index:end_index]
 
-        export_data = {}
-        for cohort in cohorts:
-            customers = df[df['cohort'] == cohort]['customer_email'].unique().tolist()
-            export_data[cohort] = customers
+        # Members are exported by cohort_members_export; the response only links to it
+        export_params = {'end_month': f"{end_month:%Y-%m}"}
+        if start_month is not None:
+            export_params['start_month'] = f"{start_month:%Y-%m}"
+        export = {
+            'url': f"{reverse('cohort_members_export')}?{urlencode(export_params)}",
+            'customers': int(result['total_customers']),
+        }
 
         data = {
             'cohorts': cohorts_list,
             'revenue_matrix': revenue_matrix,
+            'retention_matrix': retention_matrix,
             'month_labels': month_labels,
+            'month_diff': month_diff,
             'cohort_metrics': paginated_cohort_metrics,
             'total_pages': total_pages,
             'current_page': page,
-            'export_data': export_data,
+            'export': export,
         }
         logger.info("Cohort analysis data fetched successfully.")
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in cohort_data: {str(e)}", exc_info=True)
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
     
+class _Echo:
+    # File-like object whose write() hands the formatted CSV row back to the caller
+    def write(self, value):
+        return value
+
+def _parse_month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+@login_required
+def cohort_members_export(request):
+    """
+    Streams cohort members as CSV (Cohort, Customer Email). Select cohorts with one or more
+    `cohort=YYYY-MM` parameters and/or a `start_month`/`end_month` (YYYY-MM) range; with
+    neither, every cohort is exported.
+    """
+    try:
+        try:
+            cohort_months = [_parse_month(value) for values in request.GET.getlist('cohort')
+                             for value in values.split(',') if value]
+            start_month = _parse_month(request.GET['start_month']) if request.GET.get('start_month') else None
+            end_month = _parse_month(request.GET['end_month']) if request.GET.get('end_month') else None
+        except ValueError:
+            return HttpResponse("Invalid month. Use YYYY-MM.", status=400)
+        logger.info(f"Exporting cohort members: cohorts={cohort_months}, start={start_month}, end={end_month}")
+
+        writer = csv.writer(_Echo())
+        members = iter_cohort_members(start_month, end_month, cohort_months)
+        rows = ([f"{cohort_month:%b %Y}", email] for cohort_month, email in members)
+        header = [['Cohort', 'Customer Email']]
+        response = StreamingHttpResponse((writer.writerow(row) for row in itertools.chain(header, rows)),
+                                         content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="cohort_members.csv"'
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in cohort_members_export: {str(e)}", exc_info=True)
+        return HttpResponse(f"Server error: {str(e)}", status=500)
+
 def cohort_analysis(request):
     return render(request, 'dashboard/cohort_analysis.html')  
 
 
+# Monthly series returned by financial_insights_data. Net revenue excludes refunds, and the
+# tax and shipping that order_total includes.
+FINANCIAL_METRICS = {
+    'total_shipping': Sum('shipping_charge'),
+    'total_tax': Sum('order_tax'),
+    'total_refunds': Sum('order_refunded'),
+    'total_discounts': Sum('order_discount'),
+    'net_revenue': Sum('order_total') - Sum('order_refunded') - Sum('order_tax') - Sum('shipping_charge'),
+}
 
+@analytics_endpoint
 def financial_insights_data(request):
     """
     API endpoint to provide data for financial insights visualizations.
@@ -764,72 +732,36 @@ def financial_insights_data(request):
             timeline_end = end_date.date().replace(day=1)
         logger.info(f"Timeline: start={timeline_start}, end={timeline_end}")
 
-        # 1. Shipping Charges Trend (by month)
-        shipping_charges_query = (Order.objects
-                                 .annotate(month=TruncMonth('order_date'))
-                                 .values('month')
-                                 .annotate(total_shipping=Sum('shipping_charge'))
-                                 .order_by('month'))
-
-        # Apply date range filter to shipping charges
-        if start_date and end_date:
-            shipping_charges_query = shipping_charges_query.filter(order_date__gte=start_date, order_date__lte=end_date)
-        elif date_range_option != 'all':
-            shipping_charges_query = shipping_charges_query.filter(order_date__gte=start_date, order_date__lte=end_date)
-
-        shipping_charges = list(shipping_charges_query)
-        logger.info(f"Shipping charges query result: {shipping_charges}")
-
-        shipping_months = []
-        shipping_values = []
-        current_month = timeline_start
-        while current_month <= timeline_end:
-            shipping_months.append(current_month.strftime('%Y-%m'))
-            shipping_value = next((item['total_shipping'] for item in shipping_charges if item['month'].date() == current_month), 0)
-            shipping_values.append(float(shipping_value) if shipping_value else 0)
-            current_month = (current_month + timedelta(days=32)).replace(day=1)
-        logger.info(f"Shipping data: months={shipping_months}, values={shipping_values}")
-
-        # 2. Tax Collected by Month
-        tax_collected_query = (Order.objects
-                              .annotate(month=TruncMonth('order_date'))
-                              .values('month')
-                              .annotate(total_tax=Sum('order_tax'))
-                              .order_by('month'))
-
-        # Apply date range filter to tax collected
+        # All monthly financial series in one scan of the daily rollups
+        financial_query = OrderDailyRollup.objects.all()
         if start_date and end_date:
-            tax_collected_query = tax_collected_query.filter(order_date__gte=start_date, order_date__lte=end_date)
+            financial_query = financial_query.filter(day__gte=start_date.date(), day__lte=end_date.date())
         elif date_range_option != 'all':
-            tax_collected_query = tax_collected_query.filter(order_date__gte=start_date, order_date__lte=end_date)
-
-        tax_collected = list(tax_collected_query)
-        logger.info(f"Tax collected query result: {tax_collected}")
+            financial_query = financial_query.filter(day__gte=start_date.date(), day__lte=end_date.date())
 
-        tax_months = []
-        tax_values = []
-        current_month = timeline_start
-        while current_month <= timeline_end:
-            tax_months.append(current_month.strftime('%Y-%m'))
-            tax_value = next((item['total_tax'] for item in tax_collected if item['month'].date() == current_month), 0)
-            tax_values.append(float(tax_value) if tax_value else 0)
-            current_month = (current_month + timedelta(days=32)).replace(day=1)
-        logger.info(f"Tax data: months={tax_months}, values={tax_values}")
+        month_buckets, monthly_values = aggregate_series(financial_query, FINANCIAL_METRICS, timeline_start, timeline_end)
+        months = format_buckets(month_buckets)
+        logger.info(f"Financial data: months={months}, values={monthly_values}")
 
         data = {
-            'shipping_months': shipping_months,
-            'shipping_values': shipping_values,
-            'tax_months': tax_months,
-            'tax_values': tax_values,
+            'shipping_months': months,
+            'shipping_values': monthly_values['total_shipping'].astype(float),
+            'tax_months': months,
+            'tax_values': monthly_values['total_tax'].astype(float),
+            'months': months,
+            'refund_values': monthly_values['total_refunds'].astype(float),
+            'discount_values': monthly_values['total_discounts'].astype(float),
+            'net_revenue_values': monthly_values['net_revenue'].astype(float),
         }
         logger.info("Financial insights data fetched successfully:", data)
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in financial_insights_data: {str(e)}", exc_info=True)
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
 
+@analytics_endpoint
 def product_insights_data(request):
     try:
         # Get query parameters
@@ -866,8 +798,7 @@ def product_insights_data(request):
         start_date = start_date.replace(day=1)
 
         # 1. Top Products by Revenue (top 10 products by product_row_total)
-        top_products_query = (Order.objects
-                             .filter(order_date__date__gte=start_date, order_date__date__lte=end_date)
+        top_products_query = (rollups_between(start_date, end_date)
                              .values('product_name')
                              .annotate(total_revenue=Sum('product_row_total'))
                              .order_by('-total_revenue')[:10])  # Limit to top 10
@@ -876,39 +807,29 @@ def product_insights_data(request):
 
         # 2. List of all unique product names for the dropdown
         # We don't filter by date for the product list to ensure all products are available for selection
-        product_names = Order.objects.values('product_name').distinct().order_by('product_name')
+        product_names = OrderDailyRollup.objects.values('product_name').distinct().order_by('product_name')
         product_list = [item['product_name'] for item in product_names]
 
         # 3. Product Quantity Sold Over Time (by month, filtered by selected product and date range)
         # Filter by selected product if provided, otherwise show total for all products
         if selected_product and selected_product != 'All Products':
-            quantity_over_time = (Order.objects
-                                 .filter(product_name=selected_product,
-                                         order_date__date__gte=start_date,
-                                         order_date__date__lte=end_date)
-                                 .annotate(month=TruncMonth('order_date'))
+            quantity_over_time = (rollups_between(start_date, end_date)
+                                 .filter(product_name=selected_product)
+                                 .annotate(month=TruncMonth('day'))
                                  .values('month')
                                  .annotate(total_quantity=Sum('product_quantity'))
                                  .order_by('month'))
         else:
-            quantity_over_time = (Order.objects
-                                 .filter(order_date__date__gte=start_date,
-                                         order_date__date__lte=end_date)
-                                 .annotate(month=TruncMonth('order_date'))
+            quantity_over_time = (rollups_between(start_date, end_date)
+                                 .annotate(month=TruncMonth('day'))
                                  .values('month')
                                  .annotate(total_quantity=Sum('product_quantity'))
                                  .order_by('month'))
 
         # Generate a list of months and quantities, filling in gaps with zeros
-        quantity_months = []
-        quantity_values = []
-        current_month = start_date
-        while current_month <= end_date:
-            quantity_months.append(current_month.strftime('%Y-%m'))
-            quantity_value = next((item['total_quantity'] for item in quantity_over_time if item['month'].date() == current_month), 0)
-            quantity_values.append(quantity_value)
-            # Move to the next month
-            current_month = (current_month + timedelta(days=32)).replace(day=1)
+        month_buckets, monthly_values = densify(quantity_over_time, start_date, end_date, metrics=['total_quantity'])
+        quantity_months = format_buckets(month_buckets)
+        quantity_values = monthly_values['total_quantity']
 
         data = {
             'product_names_revenue': product_names_revenue,
@@ -917,7 +838,7 @@ def product_insights_data(request):
             'quantity_months': quantity_months,
             'quantity_values': quantity_values,
         }
-        return JsonResponse(data, safe=False)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in product_insights_data: {str(e)}")
@@ -928,55 +849,47 @@ def customer_profile(request):
     return render(request, 'dashboard/customer_profile.html')
 
 
+@analytics_endpoint
 def customer_profile_data(request):
     try:
         logger.info("Fetching customer profile data...")
 
-        # Load RFM segments and churn model (do this once per request)
-        rfm_segments = load_rfm_segments()
-        churn_model, churn_scaler = load_churn_model_and_scaler()
+        # Churn model, loaded once per process (reloaded when a retrain publishes new files)
+        artifacts = get_artifacts()
+        churn_model, churn_scaler = artifacts.model, artifacts.scaler
 
-        if rfm_segments is None or churn_model is None or churn_scaler is None:
-            logger.error("Failed to load RFM segments or churn model.")
+        if churn_model is None or churn_scaler is None:
+            logger.error("Failed to load the churn model.")
             return JsonResponse({'error': 'Failed to load ML models'}, status=500)
 
         # Get the selected customer name from the query parameter
         customer_name = request.GET.get('customer_name', None)
         if not customer_name:
-            # If no customer is selected, return a list of all customers for the dropdown
-            customers = (Order.objects.values('customer_name')
-                        .distinct()
-                        .order_by('customer_name'))
-            customer_list = [item['customer_name'] for item in customers]
-            return JsonResponse({'customers': customer_list})
-
-        # Fetch all orders for the selected customer
-        customer_orders = (Order.objects.filter(customer_name=customer_name)
-                          .order_by('order_date'))
+            # No customer selected: the first page of the typeahead (see customer_search)
+            results, next_cursor = customer_search_index.search('', limit=CUSTOMER_SEARCH_DEFAULT_LIMIT)
+            return JsonResponse({'customers': [item['name'] for item in results], 'next_cursor': next_cursor})
 
-        if not customer_orders.exists():
+        # Per-customer aggregates come from the incrementally maintained feature store
+        features = CustomerFeatures.objects.filter(customer_name=customer_name).first()
+        if features is None:
             return JsonResponse({'error': 'Customer not found'}, status=404)
 
         # Customer Details
-        customer_email = customer_orders.first().customer_email
-        first_order_date = customer_orders.first().order_date.date()
-        last_order_date = customer_orders.last().order_date.date()
+        customer_email = features.customer_email
+        first_order_date = features.first_order_date.date()
+        last_order_date = features.last_order_date.date()
 
         # Lifespan (in days)
         lifespan_days = (last_order_date - first_order_date).days
         lifespan_months = round(lifespan_days / 30.42, 2)  # Approximate months
 
         # LTV (sum of order_total)
-        ltv_result = customer_orders.aggregate(total_spent=Sum('order_total'))['total_spent']
-        logger.debug(f"LTV Result for {customer_name}: {ltv_result}")
-        ltv = float(ltv_result) if ltv_result is not None else 0.0
+        ltv = float(features.monetary)
         logger.debug(f"Processed LTV for {customer_name}: {ltv}")
 
-        # Average Days Between Orders
-        order_dates = [order.order_date.date() for order in customer_orders]
-        if len(order_dates) > 1:
-            time_diffs = [(order_dates[i+1] - order_dates[i]).days for i in range(len(order_dates)-1)]
-            avg_days_between_orders = round(sum(time_diffs) / len(time_diffs), 2)
+        # Average Days Between Orders (consecutive gaps sum to last - first)
+        if features.order_count > 1:
+            avg_days_between_orders = round(lifespan_days / (features.order_count - 1), 2)
         else:
             avg_days_between_orders = 0
 
@@ -994,9 +907,11 @@ def customer_profile_data(request):
             '2_years': 0,
             '5_years': 0,
         }
-        for order in customer_orders:
-            days_since_first = (order.order_date.date() - first_order_date).days
-            order_value = order.order_total or 0
+        customer_orders = (Order.objects.filter(customer_name=customer_name)
+                          .values_list('order_date', 'order_total'))
+        for order_date, order_total in customer_orders:
+            days_since_first = (order_date.date() - first_order_date).days
+            order_value = order_total or 0
             if days_since_first <= 30:
                 ltv_over_time['30_days'] += order_value
             if days_since_first <= 90:
@@ -1014,29 +929,18 @@ def customer_profile_data(request):
         ltv_over_time['2_years'] += ltv_over_time['1_year']
         ltv_over_time['5_years'] += ltv_over_time['2_years']
 
-        # Top 10% for LTV and Lifetime
-        all_customers = (Order.objects.values('customer_name')
-                        .annotate(total_spent=Sum('order_total'),
-                                 first_order=Min('order_date'),
-                                 last_order=Max('order_date')))
-        ltv_values = [customer['total_spent'] for customer in all_customers if customer['total_spent'] is not None]
-        lifetime_values = [(customer['last_order'].date() - customer['first_order'].date()).days / 30.42
-                          for customer in all_customers]
-        
-        ltv_values.sort(reverse=True)
-        lifetime_values.sort(reverse=True)
-        
-        top_10_percent_ltv = ltv_values[:max(1, len(ltv_values) // 10)][-1] if ltv_values else 0
-        top_10_percent_lifetime = lifetime_values[:max(1, len(lifetime_values) // 10)][-1] if lifetime_values else 0
-        
-        is_top_10_ltv = ltv >= top_10_percent_ltv
-        is_top_10_lifetime = lifespan_months >= top_10_percent_lifetime
+        # Rank, percentile and top-10% badges from the sorted arrays built at refresh time
+        percentile_index = get_percentile_index()
+        ltv_rank = percentile_rank(percentile_index['ltv'], ltv)
+        lifetime_rank = percentile_rank(percentile_index['lifetime_months'], lifespan_days / 30.42)
+        is_top_10_ltv = ltv_rank['is_top']
+        is_top_10_lifetime = lifetime_rank['is_top']
 
         # Calculate features for churn prediction (same as in ml_data_preparation.py)
         current_date = pd.to_datetime('2025-04-01').tz_localize('UTC')
-        frequency = customer_orders.count()
+        frequency = features.order_count
         monetary = ltv
-        recency = (current_date - customer_orders.last().order_date).total_seconds() / (24 * 3600)
+        recency = (current_date - features.last_order_date).total_seconds() / (24 * 3600)
 
         customer_features = {
             'recency': recency,
@@ -1045,11 +949,14 @@ def customer_profile_data(request):
             'avg_days_between_orders': avg_days_between_orders
         }
 
-        # Get RFM segment
-        rfm_segment = rfm_segments.get(customer_name, "Unknown")
+        # RFM segment from the active generation, like the other segment views
+        rfm_segment = (active_segments().filter(customer_name=customer_name)
+                       .values_list('segment', flat=True).first()) or "Unknown"
 
-        # Predict churn probability
-        churn_prob = predict_churn(customer_features, churn_model, churn_scaler)
+        # Precomputed churn probability (score_customers) when current, else score live
+        churn_prob = current_churn_score(features, artifacts.model_version)
+        if churn_prob is None:
+            churn_prob = predict_churn(customer_features, churn_model, churn_scaler)
         churn_rate = round(churn_prob * 100, 2)  # Convert to percentage
 
         data = {
@@ -1063,50 +970,73 @@ def customer_profile_data(request):
             'est_next_order_date': est_next_order_date.strftime('%d %b %Y'),
             'is_top_10_ltv': is_top_10_ltv,
             'is_top_10_lifetime': is_top_10_lifetime,
+            'ltv_percentile': ltv_rank['percentile'],
+            'ltv_rank': ltv_rank['rank'],
+            'lifetime_percentile': lifetime_rank['percentile'],
+            'lifetime_rank': lifetime_rank['rank'],
+            'ranked_customers': len(percentile_index['lifetime_months']),
             'ltv_over_time': ltv_over_time,
             'rfm_segment': rfm_segment,
             'churn_rate': churn_rate
         }
         logger.info(f"Customer profile data fetched successfully for {customer_name}.")
-        return JsonResponse(data)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in customer_profile_data: {str(e)}", exc_info=True)
         return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
 
+def customer_search(request):
+    """
+    API endpoint for the customer profile typeahead: case-insensitive `q` matched against
+    customer names and emails (`mode` prefix or substring), `limit` results per page and
+    an opaque `cursor` for the next page.
+    """
+    try:
+        query = request.GET.get('q', '')
+        mode = request.GET.get('mode', 'prefix')
+        cursor = request.GET.get('cursor') or None
+        if mode not in CUSTOMER_SEARCH_MODES:
+            return JsonResponse({'error': f"Invalid mode. Use one of: {', '.join(CUSTOMER_SEARCH_MODES)}."}, status=400)
+        try:
+            limit = min(max(int(request.GET.get('limit', CUSTOMER_SEARCH_DEFAULT_LIMIT)), 1), CUSTOMER_SEARCH_MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+        if mode == 'substring' and len(query.strip()) < CUSTOMER_SEARCH_SUBSTRING_MIN_LENGTH:
+            return JsonResponse({'results': [], 'next_cursor': None})
+
+        try:
+            results, next_cursor = customer_search_index.search(query, mode=mode, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'results': results, 'next_cursor': next_cursor})
+
+    except Exception as e:
+        logger.error(f"Error in customer_search: {str(e)}", exc_info=True)
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
 def rfm_churn_visualizations(request):
     try:
         logger.info("Fetching RFM and churn visualization data...")
 
-        # Load the RFM features with segments
-        rfm_file_path = os.path.join(settings.BASE_DIR, 'dashboard', 'rfm_features_with_segments.csv')
-        if not os.path.exists(rfm_file_path):
-            logger.error(f"RFM features file not found at {rfm_file_path}")
+        # Segments published by the last retrain
+        segments = active_segments()
+        if not segments.exists():
+            logger.error("No published customer segments found")
             return render(request, 'dashboard/rfm_churn_visualizations.html', {'error': 'RFM features file not found'})
 
-        df = pd.read_csv(rfm_file_path)
-
         # RFM Segment Distribution
-        segment_counts = df['Segment'].value_counts().to_dict()
+        segment_counts = segment_counts_of(segments)
         segment_data = {
             'labels': list(segment_counts.keys()),
             'values': list(segment_counts.values())
         }
 
-        # Churn Trend (Monthly Average Churn Rate)
-        # Convert last_order_date to datetime and extract year-month
-        df['last_order_date'] = pd.to_datetime(df['last_order_date'])
-        df['year_month'] = df['last_order_date'].dt.to_period('M').astype(str)
-
-        # Group by year-month and calculate average churn rate
-        churn_trend = df.groupby('year_month')['Churn'].mean().reset_index()
-        # Convert churn rate to percentage
-        churn_trend['Churn'] = (churn_trend['Churn'] * 100).round(2)
-        # Sort by year-month
-        churn_trend = churn_trend.sort_values('year_month')
+        # Churn Trend (Monthly Average Churn Rate, as a percentage, by month of the last order)
+        churn_trend = monthly_churn(segments)
         churn_trend_data = {
-            'labels': churn_trend['year_month'].tolist(),
-            'values': churn_trend['Churn'].tolist()
+            'labels': [month for month, _, _ in churn_trend],
+            'values': [round(churned / total * 100, 2) for _, total, churned in churn_trend]
         }
 
         data = {
@@ -1124,6 +1054,19 @@ def rfm_churn_visualizations(request):
         logger.error(f"Error in rfm_churn_visualizations: {str(e)}", exc_info=True)
         return render(request, 'dashboard/rfm_churn_visualizations.html', {'error': f'Server error: {str(e)}'})
 
+def _segment_customers(queryset, recommendation):
+    # One page of a segment's customers for the recommendations table
+    return [{
+        'customer_name': row['customer_name'],
+        'customer_email': row['customer_email'] or None,
+        'recency': row['recency'],
+        'frequency': row['frequency'],
+        'monetary': float(row['monetary']),
+        'Churn': 'Yes' if row['churn'] else 'No',
+        'Recommended Action': recommendation,
+    } for row in queryset.values('customer_name', 'customer_email', 'recency', 'frequency', 'monetary', 'churn')]
+
+@analytics_endpoint
 def rfm_churn_visualizations_data(request):
     """
     API endpoint to provide data for RFM segment distribution, active customers/orders visualizations,
@@ -1132,14 +1075,12 @@ def rfm_churn_visualizations_data(request):
     try:
         logger.info("Fetching RFM, active customers/orders, AOV, and recommendations data...")
 
-        # Load the RFM features with segments
-        rfm_file_path = os.path.join(settings.BASE_DIR, 'dashboard', 'rfm_features_with_segments.csv')
-        if not os.path.exists(rfm_file_path):
-            logger.error(f"RFM features file not found at {rfm_file_path}")
+        # Segments published by the last retrain
+        segments = active_segments()
+        if not segments.exists():
+            logger.error("No published customer segments found")
             return JsonResponse({'error': 'RFM features file not found'}, status=500)
 
-        df = pd.read_csv(rfm_file_path)
-
         # Filter parameters
         filter_segment = request.GET.get('filter_segment', None)
         start_date = request.GET.get('start_date', None)
@@ -1148,10 +1089,10 @@ def rfm_churn_visualizations_data(request):
 
         # Apply segment filter to RFM data
         if filter_segment and filter_segment != 'All':
-            df = df[df['Segment'] == filter_segment]
+            segments = segments.filter(segment=filter_segment)
 
         # RFM Segment Distribution
-        segment_counts = df['Segment'].value_counts().to_dict()
+        segment_counts = segment_counts_of(segments)
         segment_data = {
             'labels': list(segment_counts.keys()),
             'values': list(segment_counts.values())
@@ -1171,8 +1112,9 @@ def rfm_churn_visualizations_data(request):
             # Set default date range to the most recent 1 year if not specified
             if date_range_option == 'all':
                 # Use the full range of the data
-                start_date = min(orders_df['order_date'].min(), pd.to_datetime(df['last_order_date'].min()))
-                end_date = max(orders_df['order_date'].max(), pd.to_datetime(df['last_order_date'].max()))
+                last_orders = segments.aggregate(first=Min('last_order_date'), last=Max('last_order_date'))
+                start_date = min(orders_df['order_date'].min(), pd.Timestamp(last_orders['first']))
+                end_date = max(orders_df['order_date'].max(), pd.Timestamp(last_orders['last']))
             else:
                 # Default to the most recent 1 year (April 2024 to April 2025)
                 end_date = pd.to_datetime('2025-04-02').tz_localize('UTC')  # Current date
@@ -1184,19 +1126,13 @@ def rfm_churn_visualizations_data(request):
                 (orders_df['order_date'] <= end_date)
             ]
 
-        # Apply date range filter to RFM data (for active customers)
-        df['last_order_date'] = pd.to_datetime(df['last_order_date'])
-        df['year_month'] = df['last_order_date'].dt.to_period('M')
-        if start_date and end_date:
-            df_filtered = df[
-                (df['last_order_date'] >= start_date) & 
-                (df['last_order_date'] <= end_date)
-            ]
-        else:
-            df_filtered = df
-
-        # Active Customers and Orders Over Time
-        active_customers = df_filtered[df_filtered['Churn'] == 0].groupby('year_month').size().reset_index(name='active_customers')
+        # Active Customers (not churned, by month of their last order within the range) and Orders Over Time
+        in_range = segments.filter(last_order_date__gte=start_date.to_pydatetime(), last_order_date__lte=end_date.to_pydatetime())
+        active_customers = pd.DataFrame(
+            [(pd.Period(month, freq='M'), total - churned) for month, total, churned in monthly_churn(in_range)
+             if total > churned],
+            columns=['year_month', 'active_customers'])
+        active_customers['year_month'] = active_customers['year_month'].astype('period[M]')
         orders_per_month = orders_df.groupby('year_month').size().reset_index(name='order_count')
 
         # Average Order Value Over Time
@@ -1204,12 +1140,8 @@ def rfm_churn_visualizations_data(request):
         aov_per_month['avg_order_value'] = aov_per_month['avg_order_value'].round(2)
 
         # Create a continuous timeline
-        if start_date and end_date:
-            earliest_month = pd.to_datetime(start_date).to_period('M')
-            latest_month = pd.to_datetime(end_date).to_period('M')
-        else:
-            earliest_month = min(df['year_month'].min(), orders_df['year_month'].min())
-            latest_month = max(df['year_month'].max(), orders_df['year_month'].max())
+        earliest_month = pd.to_datetime(start_date).to_period('M')
+        latest_month = pd.to_datetime(end_date).to_period('M')
 
         all_months = pd.period_range(start=earliest_month, end=latest_month, freq='M')
         all_months_df = pd.DataFrame({'year_month': all_months})
@@ -1233,13 +1165,8 @@ def rfm_churn_visualizations_data(request):
         }
 
         # Customer Recommendations with Pagination
-        recommendations = {
-            'Loyal Customer': 'Reward with a loyalty discount or exclusive offer to maintain engagement.',
-            'Active Customer': 'Encourage repeat purchases with a limited-time promotion.',
-            'Average Customer': 'Send a personalized email with product recommendations to increase engagement.',
-            'At Risk': 'Send a re-engagement email with a discount to win them back.',
-            'New Customer': 'Welcome them with an onboarding email and a small discount on their next purchase.'
-        }
+        # Each segment's recommended action, declared with the segment rules
+        recommendations = get_rules().actions
 
         page = int(request.GET.get('page', 1))
         segment = request.GET.get('segment', None)
@@ -1248,17 +1175,14 @@ def rfm_churn_visualizations_data(request):
         customer_data = {}
         pagination_data = {}
         if segment:
-            segment_df = df[df['Segment'] == segment][['customer_name', 'customer_email', 'recency', 'frequency', 'monetary', 'Churn']]
-            segment_df['Churn'] = segment_df['Churn'].apply(lambda x: 'Yes' if x == 1 else 'No')
-            segment_df['Recommended Action'] = recommendations.get(segment, 'No action specified.')
-
-            total_items = len(segment_df)
+            segment_qs = segments.filter(segment=segment).order_by('id')
+            total_items = segment_qs.count()
             total_pages = (total_items + items_per_page - 1) // items_per_page
             start_idx = (page - 1) * items_per_page
             end_idx = start_idx + items_per_page
-            paginated_df = segment_df.iloc[start_idx:end_idx]
+            page_qs = segment_qs[start_idx:end_idx] if start_idx >= 0 else segment_qs.none()
 
-            customer_data[segment] = paginated_df.to_dict('records')
+            customer_data[segment] = _segment_customers(page_qs, recommendations.get(segment, 'No action specified.'))
             pagination_data[segment] = {
                 'current_page': page,
                 'total_pages': total_pages,
@@ -1266,18 +1190,14 @@ def rfm_churn_visualizations_data(request):
                 'items_per_page': items_per_page
             }
         else:
-            for segment in df['Segment'].unique():
-                segment_df = df[df['Segment'] == segment][['customer_name', 'customer_email', 'recency', 'frequency', 'monetary', 'Churn']]
-                segment_df['Churn'] = segment_df['Churn'].apply(lambda x: 'Yes' if x == 1 else 'No')
-                segment_df['Recommended Action'] = recommendations.get(segment, 'No action specified.')
-
-                total_items = len(segment_df)
+            # Segments in order of first appearance, each with its first page
+            first_rows = segments.values('segment').annotate(total=Count('id'), first=Min('id')).order_by('first')
+            for row in first_rows:
+                segment, total_items = row['segment'], row['total']
                 total_pages = (total_items + items_per_page - 1) // items_per_page
-                start_idx = 0
-                end_idx = items_per_page
-                paginated_df = segment_df.iloc[start_idx:end_idx]
+                page_qs = segments.filter(segment=segment).order_by('id')[:items_per_page]
 
-                customer_data[segment] = paginated_df.to_dict('records')
+                customer_data[segment] = _segment_customers(page_qs, recommendations.get(segment, 'No action specified.'))
                 pagination_data[segment] = {
                     'current_page': 1,
                     'total_pages': total_pages,
@@ -1293,7 +1213,7 @@ def rfm_churn_visualizations_data(request):
             'pagination_data': pagination_data
         }
         logger.info("RFM, active customers/orders, AOV, and recommendations data fetched successfully.")
-        return JsonResponse(data)
+        return json_response(data, request)
 
     except Exception as e:
         logger.error(f"Error in rfm_churn_visualizations_data: {str(e)}", exc_info=True)
@@ -1302,29 +1222,50 @@ def rfm_churn_visualizations_data(request):
     
 def download_rfm_data(request):
     """
-    View to download the RFM features with segments as a CSV file.
+    View to download the RFM features with segments as a CSV file, streamed from the
+    active segments generation.
     """
     try:
         logger.info("Initiating download of RFM data...")
 
-        # Path to the RFM features file
-        rfm_file_path = os.path.join(settings.BASE_DIR, 'dashboard', 'rfm_features_with_segments.csv')
-        if not os.path.exists(rfm_file_path):
-            logger.error(f"RFM features file not found at {rfm_file_path}")
+        segments = active_segments()
+        if not segments.exists():
+            logger.error("No published customer segments found")
             return HttpResponse("RFM features file not found.", status=404)
 
-        # Read the file and serve it as a download
-        with open(rfm_file_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="rfm_features_with_segments.csv"'
-            response['Content-Length'] = os.path.getsize(rfm_file_path)
-            logger.info("RFM data download successful.")
-            return response
+        writer = csv.writer(_Echo())
+        rows = itertools.chain([SEGMENT_EXPORT_COLUMNS], segment_export_rows(segments))
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="rfm_features_with_segments.csv"'
+        logger.info("RFM data download started.")
+        return response
 
     except Exception as e:
         logger.error(f"Error in download_rfm_data: {str(e)}", exc_info=True)
         return HttpResponse(f"Server error: {str(e)}", status=500)
 
+@login_required
+def retrain_status(request):
+    """
+    API endpoint exposing retrain queue depth, last-run latency and this process's ML artifact state.
+    """
+    try:
+        return JsonResponse({**queue_status(), 'artifacts': artifact_registry.status()})
+    except Exception as e:
+        logger.error(f"Error in retrain_status: {str(e)}", exc_info=True)
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
+@login_required
+def cache_status(request):
+    """
+    API endpoint exposing analytics response cache hit/miss counters and the data version.
+    """
+    try:
+        return JsonResponse(cache_stats(CACHED_VIEWS))
+    except Exception as e:
+        logger.error(f"Error in cache_status: {str(e)}", exc_info=True)
+        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+
 
 def signup_view(request):
     if request.method == 'POST':